@@ -1,6 +1,7 @@
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+import versiones
 
 # Cargar variables de entorno
 load_dotenv()
@@ -31,6 +32,9 @@ try:
         }
     )
 
+    if resultado.modified_count:
+        versiones.incrementar(db['versiones'], 'clientes')
+
     print(f"✓ Se actualizaron {resultado.modified_count} clientes con el teléfono '12345'")
     print(f"Total de clientes en la base de datos: {clientes_collection.count_documents({})}")
 
@@ -1,11 +1,35 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from pymongo import MongoClient
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 from datetime import datetime
-import pandas as pd
 import os
-from io import BytesIO
+import re
+import json
+import base64
+import time
+import shutil
+import tempfile
 from dotenv import load_dotenv
+import busqueda
+import busqueda_productos
+import claves_productos
+import serializacion
+import estadisticas
+import localidades
+import exportacion
+import versiones
+import trabajos
+import importador_clientes
+import importador_productos
+import import_productos_excel as excel_productos  # la ruta de importación usa el mismo nombre
+import extraccion_pdf
+import cache_listas
+import listas_precios
+import recalculo_precios
+import planes
+import catalogo
+import compresion
 
 # Cargar variables de entorno
 load_dotenv()
@@ -24,26 +48,107 @@ try:
     clientes_collection = db['clientes']
     productos_collection = db['productos']
     planes_descuento_collection = db['planes_descuento']
-
-    # Crear índices para mejorar rendimiento
-    clientes_collection.create_index('cliente')
-    clientes_collection.create_index('localidad')
-    clientes_collection.create_index('intencion_comprar')
-    productos_collection.create_index('codigo')
-    productos_collection.create_index('nombre')
-
-    print(f"✓ Conexión exitosa a MongoDB: {DB_NAME}")
+    estadisticas_collection = db['estadisticas']
+    localidades_collection = db['localidades']
+    versiones_collection = db['versiones']
+    trabajos_collection = db['trabajos']
+
+    # Los procesos del pool de extracción de PDF (contexto spawn) vuelven a
+    # importar este archivo como __mp_main__ si se corre con python app.py:
+    # ahí no se crean índices ni se inicializan los planes
+    if __name__ != '__mp_main__':
+        # Crear índices para mejorar rendimiento
+        clientes_collection.create_index('cliente')
+        clientes_collection.create_index('localidad')
+        clientes_collection.create_index('intencion_comprar')
+        clientes_collection.create_index([('fecha', -1), ('_id', -1)])
+        busqueda.crear_indices(clientes_collection)
+        localidades.crear_indices(clientes_collection)
+        importador_clientes.crear_indices(clientes_collection)
+        trabajos.crear_indices(trabajos_collection)
+        productos_collection.create_index('codigo')
+        productos_collection.create_index('nombre')
+        busqueda_productos.crear_indices(productos_collection)
+        for error in claves_productos.crear_indices(productos_collection):
+            print(f"⚠️  Índice único de productos pendiente, ejecutar python claves_productos.py ({error})")
+        planes.inicializar(planes_descuento_collection, versiones_collection)
+
+        print(f"✓ Conexión exitosa a MongoDB: {DB_NAME}")
 except Exception as e:
     print(f"✗ Error conectando a MongoDB: {e}")
     print("  Asegúrate de que MongoDB esté corriendo en localhost:27017")
     exit(1)
 
-def cliente_to_dict(cliente):
-    """Convierte un documento de MongoDB a diccionario con _id como string"""
+@app.after_request
+def comprimir_respuesta(response):
+    """Compresión (gzip/brotli), ETag y GET condicional de las respuestas JSON, CSV y JSONL"""
+    return compresion.procesar(response, request)
+
+# Documentos pedidos a MongoDB por lote en las respuestas en streaming
+LOTE_STREAMING = 500
+
+def respuesta_json_stream(documentos, convertir):
+    """Respuesta JSON (array) serializada en bloques directamente desde el cursor"""
+    return Response(
+        stream_with_context(serializacion.stream_json_array(documentos, convertir)),
+        mimetype='application/json'
+    )
+
+def etag_clientes():
+    """
+    ETag débil de un listado o exportación de clientes en streaming
+
+    El contenido no se arma entero, así que en lugar de su hash se usa la
+    versión de los clientes y la ruta con sus parámetros.
+    """
+    version = versiones.obtener(versiones_collection, 'clientes')
+    return f"clientes-{version}-{compresion.etag_contenido(request.full_path.encode('utf-8'))}"
+
+# Valores por defecto de los campos del cliente
+CAMPOS_DEFAULT_CLIENTE = {
+    'cliente': '',
+    'nombre_negocio': '',
+    'localidad': '',
+    'direccion': '',
+    'barrio': '',
+    'dni': '',
+    'telefono': '12345',
+    'es_cliente': '',
+    'detalle': '',
+    'interes_1': '',
+    'interes_2': '',
+    'interes_3': '',
+    'cantidad_compras': '',
+    'intencion_comprar': 'POCA',
+    'accion': '',
+    'comentario': '',
+    'años': ''
+}
+
+# Campos que se pueden pedir con fields=
+CAMPOS_CLIENTE = ['fecha', 'fecha_nacimiento'] + list(CAMPOS_DEFAULT_CLIENTE)
+
+# Columnas de la tabla de clientes (vista compacta view=lista)
+CAMPOS_VISTA_LISTA = ['cliente', 'nombre_negocio', 'telefono', 'localidad', 'intencion_comprar', 'comentario']
+
+def cliente_to_dict(cliente, campos=None):
+    """
+    Convierte un documento de MongoDB a diccionario con _id como string
+
+    Args:
+        cliente: Documento de MongoDB
+        campos: Si se indica, solo se completan con valores por defecto esos campos
+    """
     if cliente:
         cliente['id'] = str(cliente['_id'])
         del cliente['_id']
 
+        # Campos internos de búsqueda, catálogo de localidades e importación
+        cliente.pop('busqueda', None)
+        cliente.pop('_score', None)
+        cliente.pop('localidad_clave', None)
+        cliente.pop('claves', None)
+
         # Convertir datetime a string
         if 'fecha' in cliente and isinstance(cliente['fecha'], datetime):
             cliente['fecha'] = cliente['fecha'].strftime('%Y-%m-%d')
@@ -51,27 +156,9 @@ def cliente_to_dict(cliente):
             cliente['fecha_nacimiento'] = cliente['fecha_nacimiento'].strftime('%Y-%m-%d')
 
         # Asegurar que todos los campos existan con valores por defecto
-        campos_default = {
-            'cliente': '',
-            'nombre_negocio': '',
-            'localidad': '',
-            'direccion': '',
-            'barrio': '',
-            'dni': '',
-            'telefono': '12345',
-            'es_cliente': '',
-            'detalle': '',
-            'interes_1': '',
-            'interes_2': '',
-            'interes_3': '',
-            'cantidad_compras': '',
-            'intencion_comprar': 'POCA',
-            'accion': '',
-            'comentario': '',
-            'años': ''
-        }
-
-        for campo, default in campos_default.items():
+        for campo, default in CAMPOS_DEFAULT_CLIENTE.items():
+            if campos is not None and campo not in campos:
+                continue
             if campo not in cliente:
                 cliente[campo] = default
 
@@ -81,31 +168,186 @@ def cliente_to_dict(cliente):
 def index():
     return render_template('index.html')
 
-@app.route('/api/clientes', methods=['GET'])
-def get_clientes():
-    localidad = request.args.get('localidad', '')
-    intencion = request.args.get('intencion', '')
-    search = request.args.get('search', '')
+# Paginación del listado de clientes
+PAGINA_DEFAULT = 50
+PAGINA_MAXIMA = 500
+
+def construir_filtro_clientes(args):
+    """Construye el filtro de MongoDB a partir de los parámetros localidad/intencion/search"""
+    localidad = args.get('localidad', '')
+    intencion = args.get('intencion', '')
+    tokens = busqueda.tokens_consulta(args.get('search', ''))
 
-    # Construir filtro de MongoDB
     filtro = {}
 
     if localidad:
-        filtro['localidad'] = {'$regex': localidad, '$options': 'i'}
+        # Una localidad sin letras ni números no coincide con ninguna
+        # (la clave None es la de los clientes sin localidad)
+        filtro['localidad_clave'] = localidades.clave_localidad(localidad) or {'$in': []}
     if intencion:
         filtro['intencion_comprar'] = {'$regex': intencion, '$options': 'i'}
-    if search:
-        filtro['$or'] = [
-            {'cliente': {'$regex': search, '$options': 'i'}},
-            {'nombre_negocio': {'$regex': search, '$options': 'i'}},
-            {'comentario': {'$regex': search, '$options': 'i'}},
-            {'telefono': {'$regex': search, '$options': 'i'}}
-        ]
+    if tokens:
+        filtro.update(busqueda.filtro_busqueda(tokens))
+
+    return filtro
+
+def proyeccion_clientes(args):
+    """
+    Proyección de MongoDB según `view=lista` o `fields=campo1,campo2`
 
-    # Buscar y ordenar por fecha descendente
-    clientes = list(clientes_collection.find(filtro).sort('fecha', -1))
+    Returns:
+        (proyeccion, campos) o (None, None) para el documento completo.
+        `fecha` siempre se incluye porque es parte de la clave de paginación.
+
+    Raises:
+        ValueError: si se pide un campo desconocido
+    """
+    fields = args.get('fields', '')
+    if fields:
+        campos = [c.strip() for c in fields.split(',') if c.strip()]
+        desconocidos = [c for c in campos if c not in CAMPOS_CLIENTE]
+        if desconocidos:
+            raise ValueError(f'Campos inválidos: {", ".join(desconocidos)}')
+    elif args.get('view') == 'lista':
+        campos = list(CAMPOS_VISTA_LISTA)
+    else:
+        return None, None
+
+    if 'fecha' not in campos:
+        campos.append('fecha')
+
+    return {campo: 1 for campo in campos}, campos
+
+def condicion_keyset(claves):
+    """
+    Condición para continuar después de un documento en orden descendente
+
+    Args:
+        claves: Lista [(campo, valor)] con la clave de orden del último documento
+    """
+    terminos = []
+    for i, (campo, valor) in enumerate(claves):
+        iguales = dict(claves[:i])
+        if valor is None:
+            # null ordena al final: no hay nada menor dentro de este tramo
+            continue
+        terminos.append({**iguales, campo: {'$lt': valor}})
+        if campo == 'fecha':
+            terminos.append({**iguales, campo: None})
+    return {'$or': terminos} if terminos else {'_id': None}
+
+def codificar_cursor(documento):
+    """Genera un cursor opaco con la clave ([_score], fecha, _id) del último documento de la página"""
+    fecha = documento.get('fecha')
+    payload = {
+        'f': fecha.isoformat() if isinstance(fecha, datetime) else None,
+        'i': str(documento['_id'])
+    }
+    if '_score' in documento:
+        payload['s'] = documento['_score']
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
 
-    return jsonify([cliente_to_dict(c) for c in clientes])
+def decodificar_cursor(cursor):
+    """Convierte un cursor opaco en la condición keyset para la página siguiente"""
+    payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+
+    claves = []
+    if 's' in payload:
+        claves.append(('_score', payload['s']))
+    claves.append(('fecha', datetime.fromisoformat(payload['f']) if payload.get('f') else None))
+    claves.append(('_id', ObjectId(payload['i'])))
+
+    return condicion_keyset(claves)
+
+def buscar_clientes(filtro, tokens=None, condicion=None, limite=None, proyeccion=None):
+    """
+    Cursor con el listado de clientes
+
+    Sin búsqueda ordena por fecha descendente; con búsqueda ordena primero
+    por relevancia (campo `_score`) y luego por fecha. La proyección se
+    aplica en MongoDB para no transferir campos que no se usan.
+    """
+    if not tokens:
+        if condicion:
+            filtro = {'$and': [filtro, condicion]} if filtro else condicion
+        cursor = clientes_collection.find(filtro, proyeccion).sort([('fecha', -1), ('_id', -1)])
+        if limite:
+            cursor = cursor.limit(limite)
+        return cursor.batch_size(LOTE_STREAMING)
+
+    pipeline = [
+        {'$match': filtro},
+        {'$addFields': {'_score': busqueda.expresion_relevancia(tokens)}}
+    ]
+    if condicion:
+        pipeline.append({'$match': condicion})
+    pipeline.append({'$sort': {'_score': -1, 'fecha': -1, '_id': -1}})
+    if limite:
+        pipeline.append({'$limit': limite})
+    if proyeccion:
+        pipeline.append({'$project': {**proyeccion, '_score': 1}})
+
+    return clientes_collection.aggregate(pipeline, batchSize=LOTE_STREAMING)
+
+@app.route('/api/clientes', methods=['GET'])
+def get_clientes():
+    """
+    Listado de clientes (por relevancia si hay búsqueda, luego por fecha descendente)
+
+    Sin `limit` ni `cursor` devuelve la lista completa (compatibilidad), serializada
+    en streaming desde el cursor para no cargarla entera en memoria.
+    Con `limit` y/o `cursor` devuelve una página: { "items": [...], "next": "<cursor>" | null }
+    Con `view=lista` o `fields=...` devuelve solo esos campos (el documento
+    completo sigue disponible en GET /api/clientes/<id>).
+    """
+    filtro = construir_filtro_clientes(request.args)
+    tokens = busqueda.tokens_consulta(request.args.get('search', ''))
+
+    try:
+        proyeccion, campos = proyeccion_clientes(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def convertir(cliente):
+        return cliente_to_dict(cliente, campos)
+
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        response = respuesta_json_stream(buscar_clientes(filtro, tokens, proyeccion=proyeccion), convertir)
+        response.set_etag(etag_clientes(), weak=True)
+        return response
+
+    try:
+        limit = int(request.args.get('limit', PAGINA_DEFAULT))
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un número'}), 400
+    limit = max(1, min(limit, PAGINA_MAXIMA))
+
+    condicion = None
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        try:
+            condicion = decodificar_cursor(cursor)
+        except Exception:
+            return jsonify({'error': 'Cursor inválido'}), 400
+
+    # Se pide un documento extra para saber si hay página siguiente
+    clientes = list(buscar_clientes(filtro, tokens, condicion, limit + 1, proyeccion))
+
+    siguiente = None
+    if len(clientes) > limit:
+        clientes = clientes[:limit]
+        siguiente = codificar_cursor(clientes[-1])
+
+    return jsonify({
+        'items': [convertir(c) for c in clientes],
+        'next': siguiente
+    })
+
+@app.route('/api/clientes/count', methods=['GET'])
+def count_clientes():
+    """Total de clientes que cumplen los filtros (separado del listado paginado)"""
+    filtro = construir_filtro_clientes(request.args)
+    return jsonify({'total': clientes_collection.count_documents(filtro)})
 
 @app.route('/api/clientes', methods=['POST'])
 def add_cliente():
@@ -145,9 +387,16 @@ def add_cliente():
         except:
             pass
 
+    nuevo_cliente['busqueda'] = busqueda.construir_indice(nuevo_cliente)
+    localidades.preparar(nuevo_cliente)
+    nuevo_cliente['claves'] = importador_clientes.claves_dedup(nuevo_cliente)
+
     # Insertar en MongoDB
     result = clientes_collection.insert_one(nuevo_cliente)
     nuevo_cliente['_id'] = result.inserted_id
+    estadisticas.registrar_alta(estadisticas_collection, nuevo_cliente['intencion_comprar'])
+    localidades.registrar_alta(localidades_collection, nuevo_cliente['localidad'])
+    versiones.incrementar(versiones_collection, 'clientes')
 
     return jsonify(cliente_to_dict(nuevo_cliente)), 201
 
@@ -205,17 +454,50 @@ def update_cliente(id):
         except:
             pass
 
-    # Actualizar en MongoDB
-    result = clientes_collection.update_one(
+    if 'localidad' in update_data:
+        update_data['localidad_clave'] = localidades.clave_localidad(update_data['localidad'])
+
+    # Mantener el índice de búsqueda y las claves de importación si cambia algún campo indexado
+    # (en la misma escritura que los datos)
+    cambia_busqueda = any(campo in update_data for campo in busqueda.CAMPOS_NOMBRE + busqueda.CAMPOS_TEXTO)
+    cambian_claves = any(campo in update_data for campo in ('cliente', 'dni', 'telefono', 'localidad'))
+    if cambia_busqueda or cambian_claves:
+        cliente_actual = clientes_collection.find_one({'_id': object_id})
+        if cliente_actual is None:
+            return jsonify({'error': 'Cliente no encontrado'}), 404
+        combinado = {**cliente_actual, **update_data}
+        if cambia_busqueda:
+            update_data['busqueda'] = busqueda.construir_indice(combinado)
+        if cambian_claves:
+            update_data['claves'] = importador_clientes.claves_dedup(combinado)
+
+    # Actualizar en MongoDB (se recibe el documento previo para los contadores)
+    cliente_anterior = clientes_collection.find_one_and_update(
         {'_id': object_id},
-        {'$set': update_data}
+        {'$set': update_data},
+        return_document=ReturnDocument.BEFORE
     )
 
-    if result.matched_count == 0:
+    if cliente_anterior is None:
         return jsonify({'error': 'Cliente no encontrado'}), 404
 
-    # Obtener cliente actualizado
-    cliente_actualizado = clientes_collection.find_one({'_id': object_id})
+    cliente_actualizado = {**cliente_anterior, **update_data}
+
+    versiones.incrementar(versiones_collection, 'clientes')
+
+    if 'intencion_comprar' in update_data:
+        estadisticas.registrar_cambio(
+            estadisticas_collection,
+            cliente_anterior.get('intencion_comprar'),
+            update_data['intencion_comprar']
+        )
+    if 'localidad' in update_data:
+        localidades.registrar_cambio(
+            localidades_collection,
+            cliente_anterior.get('localidad'),
+            update_data['localidad']
+        )
+
     return jsonify(cliente_to_dict(cliente_actualizado))
 
 @app.route('/api/clientes/<id>', methods=['DELETE'])
@@ -225,36 +507,24 @@ def delete_cliente(id):
     except:
         return jsonify({'error': 'ID inválido'}), 400
 
-    result = clientes_collection.delete_one({'_id': object_id})
+    cliente = clientes_collection.find_one_and_delete(
+        {'_id': object_id},
+        projection={'intencion_comprar': 1, 'localidad': 1}
+    )
 
-    if result.deleted_count == 0:
+    if cliente is None:
         return jsonify({'error': 'Cliente no encontrado'}), 404
 
+    estadisticas.registrar_baja(estadisticas_collection, cliente.get('intencion_comprar'))
+    localidades.registrar_baja(localidades_collection, cliente.get('localidad'))
+    versiones.incrementar(versiones_collection, 'clientes')
+
     return '', 204
 
 @app.route('/api/stats')
 def get_stats():
-    total = clientes_collection.count_documents({})
-
-    # Agregación para contar por intención
-    pipeline = [
-        {
-            '$group': {
-                '_id': '$intencion_comprar',
-                'cantidad': {'$sum': 1}
-            }
-        }
-    ]
-
-    intenciones = list(clientes_collection.aggregate(pipeline))
-
-    return jsonify({
-        'total': total,
-        'por_intencion': [
-            {'intencion': i['_id'], 'cantidad': i['cantidad']}
-            for i in intenciones
-        ]
-    })
+    """Estadísticas del dashboard desde el documento de contadores materializados"""
+    return jsonify(estadisticas.leer(clientes_collection, estadisticas_collection))
 
 @app.route('/api/import-excel', methods=['POST'])
 def import_excel():
@@ -268,161 +538,170 @@ def import_excel():
     if not file.filename.endswith(('.xlsx', '.xls')):
         return jsonify({'error': 'File must be Excel format'}), 400
 
+    # Con clave (dni, telefono o nombre_localidad) los clientes existentes se actualizan
+    clave = request.form.get('clave') or None
+    if clave is not None and clave not in importador_clientes.CLAVES_DEDUP:
+        return jsonify({'error': f'Clave inválida. Claves válidas: {", ".join(importador_clientes.CLAVES_DEDUP)}'}), 400
+
     try:
-        df = pd.read_excel(file)
-
-        # Mapeo de columnas Excel a campos de base de datos
-        column_mapping = {
-            'FECHA': 'fecha',
-            'CLIENTE': 'cliente',
-            'NOMBRE NEGOCIO': 'nombre_negocio',
-            'LOCALIDAD': 'localidad',
-            'DIRECCION': 'direccion',
-            'BARRIO': 'barrio',
-            'DNI': 'dni',
-            'TELEFONO': 'telefono',
-            'TELÉFONO': 'telefono',
-            'ES CLIENTE?': 'es_cliente',
-            'DETALLE': 'detalle',
-            'INTERES 1 ': 'interes_1',
-            'INTERES 1': 'interes_1',
-            'INTERES 2': 'interes_2',
-            'INTERES 3': 'interes_3',
-            'CANTIDAD COMPRAS': 'cantidad_compras',
-            'INTENCION DE COMPRAR': 'intencion_comprar',
-            'ACCION': 'accion',
-            'COMENTARIO': 'comentario',
-            'FECHA DE NACIMIENTO': 'fecha_nacimiento',
-            'AÑOS': 'años'
-        }
+        resultado = importador_clientes.importar_archivo(file, db, clave=clave)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        df = df.rename(columns=column_mapping)
+    if clave is None:
+        return jsonify({'message': f"{resultado['importados']} clientes importados correctamente"})
 
-        imported_count = 0
-        documentos = []
+    ambiguos = f", {resultado['ambiguos']} sin aplicar (la clave la tienen varios clientes)" if resultado['ambiguos'] else ''
 
-        for _, row in df.iterrows():
-            # Validar que tenga al menos el campo cliente
-            if pd.isna(row.get('cliente')) or not str(row.get('cliente')).strip():
-                continue
+    return jsonify({
+        'message': (
+            f"{resultado['insertados']} clientes nuevos, {resultado['actualizados']} actualizados, "
+            f"{resultado['sin_cambios']} sin cambios{ambiguos}"
+        ),
+        'stats': resultado
+    })
 
-            documento = {
-                'cliente': str(row.get('cliente', '')).strip(),
-                'nombre_negocio': str(row.get('nombre_negocio', '')) if pd.notna(row.get('nombre_negocio')) else None,
-                'localidad': str(row.get('localidad', '')) if pd.notna(row.get('localidad')) else None,
-                'direccion': str(row.get('direccion', '')) if pd.notna(row.get('direccion')) else None,
-                'barrio': str(row.get('barrio', '')) if pd.notna(row.get('barrio')) else None,
-                'dni': str(row.get('dni', '')) if pd.notna(row.get('dni')) else None,
-                'telefono': str(row.get('telefono', '12345')) if pd.notna(row.get('telefono')) else '12345',
-                'es_cliente': str(row.get('es_cliente', '')) if pd.notna(row.get('es_cliente')) else None,
-                'detalle': str(row.get('detalle', '')) if pd.notna(row.get('detalle')) else None,
-                'interes_1': str(row.get('interes_1', '')) if pd.notna(row.get('interes_1')) else None,
-                'interes_2': str(row.get('interes_2', '')) if pd.notna(row.get('interes_2')) else None,
-                'interes_3': str(row.get('interes_3', '')) if pd.notna(row.get('interes_3')) else None,
-                'cantidad_compras': str(row.get('cantidad_compras', '')) if pd.notna(row.get('cantidad_compras')) else None,
-                'intencion_comprar': str(row.get('intencion_comprar', 'POCA')).strip().upper(),
-                'accion': str(row.get('accion', '')) if pd.notna(row.get('accion')) else None,
-                'comentario': str(row.get('comentario', '')) if pd.notna(row.get('comentario')) else None
-            }
+@app.route('/api/export-excel')
+def export_excel():
+    """Exportar clientes a Excel (acepta los mismos filtros que /api/clientes)"""
+    return exportar_clientes('xlsx')
 
-            # Fecha de registro
-            if pd.notna(row.get('fecha')):
-                try:
-                    documento['fecha'] = pd.to_datetime(row['fecha']).to_pydatetime()
-                except:
-                    documento['fecha'] = datetime.now()
-            else:
-                documento['fecha'] = datetime.now()
+@app.route('/api/export/<formato>')
+def exportar_clientes(formato):
+    """
+    Exportar clientes filtrados en xlsx, csv o jsonl
+    Query params: search, localidad, intencion (igual que /api/clientes)
+    """
+    if formato not in exportacion.FORMATOS:
+        return jsonify({'error': f'Formato inválido. Formatos válidos: {", ".join(exportacion.FORMATOS)}'}), 400
+
+    filtro = construir_filtro_clientes(request.args)
+    tokens = busqueda.tokens_consulta(request.args.get('search', ''))
+    clientes = buscar_clientes(filtro, tokens, proyeccion=exportacion.PROYECCION)
+
+    if formato == 'xlsx':
+        return send_file(
+            exportacion.exportar_xlsx(clientes),
+            mimetype=exportacion.MIMETYPE_XLSX,
+            as_attachment=True,
+            download_name=exportacion.nombre_archivo('xlsx')
+        )
+
+    if formato == 'csv':
+        generador, mimetype = exportacion.stream_csv(clientes), exportacion.MIMETYPE_CSV
+    else:
+        generador, mimetype = exportacion.stream_jsonl(clientes), exportacion.MIMETYPE_JSONL
 
-            # Fecha de nacimiento
-            if pd.notna(row.get('fecha_nacimiento')):
-                try:
-                    documento['fecha_nacimiento'] = pd.to_datetime(row['fecha_nacimiento']).to_pydatetime()
-                except:
-                    pass
+    response = Response(
+        stream_with_context(generador),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={exportacion.nombre_archivo(formato)}'}
+    )
+    response.set_etag(etag_clientes(), weak=True)
+    return response
 
-            # Edad
-            if pd.notna(row.get('años')):
-                try:
-                    documento['años'] = int(row['años'])
-                except:
-                    pass
+# TRABAJOS DE EXPORTACION
 
-            documentos.append(documento)
-            imported_count += 1
+def generar_exportacion(trabajo_id, formato, filtros):
+    """Cuerpo del trabajo de exportación (corre en el pool de trabajos)"""
+    filtro = construir_filtro_clientes(filtros)
+    tokens = busqueda.tokens_consulta(filtros.get('search', ''))
 
-        # Insertar todos los documentos en MongoDB
-        if documentos:
-            clientes_collection.insert_many(documentos)
+    trabajos.reportar_progreso(
+        trabajos_collection, trabajo_id,
+        procesados=0, total=clientes_collection.count_documents(filtro)
+    )
 
-        return jsonify({'message': f'{imported_count} clientes importados correctamente'})
+    clientes = buscar_clientes(filtro, tokens, proyeccion=exportacion.PROYECCION)
+    ruta = exportacion.ruta_artefacto(trabajo_id, formato)
+    exportacion.escribir_archivo(trabajos.con_progreso(clientes, trabajos_collection, trabajo_id), formato, ruta)
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return {'archivo': os.path.basename(ruta), 'formato': formato}
 
-@app.route('/api/export-excel')
-def export_excel():
-    clientes = list(clientes_collection.find())
-
-    data = []
-    for c in clientes:
-        data.append({
-            'FECHA': c.get('fecha').strftime('%Y-%m-%d') if c.get('fecha') else '',
-            'CLIENTE': c.get('cliente', ''),
-            'NOMBRE NEGOCIO': c.get('nombre_negocio', ''),
-            'LOCALIDAD': c.get('localidad', ''),
-            'DIRECCION': c.get('direccion', ''),
-            'BARRIO': c.get('barrio', ''),
-            'DNI': c.get('dni', ''),
-            'TELEFONO': c.get('telefono', '12345'),
-            'ES CLIENTE?': c.get('es_cliente', ''),
-            'DETALLE': c.get('detalle', ''),
-            'INTERES 1': c.get('interes_1', ''),
-            'INTERES 2': c.get('interes_2', ''),
-            'INTERES 3': c.get('interes_3', ''),
-            'CANTIDAD COMPRAS': c.get('cantidad_compras', ''),
-            'INTENCION DE COMPRAR': c.get('intencion_comprar', ''),
-            'ACCION': c.get('accion', ''),
-            'COMENTARIO': c.get('comentario', ''),
-            'FECHA DE NACIMIENTO': c.get('fecha_nacimiento').strftime('%Y-%m-%d') if c.get('fecha_nacimiento') else '',
-            'AÑOS': c.get('años', '')
-        })
+@app.route('/api/export-jobs', methods=['POST'])
+def crear_trabajo_exportacion():
+    """
+    Encolar una exportación en segundo plano
+    Body: { "formato": "xlsx" | "csv" | "jsonl", "search": "...", "localidad": "...", "intencion": "..." }
+    Si ya existe el mismo archivo para la versión actual de los datos, se reutiliza.
+    """
+    data = request.json or {}
+    formato = data.get('formato', 'xlsx')
 
-    df = pd.DataFrame(data)
+    if formato not in exportacion.FORMATOS:
+        return jsonify({'error': f'Formato inválido. Formatos válidos: {", ".join(exportacion.FORMATOS)}'}), 400
 
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Clientes')
-    output.seek(0)
+    filtros = {f: str(data.get(f) or '') for f in exportacion.FILTROS}
+    clave = exportacion.clave_exportacion(
+        formato, filtros, versiones.obtener(versiones_collection, 'clientes')
+    )
+
+    exportacion.limpiar_vencidos(trabajos_collection)
+
+    existente = trabajos.buscar_reutilizable(trabajos_collection, 'exportacion', clave)
+    if existente:
+        archivo = (existente.get('resultado') or {}).get('archivo')
+        en_curso = existente['estado'] != trabajos.COMPLETADO
+        if en_curso or (archivo and os.path.exists(os.path.join(exportacion.EXPORTS_DIR, archivo))):
+            trabajo = trabajos.trabajo_to_dict(existente)
+            trabajo['reutilizado'] = True
+            return jsonify(trabajo)
+
+    trabajo = trabajos.crear(
+        trabajos_collection, 'exportacion',
+        {'formato': formato, 'filtros': filtros}, clave
+    )
+    trabajos.ejecutar(trabajos_collection, trabajo['_id'], generar_exportacion, trabajo['_id'], formato, filtros)
+
+    return jsonify(trabajos.trabajo_to_dict(trabajo)), 202
+
+@app.route('/api/export-jobs/<id>', methods=['GET'])
+def get_trabajo_exportacion(id):
+    """Estado y progreso de un trabajo de exportación"""
+    trabajo = trabajos.obtener(trabajos_collection, id)
+
+    if not trabajo or trabajo['tipo'] != 'exportacion':
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    return jsonify(trabajos.trabajo_to_dict(trabajo))
+
+@app.route('/api/export-jobs/<id>/archivo', methods=['GET'])
+def descargar_trabajo_exportacion(id):
+    """Descargar el archivo generado por un trabajo completado"""
+    trabajo = trabajos.obtener(trabajos_collection, id)
+
+    if not trabajo or trabajo['tipo'] != 'exportacion':
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    if trabajo['estado'] != trabajos.COMPLETADO:
+        return jsonify({'error': 'El trabajo todavía no terminó', 'estado': trabajo['estado']}), 409
+
+    formato = trabajo['resultado']['formato']
+    ruta = os.path.join(exportacion.EXPORTS_DIR, trabajo['resultado']['archivo'])
+
+    if not os.path.exists(ruta):
+        return jsonify({'error': 'El archivo ya no está disponible'}), 410
 
     return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        os.path.abspath(ruta),
+        mimetype=exportacion.MIMETYPES[formato],
         as_attachment=True,
-        download_name=f'clientes_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        download_name=exportacion.nombre_archivo(formato)
     )
 
 @app.route('/api/localidades')
 def get_localidades():
-    # Obtener localidades únicas usando aggregation
-    pipeline = [
-        {
-            '$match': {
-                'localidad': {'$ne': None, '$ne': ''}
-            }
-        },
-        {
-            '$group': {
-                '_id': '$localidad'
-            }
-        },
-        {
-            '$sort': {'_id': 1}
-        }
-    ]
+    """
+    Localidades desde el catálogo normalizado (caché en memoria; la primera
+    lectura en una base sin catálogo lo reconstruye)
+    Con ?detalle=1 devuelve [{clave, nombre, cantidad}] en lugar de solo los nombres
+    """
+    catalogo = localidades.listar(localidades_collection, clientes_collection)
+
+    if request.args.get('detalle'):
+        return jsonify(catalogo)
 
-    localidades = list(clientes_collection.aggregate(pipeline))
-    return jsonify([l['_id'] for l in localidades])
+    return jsonify([l['nombre'] for l in catalogo])
 
 # ==========================================
 # ENDPOINTS PARA PRODUCTOS Y CALCULOS
@@ -434,101 +713,83 @@ def producto_to_dict(producto):
         producto['id'] = str(producto['_id'])
         del producto['_id']
 
+        # Índice de búsqueda y clave de importación (campos internos)
+        producto.pop('busqueda', None)
+        producto.pop('clave_nombre', None)
+
         if 'fecha_actualizacion' in producto and isinstance(producto['fecha_actualizacion'], datetime):
             producto['fecha_actualizacion'] = producto['fecha_actualizacion'].strftime('%Y-%m-%d %H:%M:%S')
 
     return producto
 
-def calcular_precios_por_dia(precio_lista):
-    """Calcula los precios por día según las fórmulas de recargo"""
-    return {
-        '42': round((precio_lista * 1.23) / 42, 3),
-        '84': round((precio_lista * 1.42) / 84, 3),
-        '135': round((precio_lista * 1.58) / 135, 3),
-        '175': round((precio_lista * 1.75) / 175, 3),
-        '220': round((precio_lista * 1.92) / 220, 3)
-    }
-
-def calcular_precio_final(precio_lista, plan):
-    """
-    Calcula el precio final según el plan seleccionado
-
-    Args:
-        precio_lista: Precio base del producto
-        plan: Nombre del plan (ej: 'contado_efectivo', '42_dias', etc.)
-
-    Returns:
-        Dict con el desglose completo del cálculo
-    """
-    # Tabla de descuentos según planes
-    descuentos = {
-        'contado_efectivo': 34.39,
-        '42_dias': 30.75,
-        '84_dias': 27.1,
-        '135_dias': 27.1,
-        '175_dias': 27.1,
-        '220_dias': 27.1
-    }
-
-    # Tabla de recargos por financiación
-    recargos = {
-        42: 23,
-        84: 42,
-        135: 58,
-        175: 75,
-        220: 92
-    }
-
-    if plan == 'contado_efectivo':
-        descuento_porcentaje = descuentos['contado_efectivo']
-        precio_final = precio_lista * (1 - descuento_porcentaje / 100)
+def producto_duplicado(producto):
+    """Mensaje para un alta o edición rechazada por los índices únicos de claves"""
+    if producto.get('codigo'):
+        return f"Ya existe un producto con el código {producto['codigo']}"
+    return f"Ya existe un producto sin código con el nombre {producto.get('nombre', '')}"
 
-        return {
-            'tipo': 'contado',
-            'precio_base': round(precio_lista, 2),
-            'descuento_porcentaje': descuento_porcentaje,
-            'precio_final': round(precio_final, 2),
-            'cuota': None,
-            'dias': None,
-            'total': round(precio_final, 2)
-        }
-    else:
-        # Extraer días del nombre del plan
-        dias = int(plan.split('_')[0])
-
-        # Calcular precio por día
-        recargo_porcentaje = recargos[dias]
-        precio_con_recargo = precio_lista * (1 + recargo_porcentaje / 100)
-        precio_por_dia = precio_con_recargo / dias
-
-        # Aplicar descuento
-        descuento_porcentaje = descuentos[plan]
-        precio_por_dia_final = precio_por_dia * (1 - descuento_porcentaje / 100)
-        total = precio_por_dia_final * dias
-
-        return {
-            'tipo': 'financiado',
-            'precio_base': round(precio_lista, 2),
-            'recargo_porcentaje': recargo_porcentaje,
-            'precio_con_recargo': round(precio_con_recargo, 2),
-            'precio_por_dia_sin_descuento': round(precio_por_dia, 3),
-            'descuento_porcentaje': descuento_porcentaje,
-            'precio_por_dia_final': round(precio_por_dia_final, 3),
-            'dias': dias,
-            'total': round(total, 2)
-        }
+def tablas_planes():
+    """Planes de pago vigentes (desde la caché de planes)"""
+    return planes.obtener(planes_descuento_collection, versiones_collection)
 
 # ENDPOINTS PRODUCTOS
 
 @app.route('/api/productos', methods=['GET'])
 def get_productos():
-    """Obtener todos los productos"""
+    """
+    Obtener todos los productos activos
+    Se sirven desde el snapshot en memoria del catálogo con su ETag (el 304
+    a If-None-Match y la compresión los resuelve compresion.procesar).
+    """
     try:
-        productos = list(productos_collection.find({'activo': True}).sort('nombre', 1))
-        return jsonify([producto_to_dict(p) for p in productos])
+        snapshot = catalogo.obtener(productos_collection, versiones_collection, producto_to_dict)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    response = Response(snapshot['contenido'], mimetype='application/json')
+    response.set_etag(snapshot['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/productos/search', methods=['GET'])
+def search_productos():
+    """
+    Buscar productos activos por código (exacto o prefijo) o por nombre (trigramas)
+    Query params: q, limit (por defecto 20, máximo 100), offset
+    Devuelve { "items": [...], "next": <offset de la página siguiente> | null }
+    """
+    codigo, trigramas = busqueda_productos.consulta(request.args.get('q', ''))
+    if not codigo and not trigramas:
+        return jsonify({'error': 'q es requerido'}), 400
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', busqueda_productos.LIMITE_DEFAULT)), busqueda_productos.LIMITE_MAXIMO))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'limit y offset deben ser números'}), 400
+
+    # Se pide uno de más para saber si hay otra página
+    resultados = list(productos_collection.aggregate(
+        busqueda_productos.pipeline(
+            codigo, trigramas, offset, limit + 1,
+            frecuencias_trigramas=busqueda_productos.frecuencias(productos_collection)
+        )
+    ))
+
+    items = []
+    for producto in resultados[:limit]:
+        coincidencia = 'codigo' if producto.pop('_codigo') else 'nombre'
+        parecido = producto.pop('_parecido')
+        producto = producto_to_dict(producto)
+        producto['coincidencia'] = coincidencia
+        producto['parecido'] = round(parecido, 2)
+        items.append(producto)
+
+    return jsonify({
+        'items': items,
+        'next': offset + limit if len(resultados) > limit else None
+    })
+
 @app.route('/api/productos/<id>', methods=['GET'])
 def get_producto(id):
     """Obtener un producto por ID"""
@@ -568,11 +829,17 @@ def add_producto():
     }
 
     # Calcular precios por día
-    precios_por_dia = calcular_precios_por_dia(precio_lista)
+    precios_por_dia = listas_precios.calcular_precios_por_dia(precio_lista, tablas_planes()['recargos_por_dia'])
     nuevo_producto['precios_por_dia'] = precios_por_dia
+    claves_productos.preparar(nuevo_producto)
+    busqueda_productos.preparar(nuevo_producto)
 
-    result = productos_collection.insert_one(nuevo_producto)
+    try:
+        result = productos_collection.insert_one(nuevo_producto)
+    except DuplicateKeyError:
+        return jsonify({'error': producto_duplicado(nuevo_producto)}), 409
     nuevo_producto['_id'] = result.inserted_id
+    versiones.incrementar(versiones_collection, 'productos')
 
     return jsonify(producto_to_dict(nuevo_producto)), 201
 
@@ -599,18 +866,33 @@ def update_producto(id):
             precio_lista = float(data['precio_lista'])
             update_data['precio_lista'] = precio_lista
             # Recalcular precios por día
-            update_data['precios_por_dia'] = calcular_precios_por_dia(precio_lista)
+            update_data['precios_por_dia'] = listas_precios.calcular_precios_por_dia(precio_lista, tablas_planes()['recargos_por_dia'])
         except:
             return jsonify({'error': 'Precio de lista debe ser un número'}), 400
 
-    result = productos_collection.update_one(
-        {'_id': object_id},
-        {'$set': update_data}
-    )
+    # Si cambia el código o el nombre se rehacen las claves y el índice de búsqueda
+    if 'codigo' in update_data or 'nombre' in update_data:
+        actual = productos_collection.find_one({'_id': object_id}, {'codigo': 1, 'nombre': 1})
+        if not actual:
+            return jsonify({'error': 'Producto no encontrado'}), 404
+        claves = claves_productos.preparar({'codigo': actual.get('codigo'), 'nombre': actual.get('nombre'), **update_data})
+        update_data['codigo'] = claves['codigo']
+        update_data['clave_nombre'] = claves['clave_nombre']
+        update_data['busqueda'] = busqueda_productos.construir_indice(claves)
+
+    try:
+        result = productos_collection.update_one(
+            {'_id': object_id},
+            {'$set': update_data}
+        )
+    except DuplicateKeyError:
+        return jsonify({'error': producto_duplicado(update_data)}), 409
 
     if result.matched_count == 0:
         return jsonify({'error': 'Producto no encontrado'}), 404
 
+    versiones.incrementar(versiones_collection, 'productos')
+
     producto = productos_collection.find_one({'_id': object_id})
     return jsonify(producto_to_dict(producto))
 
@@ -630,8 +912,100 @@ def delete_producto(id):
     if result.matched_count == 0:
         return jsonify({'error': 'Producto no encontrado'}), 404
 
+    versiones.incrementar(versiones_collection, 'productos')
+
     return '', 204
 
+# RECALCULO DE PRECIOS POR DIA
+
+def procesar_recalculo_precios(trabajo_id):
+    """Cuerpo del trabajo de recálculo de precios por día (corre en el pool de trabajos)"""
+    def al_avanzar(escritos, total):
+        trabajos.reportar_progreso(trabajos_collection, trabajo_id, escritos=escritos, cambios=total)
+
+    return recalculo_precios.recalcular_catalogo(db, al_avanzar=al_avanzar)
+
+def encolar_recalculo_precios():
+    """Encola el recálculo de precios por día (o devuelve el que ya está en curso)"""
+    existente = trabajos.buscar_en_curso(trabajos_collection, 'recalculo_precios', 'catalogo')
+    if existente:
+        trabajo = trabajos.trabajo_to_dict(existente)
+        trabajo['reutilizado'] = True
+        return trabajo
+
+    trabajo = trabajos.crear(trabajos_collection, 'recalculo_precios', {}, 'catalogo')
+    trabajos.ejecutar(trabajos_collection, trabajo['_id'], procesar_recalculo_precios, trabajo['_id'])
+
+    return trabajos.trabajo_to_dict(trabajo)
+
+@app.route('/api/productos/recalcular-precios', methods=['POST'])
+def recalcular_precios_productos():
+    """
+    Recalcular en segundo plano los precios por día guardados de todo el catálogo
+    Solo se escriben los productos cuyos valores cambiaron. Responde 202 con el
+    trabajo (o el que ya está en curso); el resultado son las estadísticas.
+    """
+    return jsonify(encolar_recalculo_precios()), 202
+
+@app.route('/api/productos/recalcular-precios/<id>', methods=['GET'])
+def get_trabajo_recalculo_precios(id):
+    """Estado, progreso y estadísticas de un recálculo de precios por día"""
+    trabajo = trabajos.obtener(trabajos_collection, id)
+
+    if not trabajo or trabajo['tipo'] != 'recalculo_precios':
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    return jsonify(trabajos.trabajo_to_dict(trabajo))
+
+# PLANES DE PAGO
+
+@app.route('/api/planes', methods=['GET'])
+def get_planes():
+    """Planes de pago vigentes, en orden"""
+    tablas = tablas_planes()
+    return jsonify({'version': tablas['version'], 'planes': list(tablas['planes'].values())})
+
+@app.route('/api/planes/<id>', methods=['PUT'])
+def update_plan(id):
+    """
+    Modificar un plan de pago
+    Body: { "nombre": "...", "recargo": 23, "descuento": 30.75, "orden": 1 } (todos opcionales)
+    Si cambia el recargo se encola el recálculo de los precios por día del catálogo.
+    """
+    data = request.json or {}
+    campos = {campo: data[campo] for campo in planes.CAMPOS_EDITABLES if campo in data}
+
+    if not campos:
+        return jsonify({'error': f'Nada para actualizar. Campos: {", ".join(planes.CAMPOS_EDITABLES)}'}), 400
+
+    # Porcentajes: el descuento entre 0 y 100, el recargo no negativo
+    limites = {'descuento': 100, 'recargo': None}
+    for campo, maximo in limites.items():
+        if campo in campos:
+            valor = campos[campo]
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor < 0 or (maximo is not None and valor > maximo):
+                return jsonify({'error': f'{campo} inválido'}), 400
+
+    if 'orden' in campos and (isinstance(campos['orden'], bool) or not isinstance(campos['orden'], int)):
+        return jsonify({'error': 'orden inválido'}), 400
+
+    if 'nombre' in campos and not str(campos['nombre']).strip():
+        return jsonify({'error': 'nombre inválido'}), 400
+
+    anterior = tablas_planes()['planes'].get(id)
+    documento = planes.actualizar(planes_descuento_collection, versiones_collection, id, campos)
+
+    if not documento:
+        return jsonify({'error': 'Plan no encontrado'}), 404
+
+    plan = planes.armar_tablas([documento], None)['planes'][id]
+    respuesta = {'plan': plan}
+
+    if documento.get('dias') and (not anterior or anterior['recargo'] != plan['recargo']):
+        respuesta['recalculo'] = encolar_recalculo_precios()
+
+    return jsonify(respuesta)
+
 # ENDPOINT DE CALCULO
 
 @app.route('/api/calcular', methods=['POST'])
@@ -659,24 +1033,218 @@ def calcular():
     precio_lista = producto['precio_lista']
 
     # Validar plan
-    planes_validos = ['contado_efectivo', '42_dias', '84_dias', '135_dias', '175_dias', '220_dias']
+    planes_validos = tablas_planes()['planes']
     if plan not in planes_validos:
         return jsonify({'error': f'Plan inválido. Planes válidos: {", ".join(planes_validos)}'}), 400
 
-    resultado = calcular_precio_final(precio_lista, plan)
+    resultado = planes.calcular_precio_final(precio_lista, planes_validos[plan])
     resultado['producto'] = {
         'id': str(producto['_id']),
-        'codigo': producto.get('codigo', ''),
+        'codigo': producto.get('codigo') or '',
         'nombre': producto.get('nombre', '')
     }
 
     return jsonify(resultado)
 
+# Máximo de productos por cotización
+MAX_PRODUCTOS_COTIZACION = 500
+
+@app.route('/api/calcular/lote', methods=['POST'])
+def calcular_lote():
+    """
+    Cotizar una canasta de productos en varios planes con una sola consulta
+    Body: {
+        "productos": [{"id": "...", "cantidad": 2}, "..."],   (o bien)
+        "filtro": {"codigos": ["05001", ...], "nombre": "mesa"},
+        "planes": ["contado_efectivo", "42_dias"]              (opcional, todos)
+    }
+    Un producto repetido en "productos" suma las cantidades.
+    """
+    data = request.json or {}
+    tablas = tablas_planes()
+
+    ids_planes = data.get('planes') or list(tablas['planes'])
+    if not isinstance(ids_planes, list) or any(plan not in tablas['planes'] for plan in ids_planes):
+        return jsonify({'error': f'Plan inválido. Planes válidos: {", ".join(tablas["planes"])}'}), 400
+    lista_planes = [tablas['planes'][plan] for plan in dict.fromkeys(ids_planes)]
+
+    cantidades = {}
+    if data.get('productos'):
+        if not isinstance(data['productos'], list):
+            return jsonify({'error': 'productos debe ser una lista'}), 400
+        for item in data['productos']:
+            item = item if isinstance(item, dict) else {'id': item}
+            cantidad = item.get('cantidad', 1)
+            if isinstance(cantidad, bool) or not isinstance(cantidad, (int, float)) or cantidad <= 0:
+                return jsonify({'error': 'cantidad inválida'}), 400
+            try:
+                object_id = ObjectId(item.get('id'))
+            except:
+                return jsonify({'error': f'producto_id inválido: {item.get("id")}'}), 400
+            cantidades[object_id] = cantidades.get(object_id, 0) + cantidad
+        consulta = {'_id': {'$in': list(cantidades)}}
+    elif isinstance(data.get('filtro'), dict) and data['filtro']:
+        filtro = data['filtro']
+        consulta = {'activo': True}
+        if filtro.get('codigos'):
+            consulta['codigo'] = {'$in': [str(codigo).strip() for codigo in filtro['codigos']]}
+        if filtro.get('nombre'):
+            consulta['nombre'] = {'$regex': re.escape(str(filtro['nombre']).strip()), '$options': 'i'}
+        if len(consulta) == 1:
+            return jsonify({'error': 'filtro sin criterios (codigos o nombre)'}), 400
+    else:
+        return jsonify({'error': 'productos o filtro son requeridos'}), 400
+
+    if len(cantidades) > MAX_PRODUCTOS_COTIZACION:
+        return jsonify({'error': f'Máximo {MAX_PRODUCTOS_COTIZACION} productos por cotización'}), 400
+
+    productos = list(productos_collection.find(
+        consulta, {'codigo': 1, 'nombre': 1, 'precio_lista': 1}
+    ).sort('nombre', 1).limit(MAX_PRODUCTOS_COTIZACION + 1))
+
+    if len(productos) > MAX_PRODUCTOS_COTIZACION:
+        return jsonify({'error': f'El filtro devuelve más de {MAX_PRODUCTOS_COTIZACION} productos'}), 400
+
+    encontrados = {producto['_id'] for producto in productos}
+    no_encontrados = [str(object_id) for object_id in cantidades if object_id not in encontrados]
+
+    items = []
+    sin_precio = []
+    for producto in productos:
+        precio_lista = producto.get('precio_lista')
+        if isinstance(precio_lista, bool) or not isinstance(precio_lista, (int, float)):
+            sin_precio.append(str(producto['_id']))
+            continue
+        items.append({
+            'producto': {
+                'id': str(producto['_id']),
+                'codigo': producto.get('codigo') or '',
+                'nombre': producto.get('nombre', '')
+            },
+            'precio_lista': precio_lista,
+            'cantidad': cantidades.get(producto['_id'], 1)
+        })
+
+    if not items:
+        return jsonify({'error': 'Ningún producto para cotizar', 'no_encontrados': no_encontrados}), 404
+
+    resultado = planes.cotizar(items, lista_planes)
+    resultado['no_encontrados'] = no_encontrados
+    resultado['sin_precio'] = sin_precio
+
+    return jsonify(resultado)
+
 # ENDPOINT DE IMPORTACION
 
+# Directorio donde se guardan las listas subidas mientras se procesan
+UPLOADS_DIR = os.getenv('UPLOADS_DIR', 'uploads')
+
+# Cada cuánto el endpoint de eventos revisa el estado del trabajo (segundos)
+INTERVALO_EVENTOS = 0.5
+
+# Duración máxima de cada respuesta de eventos (segundos): así no ocupa un
+# worker de gunicorn durante toda la importación; EventSource se reconecta
+DURACION_EVENTOS = 15
+
+def guardar_subida(file, extension):
+    """
+    Copia el archivo subido a un temporal con nombre único (dos subidas con el
+    mismo nombre no se pisan) y devuelve su ruta
+    """
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    fd, ruta = tempfile.mkstemp(dir=UPLOADS_DIR, prefix='lista_', suffix=extension)
+    with os.fdopen(fd, 'wb') as destino:
+        shutil.copyfileobj(file.stream, destino)
+    return ruta
+
+def procesar_importacion_productos(trabajo_id, formato, ruta, nombre, huella, diferencias):
+    """
+    Cuerpo del trabajo de importación de una lista de precios (corre en el
+    pool de trabajos). Con `diferencias` solo calcula y guarda la revisión.
+    """
+    def progreso(**campos):
+        trabajos.reportar_progreso(trabajos_collection, trabajo_id, **campos)
+
+    try:
+        # Si es exactamente la última lista aplicada no hace falta ni leerla
+        cantidad = None if diferencias else importador_productos.lista_ya_aplicada(db, huella)
+        if cantidad is not None:
+            return {
+                'message': 'La lista ya estaba aplicada, no hay cambios',
+                'stats': importador_productos.stats_sin_cambios(cantidad),
+                'total_procesados': cantidad,
+                'errores_paginas': []
+            }
+
+        progreso(fase='leyendo')
+
+        if formato == 'pdf':
+            # Páginas repartidas entre procesos; las ya vistas salen de la caché
+            productos, errores_paginas = extraccion_pdf.extraer_productos(
+                ruta, al_avanzar=lambda pagina, paginas, _: progreso(pagina=pagina, paginas=paginas)
+            )
+        else:
+            productos = excel_productos.procesar_excel(ruta, huella)
+            errores_paginas = []
+
+        progreso(fase='comparando', productos=len(productos))
+
+        if diferencias:
+            informe = importador_productos.revisar_lista(db, productos, nombre)
+            informe['total_procesados'] = len(productos)
+            informe['errores_paginas'] = errores_paginas
+            return informe
+
+        progreso(fase='escribiendo', escritos=0)
+        stats = importador_productos.importar_productos(
+            db, productos, huella=huella,
+            al_avanzar=lambda escritos, total: progreso(escritos=escritos, cambios=total)
+        )
+
+        return {
+            'message': f"{stats['creados']} productos importados, {stats['actualizados']} actualizados",
+            'stats': stats,
+            'total_procesados': len(productos),
+            'errores_paginas': errores_paginas
+        }
+    finally:
+        os.remove(ruta)
+
+def encolar_importacion_productos(file, formato):
+    """
+    Guarda la subida y encola su importación; responde enseguida con el trabajo
+    Si la misma lista ya se está procesando se devuelve ese trabajo.
+    """
+    diferencias = bool(request.values.get('diferencias'))
+    huella = cache_listas.huella_archivo(file)
+    clave = f'{formato}:{huella}:{int(diferencias)}'
+
+    existente = trabajos.buscar_en_curso(trabajos_collection, 'importacion_productos', clave)
+    if existente:
+        trabajo = trabajos.trabajo_to_dict(existente)
+        trabajo['reutilizado'] = True
+        return jsonify(trabajo), 202
+
+    ruta = guardar_subida(file, f'.{formato}' if formato == 'pdf' else os.path.splitext(file.filename)[1])
+
+    trabajo = trabajos.crear(
+        trabajos_collection, 'importacion_productos',
+        {'formato': formato, 'archivo': file.filename, 'diferencias': diferencias}, clave
+    )
+    trabajos.ejecutar(
+        trabajos_collection, trabajo['_id'], procesar_importacion_productos,
+        trabajo['_id'], formato, ruta, file.filename, huella, diferencias
+    )
+
+    return jsonify(trabajos.trabajo_to_dict(trabajo)), 202
+
 @app.route('/api/import-productos-excel', methods=['POST'])
 def import_productos_excel():
-    """Importar productos desde Excel (hoja de precios)"""
+    """
+    Importar productos desde Excel (hoja de precios) en segundo plano
+    Responde 202 con el trabajo; el resultado queda en /api/import-jobs/<id>.
+    Con diferencias=1 no escribe nada: el resultado es qué cambiaría y el id para aplicarlo
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
 
@@ -688,95 +1256,17 @@ def import_productos_excel():
         return jsonify({'error': 'File must be Excel format'}), 400
 
     try:
-        # Leer Excel
-        df = pd.read_excel(file)
-
-        # Validar columnas necesarias
-        if 'Producto' not in df.columns or 'Lista' not in df.columns:
-            return jsonify({'error': 'Excel debe contener columnas: Producto, Lista'}), 400
-
-        imported_count = 0
-        updated_count = 0
-
-        for _, row in df.iterrows():
-            # Validar que tenga producto y precio
-            if pd.isna(row.get('Producto')) or pd.isna(row.get('Lista')):
-                continue
-
-            nombre = str(row['Producto']).strip()
-            precio_lista = float(row['Lista'])
-
-            # Verificar si ya existe (por nombre)
-            producto_existente = productos_collection.find_one({'nombre': nombre})
-
-            if producto_existente:
-                # Actualizar
-                productos_collection.update_one(
-                    {'_id': producto_existente['_id']},
-                    {'$set': {
-                        'precio_lista': precio_lista,
-                        'precios_por_dia': calcular_precios_por_dia(precio_lista),
-                        'fecha_actualizacion': datetime.now()
-                    }}
-                )
-                updated_count += 1
-            else:
-                # Crear nuevo
-                nuevo_producto = {
-                    'codigo': '',
-                    'nombre': nombre,
-                    'precio_lista': precio_lista,
-                    'precios_por_dia': calcular_precios_por_dia(precio_lista),
-                    'fecha_actualizacion': datetime.now(),
-                    'activo': True
-                }
-                productos_collection.insert_one(nuevo_producto)
-                imported_count += 1
-
-        return jsonify({
-            'message': f'{imported_count} productos importados, {updated_count} actualizados'
-        })
-
+        return encolar_importacion_productos(file, 'excel')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/import-productos-pdf', methods=['POST'])
 def import_productos_pdf():
     """
-    Importa/actualiza productos desde PDF de lista de precios
+    Importa/actualiza productos desde PDF de lista de precios en segundo plano
+    Responde 202 con el trabajo; el resultado queda en /api/import-jobs/<id>.
+    Con diferencias=1 no escribe nada: el resultado es qué cambiaría y el id para aplicarlo
     """
-    import pdfplumber
-    import re
-
-    def calcular_precios_por_dia_local(precio_lista):
-        """Calcula los precios por día según las fórmulas de recargo"""
-        return {
-            '42': round((precio_lista * 1.23) / 42, 3),
-            '84': round((precio_lista * 1.42) / 84, 3),
-            '135': round((precio_lista * 1.58) / 135, 3),
-            '175': round((precio_lista * 1.75) / 175, 3),
-            '220': round((precio_lista * 1.92) / 220, 3)
-        }
-
-    def limpiar_numero(texto):
-        """Limpia y convierte texto a número"""
-        if not texto or texto.strip() == '':
-            return None
-        texto = texto.strip().replace('.', '').replace(',', '.')
-        try:
-            return float(texto)
-        except:
-            return None
-
-    def extraer_codigo(texto):
-        """Extrae código del producto"""
-        if not texto:
-            return None
-        match = re.search(r'\(([^\)]+)\)|^(\d+)', texto.strip())
-        if match:
-            return match.group(1) or match.group(2)
-        return None
-
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No se envió ningún archivo'}), 400
@@ -789,134 +1279,87 @@ def import_productos_pdf():
         if not file.filename.endswith('.pdf'):
             return jsonify({'error': 'El archivo debe ser un PDF'}), 400
 
-        # Guardar temporalmente el PDF
-        temp_path = os.path.join('uploads', file.filename)
-        os.makedirs('uploads', exist_ok=True)
-        file.save(temp_path)
-
-        # Procesar PDF
-        productos_procesados = []
-
-        with pdfplumber.open(temp_path) as pdf:
-            for page in pdf.pages:
-                table = page.extract_table()
-
-                if not table:
-                    continue
-
-                # Buscar encabezado
-                header_idx = None
-                for idx, row in enumerate(table):
-                    if row and any('Producto' in str(cell) for cell in row if cell):
-                        header_idx = idx
-                        break
-
-                if header_idx is None:
-                    continue
-
-                # Procesar filas
-                for row in table[header_idx + 1:]:
-                    if not row or len(row) < 2:
-                        continue
-
-                    producto_col = row[0]
-                    lista_col = row[1] if len(row) > 1 else None
-
-                    if not producto_col or not lista_col:
-                        continue
+        return encolar_importacion_productos(file, 'pdf')
 
-                    if 'Categoría:' in str(producto_col) or 'Línea:' in str(producto_col):
-                        continue
-
-                    codigo = extraer_codigo(producto_col)
-                    nombre = producto_col
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-                    if codigo:
-                        nombre = re.sub(r'\([^\)]+\)\s*', '', nombre).strip()
-                        nombre = re.sub(r'^\d+\s+', '', nombre).strip()
+@app.route('/api/import-jobs/<id>', methods=['GET'])
+def get_trabajo_importacion(id):
+    """Estado, progreso (fase, página, escritos...) y resultado de una importación de productos"""
+    trabajo = trabajos.obtener(trabajos_collection, id)
 
-                    precio_lista = limpiar_numero(lista_col)
+    if not trabajo or trabajo['tipo'] != 'importacion_productos':
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
 
-                    if not nombre or not precio_lista or precio_lista <= 0:
-                        continue
+    return jsonify(trabajos.trabajo_to_dict(trabajo))
 
-                    productos_procesados.append({
-                        'codigo': codigo,
-                        'nombre': nombre,
-                        'precio_lista': precio_lista
-                    })
+@app.route('/api/import-jobs/<id>/eventos', methods=['GET'])
+def eventos_trabajo_importacion(id):
+    """
+    Progreso de una importación como Server-Sent Events
+    Envía el trabajo cada vez que cambia y cierra al completarse o fallar,
+    o a los DURACION_EVENTOS segundos (el navegador se reconecta solo y
+    recibe el estado actual). La interfaz consulta GET /api/import-jobs/<id>.
+    """
+    trabajo = trabajos.obtener(trabajos_collection, id)
+
+    if not trabajo or trabajo['tipo'] != 'importacion_productos':
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    def generar():
+        # `actualizado` tiene resolución de segundos: se compara el trabajo entero
+        ultimo = None
+        actual = trabajo
+        limite = time.monotonic() + DURACION_EVENTOS
+        yield f'retry: {int(INTERVALO_EVENTOS * 1000)}\n\n'.encode()
+        while time.monotonic() < limite:
+            if actual is None:
+                return
+            # trabajo_to_dict convierte las fechas en el mismo documento
+            datos = serializacion.dumps(trabajos.trabajo_to_dict(dict(actual)))
+            if datos != ultimo:
+                ultimo = datos
+                yield b'data: ' + datos + b'\n\n'
+                if trabajos.finalizado(actual):
+                    return
+            elif datetime.now() - actual['actualizado'] > trabajos.TRABAJO_ABANDONADO:
+                return
+            time.sleep(INTERVALO_EVENTOS)
+            actual = trabajos.obtener(trabajos_collection, id)
+
+    return Response(
+        stream_with_context(generar()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-        # Eliminar archivo temporal
-        os.remove(temp_path)
+@app.route('/api/import-productos/diferencias/<id>/aplicar', methods=['POST'])
+def aplicar_diferencia_productos(id):
+    """
+    Aplica exactamente los cambios de una revisión hecha con diferencias=1
+    Body opcional: { "desactivar_faltantes": true } para dar de baja los
+    productos que no figuraban en la lista
+    """
+    data = request.get_json(silent=True) or {}
 
-        # Importar/actualizar en MongoDB
-        stats = {
-            'creados': 0,
-            'actualizados': 0,
-            'errores': 0,
-            'sin_cambios': 0
-        }
+    stats = importador_productos.aplicar_diferencia(
+        db, id, desactivar_faltantes=bool(data.get('desactivar_faltantes'))
+    )
 
-        for producto in productos_procesados:
-            try:
-                codigo = producto.get('codigo')
-                nombre = producto['nombre']
-                precio_lista = producto['precio_lista']
-
-                precios_por_dia = calcular_precios_por_dia_local(precio_lista)
-
-                # Buscar producto existente
-                query = {}
-                if codigo:
-                    query = {'codigo': codigo}
-                else:
-                    query = {'nombre': {'$regex': f'^{re.escape(nombre)}$', '$options': 'i'}}
-
-                producto_existente = productos_collection.find_one(query)
-
-                if producto_existente:
-                    # Actualizar solo si cambió el precio
-                    if producto_existente.get('precio_lista') != precio_lista:
-                        productos_collection.update_one(
-                            {'_id': producto_existente['_id']},
-                            {
-                                '$set': {
-                                    'precio_lista': precio_lista,
-                                    'precios_por_dia': precios_por_dia,
-                                    'fecha_actualizacion': datetime.now()
-                                }
-                            }
-                        )
-                        stats['actualizados'] += 1
-                    else:
-                        stats['sin_cambios'] += 1
-                else:
-                    # Crear nuevo producto
-                    nuevo_producto = {
-                        'codigo': codigo,
-                        'nombre': nombre,
-                        'precio_lista': precio_lista,
-                        'precios_por_dia': precios_por_dia,
-                        'fecha_creacion': datetime.now(),
-                        'fecha_actualizacion': datetime.now(),
-                        'activo': True
-                    }
-                    productos_collection.insert_one(nuevo_producto)
-                    stats['creados'] += 1
-
-            except Exception as e:
-                stats['errores'] += 1
-                print(f"Error procesando producto: {e}")
-
-        return jsonify({
-            'success': True,
-            'message': f'Importación completada',
-            'stats': stats,
-            'total_procesados': len(productos_procesados)
-        })
+    if stats is None:
+        revision = trabajos_collection.find_one({'_id': id, 'tipo': importador_productos.TIPO_DIFERENCIA})
+        if not revision:
+            return jsonify({'error': 'Revisión no encontrada'}), 404
+        if revision.get('aplicado'):
+            return jsonify({'error': 'La revisión ya fue aplicada'}), 409
+        return jsonify({'error': 'La revisión venció, vuelva a revisar la lista'}), 410
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'success': True,
+        'message': 'Cambios aplicados',
+        'stats': stats
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
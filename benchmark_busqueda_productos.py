@@ -0,0 +1,107 @@
+"""
+Benchmark de la búsqueda de productos
+Carga en una colección temporal un catálogo de ~20.000 productos armado a
+partir de la lista de precios 115 (cada producto repetido con variantes de
+medida y color), crea los índices de busqueda_productos y mide el tiempo de
+búsquedas por código y por nombre. Compara el primer $match actual (solo los
+trigramas menos comunes que alcanzan, ver trigramas_candidatos) con el
+anterior (cualquier trigrama de la consulta) y muestra con explain() cuántos
+documentos examina cada uno y que usan los índices. Al terminar borra la
+colección temporal.
+
+Requiere un MongoDB real (MONGO_URI del .env).
+
+Uso:
+    python benchmark_busqueda_productos.py [cantidad]
+"""
+import os
+import sys
+import json
+import time
+from pymongo import MongoClient
+from dotenv import load_dotenv
+import busqueda_productos
+
+COLECCION = 'benchmark_busqueda_productos'
+
+CONSULTAS = ['05001', '050', '3', 'colchon 2 plazas', 'colchn', 'caja dinero', 'mesa', 'sillon reclinable', 'zzzz']
+
+VARIANTES = ['', 'Blanco', 'Negro', 'Gris', '120cm', '140cm', '160cm', 'XL', 'Premium', 'Eco']
+
+def catalogo(cantidad, ruta='listas_de_precios/lista_de_precios_115_pdf.json'):
+    with open(ruta, encoding='utf-8') as f:
+        base = json.load(f)
+
+    productos = []
+    for i in range(cantidad):
+        producto = base[i % len(base)]
+        vuelta = i // len(base)
+        productos.append(busqueda_productos.preparar({
+            'codigo': producto['codigo'] if vuelta == 0 else f"{producto['codigo'] or '9'}{vuelta:02d}",
+            'nombre': f"{producto['nombre']} {VARIANTES[vuelta % len(VARIANTES)]}".strip(),
+            'precio_lista': producto['precio_lista'],
+            'activo': True
+        }))
+    return productos
+
+def etapas(plan):
+    """Nombres de las etapas de un plan de explain()"""
+    resultado = [plan.get('stage')]
+    for clave in ('inputStage', 'inputStages'):
+        hijos = plan.get(clave)
+        for hijo in hijos if isinstance(hijos, list) else [hijos] if hijos else []:
+            resultado += etapas(hijo)
+    return resultado
+
+def filtro_anterior(codigo, trigramas):
+    """Primer $match de la versión anterior: cualquier trigrama de la consulta"""
+    candidatos = [{'busqueda.codigo_prefijos': codigo}] if codigo else []
+    if trigramas:
+        candidatos.append({'busqueda.trigramas': {'$in': trigramas}})
+    return {'activo': True, '$or': candidatos}
+
+def medir(db, coleccion, pipeline):
+    """(ms, resultados, plan con índice o COLLSCAN, documentos examinados por el primer $match)"""
+    tiempos = []
+    for _ in range(5):
+        inicio = time.perf_counter()
+        resultados = list(coleccion.aggregate(pipeline))
+        tiempos.append(time.perf_counter() - inicio)
+
+    explicacion = db.command('explain', {'find': COLECCION, 'filter': pipeline[0]['$match']}, verbosity='executionStats')
+    plan = etapas(explicacion['queryPlanner']['winningPlan'])
+    return min(tiempos) * 1000, resultados, 'COLLSCAN' if 'COLLSCAN' in plan else 'índice', explicacion['executionStats']['totalDocsExamined']
+
+def main(db, cantidad):
+    coleccion = db[COLECCION]
+    coleccion.drop()
+    coleccion.insert_many(catalogo(cantidad))
+    busqueda_productos.crear_indices(coleccion)
+    frecuencias = busqueda_productos.frecuencias(coleccion)
+    print(f"Catálogo: {coleccion.count_documents({})} productos\n")
+    print(f"  {'consulta':22} {'anterior':>27}   {'actual':>27}")
+
+    for q in CONSULTAS:
+        codigo, trigramas = busqueda_productos.consulta(q)
+        pipeline = busqueda_productos.pipeline(codigo, trigramas, frecuencias_trigramas=frecuencias)
+        anterior = [{'$match': filtro_anterior(codigo, trigramas)}] + pipeline[1:]
+
+        ms_anterior, resultados_anterior, plan_anterior, examinados_anterior = medir(db, coleccion, anterior)
+        ms, resultados, plan, examinados = medir(db, coleccion, pipeline)
+
+        iguales = [p['_id'] for p in resultados] == [p['_id'] for p in resultados_anterior]
+        primero = resultados[0]['nombre'][:30] if resultados else '-'
+
+        print(f"  {q!r:22} {ms_anterior:7.1f} ms {examinados_anterior:6} docs {plan_anterior:8}"
+              f"   {ms:7.1f} ms {examinados:6} docs {plan:8}  {'=' if iguales else 'DISTINTOS'}  -> {primero}")
+
+    coleccion.drop()
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    main(client[DB_NAME], int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
+    client.close()
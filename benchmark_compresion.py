@@ -0,0 +1,90 @@
+"""
+Benchmark de la compresión de respuestas
+Arma las respuestas más pesadas de la API con datos reales del proyecto
+(clientes de la planilla Famago, catálogo de la lista de precios 115,
+localidades y la exportación CSV) y mide para cada una el tamaño y el tiempo
+de gzip y brotli en distintos niveles, junto con lo que tardaría en bajar
+por una conexión móvil. No usa la base de datos.
+
+Uso:
+    python benchmark_compresion.py ["Famago 1.9.1 - copia.xlsx"]
+"""
+import sys
+import json
+import timeit
+import warnings
+from bson import ObjectId
+import pandas as pd
+import compresion
+import exportacion
+import importador_clientes
+import listas_precios
+import planes
+import serializacion
+
+# Velocidad de bajada de referencia (datos móviles con mala señal)
+KBPS_MOVIL = 1000
+
+def payload_clientes(documentos):
+    clientes = []
+    for documento in documentos:
+        cliente = {k: v for k, v in documento.items() if k not in ('busqueda', 'localidad_clave', 'claves')}
+        cliente['id'] = str(ObjectId())
+        clientes.append(cliente)
+    return serializacion.dumps(clientes)
+
+def payload_catalogo(ruta='listas_de_precios/lista_de_precios_115_pdf.json'):
+    with open(ruta, encoding='utf-8') as f:
+        productos = json.load(f)
+    recargos = planes.armar_tablas(planes.PLANES_INICIALES, 0)['recargos_por_dia']
+    catalogo = [
+        {
+            'id': str(ObjectId()),
+            'codigo': producto['codigo'],
+            'nombre': producto['nombre'],
+            'precio_lista': producto['precio_lista'],
+            'precios_por_dia': listas_precios.calcular_precios_por_dia(producto['precio_lista'], recargos),
+            'fecha_actualizacion': '2025-01-15 10:30:00',
+            'activo': True
+        }
+        for producto in productos
+    ]
+    return serializacion.dumps(catalogo)
+
+def medir(datos, funcion):
+    tiempo = min(timeit.repeat(lambda: funcion(datos), number=1, repeat=5))
+    return len(funcion(datos)), tiempo
+
+def transferencia_ms(tamano):
+    return tamano * 8 / KBPS_MOVIL
+
+def main(file_path):
+    warnings.simplefilter('ignore')
+    documentos = importador_clientes.transformar_dataframe(pd.read_excel(file_path))
+
+    payloads = {
+        '/api/clientes': payload_clientes(documentos),
+        '/api/productos': payload_catalogo(),
+        '/api/localidades': serializacion.dumps(sorted({d['localidad'] for d in documentos if d.get('localidad')})),
+        '/api/export/csv': b''.join(exportacion.stream_csv(documentos))
+    }
+
+    variantes = [(f'gzip {nivel}', lambda d, n=nivel: compresion.gzip_bytes(d, n)) for nivel in (1, 6, 9)]
+    if compresion.brotli is not None:
+        variantes += [(f'br {calidad}', lambda d, q=calidad: compresion.brotli.compress(d, quality=q)) for calidad in (1, 5, 11)]
+    else:
+        print("(brotli no está instalado: solo gzip)\n")
+
+    print(f"Bajada de referencia: {KBPS_MOVIL} kbit/s "
+          f"(configurado: gzip {compresion.NIVEL_GZIP}, br {compresion.CALIDAD_BROTLI})\n")
+
+    for ruta, datos in payloads.items():
+        print(f"{ruta}: {len(datos) / 1024:8.1f} KB sin comprimir, {transferencia_ms(len(datos)):7.0f} ms de bajada")
+        for nombre, funcion in variantes:
+            tamano, tiempo = medir(datos, funcion)
+            print(f"  {nombre:8} {tamano / 1024:8.1f} KB  ({len(datos) / tamano:5.1f}x)  "
+                  f"comprimir {tiempo * 1000:7.1f} ms  + bajada {transferencia_ms(tamano):6.0f} ms")
+        print()
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'Famago 1.9.1 - copia.xlsx')
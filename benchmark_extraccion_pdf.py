@@ -0,0 +1,36 @@
+"""
+Benchmark de la extracción del PDF de lista de precios
+Compara la extracción página por página en un solo proceso contra el pool
+de procesos de extraccion_pdf con distinta cantidad de workers (sin usar la
+caché de páginas), y verifica que todos devuelvan los mismos productos en el
+mismo orden. No escribe en la base de datos.
+
+Uso:
+    python benchmark_extraccion_pdf.py ["listas_de_precios/lista_de_precios_115.pdf"] [workers...]
+"""
+import os
+import sys
+import time
+import extraccion_pdf
+
+def medir(pdf_path, workers):
+    inicio = time.perf_counter()
+    productos, errores = extraccion_pdf.extraer_productos(pdf_path, workers, usar_cache=False)
+    return time.perf_counter() - inicio, productos, errores
+
+def main(pdf_path, lista_workers):
+    total = len(extraccion_pdf.huellas_paginas(pdf_path))
+    print(f"PDF: {pdf_path} ({total} páginas, {os.cpu_count()} CPUs)\n")
+
+    base, referencia, errores = medir(pdf_path, 1)
+    print(f"  1 proceso:   {base * 1000:8.1f} ms  ({len(referencia)} productos, {len(errores)} páginas con error)")
+
+    for workers in lista_workers:
+        tiempo, productos, _ = medir(pdf_path, workers)
+        iguales = 'iguales' if productos == referencia else 'DISTINTOS'
+        print(f"  {workers} procesos:  {tiempo * 1000:8.1f} ms  ({base / tiempo:4.1f}x, resultados {iguales})")
+
+if __name__ == '__main__':
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else 'listas_de_precios/lista_de_precios_115.pdf'
+    lista_workers = [int(w) for w in sys.argv[2:]] or [2, 4]
+    main(pdf_path, lista_workers)
@@ -0,0 +1,78 @@
+"""
+Benchmark de la conversión de filas de clientes
+Compara la conversión fila por fila con iterrows (implementación anterior)
+contra la conversión vectorizada de importador_clientes, sobre la planilla
+Famago incluida en el proyecto. Las dos arman los mismos campos derivados
+(índice de búsqueda, clave de localidad y claves de deduplicación), así
+que solo difiere la conversión de las columnas. No escribe en la base de
+datos.
+
+Uso:
+    python benchmark_importacion_clientes.py ["Famago 1.9.1 - copia.xlsx"]
+"""
+import sys
+import timeit
+import warnings
+from datetime import datetime
+import pandas as pd
+import importador_clientes
+import busqueda
+import localidades
+
+def convertir_iterrows(df):
+    """Conversión fila por fila tal como la hacían /api/import-excel e import_data.py"""
+    df = df.rename(columns=importador_clientes.COLUMN_MAPPING)
+    documentos = []
+
+    for _, row in df.iterrows():
+        if pd.isna(row.get('cliente')) or not str(row.get('cliente')).strip():
+            continue
+
+        documento = {'cliente': str(row.get('cliente', '')).strip()}
+        for campo in importador_clientes.CAMPOS_TEXTO:
+            documento[campo] = str(row.get(campo, '')) if pd.notna(row.get(campo)) else None
+        documento['telefono'] = str(row.get('telefono', '12345')) if pd.notna(row.get('telefono')) else '12345'
+        documento['intencion_comprar'] = str(row.get('intencion_comprar', 'POCA')).strip().upper()
+
+        if pd.notna(row.get('fecha')):
+            try:
+                documento['fecha'] = pd.to_datetime(row['fecha']).to_pydatetime()
+            except:
+                documento['fecha'] = datetime.now()
+        else:
+            documento['fecha'] = datetime.now()
+
+        if pd.notna(row.get('fecha_nacimiento')):
+            try:
+                documento['fecha_nacimiento'] = pd.to_datetime(row['fecha_nacimiento']).to_pydatetime()
+            except:
+                pass
+
+        if pd.notna(row.get('años')):
+            try:
+                documento['años'] = int(row['años'])
+            except:
+                pass
+
+        documento['busqueda'] = busqueda.construir_indice(documento)
+        localidades.preparar(documento)
+        documento['claves'] = importador_clientes.claves_dedup(documento)
+        documentos.append(documento)
+
+    return documentos
+
+def main(file_path):
+    warnings.simplefilter('ignore')
+    df = pd.read_excel(file_path)
+    print(f"Planilla: {file_path} ({len(df)} filas)\n")
+
+    repeticiones = 5
+    anterior = min(timeit.repeat(lambda: convertir_iterrows(df), number=1, repeat=repeticiones))
+    vectorizado = min(timeit.repeat(lambda: importador_clientes.transformar_dataframe(df), number=1, repeat=repeticiones))
+
+    print(f"  iterrows:     {anterior * 1000:8.1f} ms")
+    print(f"  vectorizado:  {vectorizado * 1000:8.1f} ms")
+    print(f"  aceleración:  {anterior / vectorizado:8.1f}x")
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'Famago 1.9.1 - copia.xlsx')
@@ -0,0 +1,113 @@
+"""
+Micro-benchmark de la interpretación de celdas de listas de precios
+Mide extraer código + limpiar nombre sobre las celdas de producto del Excel
+incluido (repetidas hasta `cantidad`) con las copias que había antes en
+import_productos_excel.py y extraccion_pdf.py, y con listas_precios celda por
+celda y por columna.
+
+Uso:
+    python benchmark_listas_precios.py ["listas_de_precios/lista_de_precios_115.xlsx"] [cantidad]
+"""
+import re
+import sys
+import time
+import pandas as pd
+import listas_precios
+
+# --- Copias anteriores (para comparar) ---
+
+def extraer_codigo_excel(texto):
+    if not texto or pd.isna(texto):
+        return None
+    texto = str(texto).strip()
+    match = re.search(r'\(([^\)]+)\)', texto)
+    if match:
+        return match.group(1).strip()
+    match = re.match(r'^([\w\-\/]+)\s+', texto)
+    if match:
+        return match.group(1).strip()
+    return None
+
+def limpiar_nombre_excel(texto, codigo=None):
+    if not texto or pd.isna(texto):
+        return None
+    nombre = str(texto).strip()
+    nombre = re.sub(r'\([^\)]+\)\s*', '', nombre)
+    if codigo:
+        codigo_escaped = re.escape(codigo)
+        nombre = re.sub(f'^{codigo_escaped}\\s+', '', nombre)
+    return nombre.strip()
+
+def interpretar_pdf(texto):
+    match = re.search(r'\(([^\)]+)\)|^(\d+)', texto.strip())
+    codigo = (match.group(1) or match.group(2)) if match else None
+    nombre = texto
+    if codigo:
+        nombre = re.sub(r'\([^\)]+\)\s*', '', nombre).strip()
+        nombre = re.sub(r'^\d+\s+', '', nombre).strip()
+    return codigo, nombre
+
+# --- Mediciones ---
+
+def anterior_excel(celdas):
+    resultado = []
+    for celda in celdas:
+        codigo = extraer_codigo_excel(celda)
+        resultado.append((codigo, limpiar_nombre_excel(celda, codigo)))
+    return resultado
+
+def anterior_pdf(celdas):
+    return [interpretar_pdf(celda) for celda in celdas]
+
+def nueva_por_celda(celdas):
+    resultado = []
+    for celda in celdas:
+        codigo = listas_precios.extraer_codigo(celda)
+        resultado.append((codigo, listas_precios.limpiar_nombre_producto(celda, codigo)))
+    return resultado
+
+def nueva_por_columna(celdas):
+    codigos, nombres = listas_precios.interpretar_columna(celdas)
+    return list(zip(codigos, nombres))
+
+def celdas_excel(excel_path):
+    """Celdas de texto de las columnas de producto de todas las hojas"""
+    celdas = []
+    for df in pd.read_excel(excel_path, sheet_name=None).values():
+        for columna in ('Producto', 'Unnamed: 0'):
+            if columna in df.columns:
+                celdas.extend(c for c in df[columna].tolist() if isinstance(c, str))
+    return celdas
+
+def medir(funcion, celdas, repeticiones=5):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(celdas)
+        tiempo = time.perf_counter() - inicio
+        mejor = tiempo if mejor is None else min(mejor, tiempo)
+    return mejor
+
+def main(excel_path, cantidad):
+    base = celdas_excel(excel_path)
+    celdas = (base * (cantidad // len(base) + 1))[:cantidad]
+    print(f"{len(base)} celdas distintas de {excel_path}, {len(celdas)} celdas por medición\n")
+
+    if nueva_por_celda(base) != nueva_por_columna(base):
+        print("ATENCIÓN: la interpretación por columna no coincide con la de celda por celda\n")
+
+    referencia = None
+    for titulo, funcion in (
+        ('Anterior (import_productos_excel)', anterior_excel),
+        ('Anterior (extraccion_pdf)', anterior_pdf),
+        ('listas_precios, celda por celda', nueva_por_celda),
+        ('listas_precios, por columna', nueva_por_columna),
+    ):
+        tiempo = medir(funcion, celdas)
+        referencia = referencia or tiempo
+        print(f"  {titulo:36} {tiempo * 1000:8.1f} ms  {tiempo / len(celdas) * 1e6:6.2f} µs/celda  ({referencia / tiempo:4.1f}x)")
+
+if __name__ == '__main__':
+    excel_path = sys.argv[1] if len(sys.argv) > 1 else 'listas_de_precios/lista_de_precios_115.xlsx'
+    cantidad = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    main(excel_path, cantidad)
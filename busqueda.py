@@ -0,0 +1,143 @@
+"""
+Índice de búsqueda por tokens para clientes
+Cada cliente guarda en el campo `busqueda` sus palabras normalizadas (minúsculas,
+sin acentos) y todos sus prefijos, con un índice multikey en `busqueda.prefijos`.
+Así la búsqueda del listado es una consulta indexada en lugar de un $regex.
+
+Uso para reconstruir el índice de los clientes existentes:
+    python busqueda.py
+"""
+import re
+import unicodedata
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+import os
+
+# Campos que alimentan el índice
+CAMPOS_NOMBRE = ('cliente', 'nombre_negocio')
+CAMPOS_TEXTO = ('comentario', 'telefono')
+
+# Longitud máxima de prefijo indexado (las búsquedas más largas se recortan)
+PREFIJO_MAXIMO = 20
+
+PESO_NOMBRE = 3
+PESO_PALABRA = 1
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+_NO_DIGITO = re.compile(r'\D+')
+
+def normalizar_texto(texto):
+    """Pasa a minúsculas, quita acentos y reemplaza signos por espacios"""
+    if texto is None:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+def tokenizar(texto):
+    """Lista de palabras normalizadas de un texto"""
+    return normalizar_texto(texto).split()
+
+def generar_prefijos(palabra):
+    """Todos los prefijos de una palabra hasta PREFIJO_MAXIMO caracteres"""
+    return [palabra[:i] for i in range(1, min(len(palabra), PREFIJO_MAXIMO) + 1)]
+
+def construir_indice(cliente):
+    """
+    Construye el subdocumento `busqueda` de un cliente
+
+    Returns:
+        {'nombre': [...], 'palabras': [...], 'prefijos': [...]}
+    """
+    nombre = set()
+    for campo in CAMPOS_NOMBRE:
+        nombre.update(tokenizar(cliente.get(campo)))
+
+    palabras = set(nombre)
+    for campo in CAMPOS_TEXTO:
+        palabras.update(tokenizar(cliente.get(campo)))
+
+    # El teléfono también se indexa como una sola cadena de dígitos
+    telefono = _NO_DIGITO.sub('', str(cliente.get('telefono') or ''))
+    if telefono:
+        palabras.add(telefono)
+
+    prefijos = set()
+    for palabra in palabras:
+        prefijos.update(generar_prefijos(palabra))
+
+    return {
+        'nombre': sorted(nombre),
+        'palabras': sorted(palabras),
+        'prefijos': sorted(prefijos)
+    }
+
+def tokens_consulta(search):
+    """Tokens de una búsqueda, recortados al largo de prefijo indexado"""
+    tokens = []
+    for token in tokenizar(search):
+        token = token[:PREFIJO_MAXIMO]
+        if token not in tokens:
+            tokens.append(token)
+    return tokens
+
+def filtro_busqueda(tokens):
+    """Filtro indexado: el cliente debe contener todos los tokens como prefijo"""
+    return {'busqueda.prefijos': {'$all': tokens}}
+
+def expresion_relevancia(tokens):
+    """
+    Expresión de agregación para ordenar por relevancia:
+    coincidencias de palabra completa en nombre/negocio pesan más que en el resto
+    """
+    return {
+        '$add': [
+            {'$multiply': [PESO_NOMBRE, {'$size': {'$setIntersection': [tokens, {'$ifNull': ['$busqueda.nombre', []]}]}}]},
+            {'$multiply': [PESO_PALABRA, {'$size': {'$setIntersection': [tokens, {'$ifNull': ['$busqueda.palabras', []]}]}}]}
+        ]
+    }
+
+def crear_indices(clientes_collection):
+    """Índice multikey sobre los prefijos"""
+    clientes_collection.create_index('busqueda.prefijos')
+
+def reconstruir_indice(clientes_collection, tamano_lote=500):
+    """
+    Recalcula el campo `busqueda` de todos los clientes
+
+    Returns:
+        Cantidad de clientes actualizados
+    """
+    proyeccion = {campo: 1 for campo in CAMPOS_NOMBRE + CAMPOS_TEXTO}
+    operaciones = []
+    total = 0
+
+    for cliente in clientes_collection.find({}, proyeccion):
+        operaciones.append(UpdateOne(
+            {'_id': cliente['_id']},
+            {'$set': {'busqueda': construir_indice(cliente)}}
+        ))
+
+        if len(operaciones) >= tamano_lote:
+            clientes_collection.bulk_write(operaciones, ordered=False)
+            total += len(operaciones)
+            print(f"Indexados {total} clientes...")
+            operaciones = []
+
+    if operaciones:
+        clientes_collection.bulk_write(operaciones, ordered=False)
+        total += len(operaciones)
+
+    crear_indices(clientes_collection)
+    return total
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    total = reconstruir_indice(client[DB_NAME]['clientes'])
+    client.close()
+
+    print(f"\n✅ Índice de búsqueda reconstruido: {total} clientes")
@@ -0,0 +1,218 @@
+"""
+Índice de búsqueda de productos por código y por nombre
+Cada producto guarda en el campo `busqueda` su código normalizado con todos
+sus prefijos y los trigramas de su nombre (minúsculas, sin acentos), con
+índices multikey en `busqueda.codigo_prefijos` y `busqueda.trigramas`:
+- El código se busca exacto o por prefijo ("050" encuentra "05001").
+- El nombre se busca por trigramas, así que tolera palabras incompletas,
+  letras de más o de menos y acentos ("colchon 2 plaz" encuentra
+  "Colchón 2 Plazas").
+Los resultados se ordenan por coincidencia de código y luego por parecido
+del nombre, siempre sobre los candidatos que da el índice. Para que esos
+candidatos sean pocos no se buscan todos los trigramas de la consulta sino
+los menos comunes que alcanzan para no perder ningún resultado (ver
+trigramas_candidatos); la frecuencia de cada trigrama se estima con una
+muestra del catálogo.
+
+Mediciones sobre ~20.000 productos: python benchmark_busqueda_productos.py
+
+Uso para reconstruir el índice de los productos existentes:
+    python busqueda_productos.py
+"""
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+import math
+import os
+import time
+from busqueda import normalizar_texto, generar_prefijos, PREFIJO_MAXIMO
+
+# Parte mínima de los trigramas de la búsqueda que debe tener el nombre
+UMBRAL_PARECIDO = 0.5
+
+# Resultados por página
+LIMITE_DEFAULT = 20
+LIMITE_MAXIMO = 100
+
+# Productos de la muestra con la que se estima la frecuencia de los trigramas
+# y cada cuántos segundos se vuelve a tomar (es solo para elegir qué trigramas
+# buscar: una estimación vieja no hace perder resultados)
+MUESTRA_FRECUENCIAS = 2000
+FRECUENCIAS_CADA = 300
+
+_cache = {'frecuencias': None, 'tomada': 0}
+
+def normalizar_codigo(codigo):
+    """Código en minúsculas y sin espacios ('' si está vacío)"""
+    if codigo is None:
+        return ''
+    return ''.join(str(codigo).lower().split())
+
+def trigramas(texto):
+    """
+    Trigramas del texto normalizado, palabra por palabra
+    Cada palabra se completa con dos espacios adelante y uno atrás, así
+    las coincidencias al principio de las palabras pesan más.
+    """
+    resultado = set()
+    for palabra in normalizar_texto(texto).split():
+        palabra = f'  {palabra} '
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return resultado
+
+def construir_indice(producto):
+    """
+    Construye el subdocumento `busqueda` de un producto
+
+    Returns:
+        {'codigo', 'codigo_prefijos': [...], 'trigramas': [...], 'n_trigramas'}
+    """
+    codigo = normalizar_codigo(producto.get('codigo'))
+    nombre = trigramas(producto.get('nombre'))
+
+    return {
+        'codigo': codigo,
+        'codigo_prefijos': generar_prefijos(codigo),
+        'trigramas': sorted(nombre),
+        'n_trigramas': len(nombre)
+    }
+
+def preparar(documento):
+    """Completa `busqueda` en un documento de producto"""
+    documento['busqueda'] = construir_indice(documento)
+    return documento
+
+def consulta(texto):
+    """
+    Código y trigramas a buscar para un texto
+
+    Solo se busca por código si el texto es una sola palabra con algún dígito.
+    """
+    texto = (texto or '').strip()
+    codigo = ''
+    if texto and len(texto.split()) == 1 and any(c.isdigit() for c in texto):
+        codigo = normalizar_codigo(texto)[:PREFIJO_MAXIMO]
+    return codigo, sorted(trigramas(texto))
+
+def frecuencias(productos_collection):
+    """
+    Cantidad estimada de productos con cada trigrama, a partir de una
+    muestra de MUESTRA_FRECUENCIAS productos activos (se renueva cada
+    FRECUENCIAS_CADA segundos)
+    """
+    ahora = time.monotonic()
+    if _cache['frecuencias'] is None or ahora >= _cache['tomada'] + FRECUENCIAS_CADA:
+        _cache['frecuencias'] = {
+            grupo['_id']: grupo['cantidad']
+            for grupo in productos_collection.aggregate([
+                {'$match': {'activo': True}},
+                {'$sample': {'size': MUESTRA_FRECUENCIAS}},
+                {'$unwind': '$busqueda.trigramas'},
+                {'$group': {'_id': '$busqueda.trigramas', 'cantidad': {'$sum': 1}}}
+            ])
+        }
+        _cache['tomada'] = ahora
+    return _cache['frecuencias']
+
+def trigramas_candidatos(trigramas_consulta, frecuencias_trigramas=None):
+    """
+    Trigramas de la consulta que se buscan en el índice
+
+    Un nombre que llega a UMBRAL_PARECIDO comparte al menos `minimo` de los
+    n trigramas de la consulta, así que tiene alguno de cualquier grupo de
+    n - minimo + 1 de ellos: alcanza con buscar los menos comunes. Sin
+    frecuencias se prefieren los del interior de las palabras ('olc') a los
+    del comienzo ('  c'), que aparecen en buena parte del catálogo.
+    """
+    total = len(trigramas_consulta)
+    minimo = max(1, math.ceil(UMBRAL_PARECIDO * total))
+    frecuencias_trigramas = frecuencias_trigramas or {}
+
+    def rareza(trigrama):
+        return frecuencias_trigramas.get(trigrama, 0), trigrama.count(' '), trigrama
+
+    return sorted(trigramas_consulta, key=rareza)[:total - minimo + 1]
+
+def pipeline(codigo, trigramas_consulta, saltear=0, limite=LIMITE_DEFAULT, proyeccion=None, frecuencias_trigramas=None):
+    """
+    Pipeline de agregación de la búsqueda
+
+    El $match inicial solo usa los índices (prefijo de código o alguno de
+    los trigramas de trigramas_candidatos); el puntaje se calcula sobre
+    esos candidatos con todos los trigramas de la consulta.
+    """
+    candidatos = []
+    if codigo:
+        candidatos.append({'busqueda.codigo_prefijos': codigo})
+    if trigramas_consulta:
+        candidatos.append({'busqueda.trigramas': {'$in': trigramas_candidatos(trigramas_consulta, frecuencias_trigramas)}})
+
+    comunes = {'$size': {'$setIntersection': [trigramas_consulta, {'$ifNull': ['$busqueda.trigramas', []]}]}}
+    total = max(len(trigramas_consulta), 1)
+
+    return [
+        {'$match': {'activo': True, '$or': candidatos}},
+        {'$addFields': {
+            '_codigo': {'$cond': [
+                {'$eq': ['$busqueda.codigo', codigo]}, 2,
+                {'$cond': [{'$in': [codigo, {'$ifNull': ['$busqueda.codigo_prefijos', []]}]}, 1, 0]}
+            ]} if codigo else 0,
+            '_comunes': comunes
+        }},
+        {'$addFields': {
+            # Parte de la búsqueda que aparece en el nombre y parecido del nombre entero
+            '_parecido': {'$divide': ['$_comunes', total]},
+            '_similitud': {'$divide': ['$_comunes', {'$max': [1, {'$subtract': [
+                {'$add': [total, {'$ifNull': ['$busqueda.n_trigramas', 0]}]}, '$_comunes'
+            ]}]}]}
+        }},
+        {'$match': {'$or': [{'_codigo': {'$gt': 0}}, {'_parecido': {'$gte': UMBRAL_PARECIDO}}]}},
+        {'$sort': {'_codigo': -1, '_parecido': -1, '_similitud': -1, 'nombre': 1, '_id': 1}},
+        {'$skip': saltear},
+        {'$limit': limite},
+        {'$project': {**(proyeccion or {'codigo': 1, 'nombre': 1, 'precio_lista': 1}), '_codigo': 1, '_parecido': 1}}
+    ]
+
+def crear_indices(productos_collection):
+    """Índices multikey sobre los prefijos del código y los trigramas del nombre"""
+    productos_collection.create_index('busqueda.codigo_prefijos')
+    productos_collection.create_index('busqueda.trigramas')
+
+def reconstruir_indice(productos_collection, tamano_lote=500):
+    """
+    Recalcula el campo `busqueda` de todos los productos
+
+    Returns:
+        Cantidad de productos actualizados
+    """
+    operaciones = []
+    total = 0
+
+    for producto in productos_collection.find({}, {'codigo': 1, 'nombre': 1}):
+        operaciones.append(UpdateOne(
+            {'_id': producto['_id']},
+            {'$set': {'busqueda': construir_indice(producto)}}
+        ))
+
+        if len(operaciones) >= tamano_lote:
+            productos_collection.bulk_write(operaciones, ordered=False)
+            total += len(operaciones)
+            print(f"Indexados {total} productos...")
+            operaciones = []
+
+    if operaciones:
+        productos_collection.bulk_write(operaciones, ordered=False)
+        total += len(operaciones)
+
+    crear_indices(productos_collection)
+    return total
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    total = reconstruir_indice(client[DB_NAME]['productos'])
+    client.close()
+
+    print(f"\n✅ Índice de búsqueda de productos reconstruido: {total} productos")
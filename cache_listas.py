@@ -0,0 +1,105 @@
+"""
+Caché en disco de listas de precios ya interpretadas
+Cada entrada es un archivo JSON cuyo nombre sale del hash del contenido
+(de la página, en los PDF; del archivo completo, en los Excel), así que
+volver a subir la misma lista, o una que solo cambió en algunas páginas,
+reutiliza lo ya extraído. Cuando el directorio supera CACHE_LISTAS_MAXIMO
+bytes se borran las entradas usadas hace más tiempo.
+"""
+import os
+import json
+import hashlib
+
+CACHE_LISTAS_DIR = os.getenv('CACHE_LISTAS_DIR', 'cache_listas')
+CACHE_LISTAS_MAXIMO = int(os.getenv('CACHE_LISTAS_MAXIMO', str(100 * 1024 * 1024)))
+
+# Cambiar al modificar cualquier parser: invalida todas las entradas anteriores
+VERSION_PARSER = 2
+
+TAMANO_BLOQUE = 1024 * 1024
+
+def huella_archivo(archivo):
+    """
+    SHA-256 del contenido de un archivo
+
+    Args:
+        archivo: Ruta o archivo binario abierto (se lee por bloques y se
+            vuelve a posicionar al inicio)
+    """
+    h = hashlib.sha256()
+
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+                h.update(bloque)
+    else:
+        stream = getattr(archivo, 'stream', archivo)
+        for bloque in iter(lambda: stream.read(TAMANO_BLOQUE), b''):
+            h.update(bloque)
+        stream.seek(0)
+
+    return h.hexdigest()
+
+def _ruta(tipo, huella):
+    return os.path.join(CACHE_LISTAS_DIR, f'{tipo}-v{VERSION_PARSER}-{huella}.json')
+
+def obtener(tipo, huella):
+    """Valor guardado para (tipo, huella) o None si no está en caché"""
+    ruta = _ruta(tipo, huella)
+    try:
+        with open(ruta, 'rb') as f:
+            valor = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    # La fecha de modificación marca el último uso (para el desalojo)
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+    return valor
+
+def guardar(tipo, huella, valor):
+    """Guarda un valor (escritura atómica) y desaloja si se superó el máximo"""
+    os.makedirs(CACHE_LISTAS_DIR, exist_ok=True)
+    ruta = _ruta(tipo, huella)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(valor, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+    desalojar()
+
+def desalojar(maximo=None):
+    """Borra las entradas usadas hace más tiempo hasta quedar por debajo de `maximo` bytes"""
+    maximo = CACHE_LISTAS_MAXIMO if maximo is None else maximo
+
+    entradas = []
+    total = 0
+    with os.scandir(CACHE_LISTAS_DIR) as it:
+        for entrada in it:
+            if entrada.is_file() and entrada.name.endswith('.json'):
+                info = entrada.stat()
+                entradas.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+
+    if total <= maximo:
+        return
+
+    for _, tamano, ruta in sorted(entradas):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+        if total <= maximo:
+            break
+
+def en_cache(tipo, huella, calcular):
+    """Devuelve el valor en caché o lo calcula con `calcular()` y lo guarda"""
+    valor = obtener(tipo, huella)
+    if valor is None:
+        valor = calcular()
+        guardar(tipo, huella, valor)
+    return valor
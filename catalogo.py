@@ -0,0 +1,57 @@
+"""
+Catálogo de productos activos ya serializado, con versión
+GET /api/productos devuelve siempre lo mismo hasta que se escribe un
+producto (alta, edición, baja, importación o recálculo de precios), y cada
+una de esas escrituras incrementa la versión 'productos' de `versiones`.
+La caché en memoria guarda los bytes del JSON junto con la versión con la
+que se armaron: cada pedido consulta solo el documento de versión (que
+comparten todos los workers) y vuelve a leer el catálogo si cambió.
+
+El ETag es un hash del contenido, así que es el mismo en todos los workers
+y sirve para responder 304 a If-None-Match.
+"""
+import hashlib
+import serializacion
+import versiones
+
+# Documento de `versiones` del catálogo
+VERSION = 'productos'
+
+_cache = {'snapshot': None}
+
+def invalidar_cache():
+    _cache['snapshot'] = None
+
+def armar(productos_collection, version, convertir):
+    """
+    Lee y serializa el catálogo activo ordenado por nombre
+
+    Returns:
+        {'version', 'contenido' (bytes JSON), 'etag', 'productos'}
+    """
+    documentos = [convertir(producto) for producto in productos_collection.find({'activo': True}).sort('nombre', 1)]
+    contenido = serializacion.dumps(documentos)
+
+    return {
+        'version': version,
+        'contenido': contenido,
+        'etag': hashlib.blake2b(contenido, digest_size=16).hexdigest(),
+        'productos': len(documentos)
+    }
+
+def obtener(productos_collection, versiones_collection, convertir):
+    """
+    Snapshot vigente del catálogo (se vuelve a armar si cambió la versión)
+
+    La versión se lee antes que los productos: si alguien escribe mientras
+    se arma, el snapshot queda con la versión vieja y el próximo pedido lo
+    vuelve a armar.
+    """
+    version = versiones.obtener(versiones_collection, VERSION)
+    snapshot = _cache['snapshot']
+
+    if snapshot is None or snapshot['version'] != version:
+        snapshot = armar(productos_collection, version, convertir)
+        _cache['snapshot'] = snapshot
+
+    return snapshot
@@ -0,0 +1,171 @@
+"""
+Claves de identificación de productos con índices únicos
+Las importaciones identifican cada fila de la lista por su código o, si no
+tiene, por su nombre sin distinguir mayúsculas ni espacios. Cada producto
+guarda esa clave en `clave_nombre` y los productos sin código guardan
+`codigo: None`, con dos índices únicos parciales:
+- `codigo` entre los productos con código
+- `clave_nombre` entre los productos sin código
+Así las búsquedas son por igualdad exacta sobre un índice (en lugar de un
+$regex que no puede usarlo) y no pueden aparecer duplicados.
+
+Uso para completar las claves de los productos existentes, ver los
+duplicados que impiden crear los índices y crearlos:
+    python claves_productos.py
+"""
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from dotenv import load_dotenv
+import os
+
+INDICE_CODIGO = 'codigo_unico'
+INDICE_NOMBRE = 'clave_nombre_unica'
+
+def normalizar_codigo(codigo):
+    """Código sin espacios alrededor (None si está vacío)"""
+    if codigo is None:
+        return None
+    codigo = str(codigo).strip()
+    return codigo or None
+
+def clave_nombre(nombre):
+    """
+    Nombre sin distinguir mayúsculas y con los espacios colapsados
+    (lo que antes se buscaba con {'$regex': '^nombre$', '$options': 'i'})
+    """
+    return ' '.join(str(nombre or '').split()).casefold()
+
+def preparar(documento):
+    """Normaliza `codigo` y completa `clave_nombre` en un documento de producto"""
+    documento['codigo'] = normalizar_codigo(documento.get('codigo'))
+    documento['clave_nombre'] = clave_nombre(documento.get('nombre'))
+    return documento
+
+def crear_indices(productos_collection):
+    """
+    Crea los índices de las claves (el de `clave_nombre` para las búsquedas
+    por nombre y los dos únicos)
+
+    Returns:
+        Lista de errores (vacía si se crearon todos); un índice único no se
+        puede crear mientras haya duplicados (ver conflictos)
+    """
+    productos_collection.create_index('clave_nombre')
+
+    indices = (
+        (INDICE_CODIGO, 'codigo', {'codigo': {'$type': 'string'}}),
+        (INDICE_NOMBRE, 'clave_nombre', {'codigo': {'$type': 'null'}})
+    )
+    errores = []
+    for nombre, campo, filtro in indices:
+        try:
+            productos_collection.create_index(campo, name=nombre, unique=True, partialFilterExpression=filtro)
+        except OperationFailure as e:
+            errores.append(f"{nombre}: {e.details.get('errmsg', e) if e.details else e}")
+    return errores
+
+def _duplicados(productos_collection, filtro, campo):
+    pipeline = [
+        {'$match': filtro},
+        {'$group': {
+            '_id': f'${campo}',
+            'productos': {'$push': {'_id': '$_id', 'codigo': '$codigo', 'nombre': '$nombre', 'activo': '$activo'}},
+            'cantidad': {'$sum': 1}
+        }},
+        {'$match': {'cantidad': {'$gt': 1}}},
+        {'$sort': {'_id': 1}}
+    ]
+    return [
+        {'clave': grupo['_id'], 'productos': grupo['productos']}
+        for grupo in productos_collection.aggregate(pipeline, allowDiskUse=True)
+    ]
+
+def conflictos(productos_collection):
+    """
+    Productos repetidos que impiden crear los índices únicos
+
+    Returns:
+        {'codigo': [{clave, productos: [...]}, ...], 'clave_nombre': [...]}
+    """
+    return {
+        'codigo': _duplicados(productos_collection, {'codigo': {'$type': 'string'}}, 'codigo'),
+        'clave_nombre': _duplicados(productos_collection, {'codigo': None}, 'clave_nombre')
+    }
+
+def migrar(productos_collection, tamano_lote=500):
+    """
+    Completa las claves de los productos existentes, informa los duplicados
+    y crea los índices que se puedan
+
+    Returns:
+        {'actualizados', 'errores', 'conflictos': {...}, 'errores_indices': [...]}
+    """
+    operaciones = []
+    actualizados = 0
+    errores = 0
+
+    def escribir(operaciones):
+        # Con los índices ya creados, normalizar un código vacío puede repetir una clave
+        try:
+            return productos_collection.bulk_write(operaciones, ordered=False).modified_count, 0
+        except BulkWriteError as e:
+            return e.details.get('nModified', 0), len(e.details.get('writeErrors', []))
+
+    for producto in productos_collection.find({}, {'codigo': 1, 'nombre': 1, 'clave_nombre': 1}):
+        campos = preparar({'codigo': producto.get('codigo'), 'nombre': producto.get('nombre')})
+        if 'codigo' in producto and all(producto.get(campo) == valor for campo, valor in campos.items()):
+            continue
+
+        operaciones.append(UpdateOne({'_id': producto['_id']}, {'$set': campos}))
+        if len(operaciones) >= tamano_lote:
+            escritos, fallidos = escribir(operaciones)
+            actualizados += escritos
+            errores += fallidos
+            operaciones = []
+
+    if operaciones:
+        escritos, fallidos = escribir(operaciones)
+        actualizados += escritos
+        errores += fallidos
+
+    return {
+        'actualizados': actualizados,
+        'errores': errores,
+        'conflictos': conflictos(productos_collection),
+        'errores_indices': crear_indices(productos_collection)
+    }
+
+def lineas_conflictos(lista_conflictos):
+    """Texto del informe de duplicados para la consola"""
+    lineas = []
+    titulos = (('codigo', 'Códigos repetidos'), ('clave_nombre', 'Productos sin código con el mismo nombre'))
+    for campo, titulo in titulos:
+        grupos = lista_conflictos[campo]
+        if not grupos:
+            continue
+        lineas.append(f"\n{titulo} ({len(grupos)}):")
+        for grupo in grupos:
+            lineas.append(f"  {grupo['clave']!r}:")
+            for producto in grupo['productos']:
+                estado = 'activo' if producto.get('activo') else 'inactivo'
+                lineas.append(f"    - {producto['_id']} ({producto.get('codigo') or 'sin código'}) {producto.get('nombre')} [{estado}]")
+    return lineas
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    resultado = migrar(client[DB_NAME]['productos'])
+    client.close()
+
+    print(f"✅ Claves completadas: {resultado['actualizados']} productos actualizados, {resultado['errores']} errores")
+    for linea in lineas_conflictos(resultado['conflictos']):
+        print(linea)
+    if resultado['errores_indices']:
+        print("\n⚠️  Índices únicos pendientes (resolver los duplicados y volver a ejecutar):")
+        for error in resultado['errores_indices']:
+            print(f"  {error}")
+    else:
+        print("✅ Índices únicos de código y nombre creados")
@@ -0,0 +1,180 @@
+"""
+Compresión de respuestas y GET condicional para la API JSON
+Se aplica a todas las respuestas desde app.after_request:
+- Comprime JSON, CSV y JSONL (no el xlsx, que ya es un zip, ni los eventos
+  SSE) de al menos MIN_BYTES con brotli si el cliente lo acepta y está
+  instalado, o con gzip. Las respuestas en streaming se comprimen bloque a
+  bloque sin armarlas enteras.
+- Agrega un ETag fuerte (hash del contenido) a los GET que no lo traen y
+  responde 304 a If-None-Match. Cada codificación es una representación
+  distinta, así que el ETag lleva la codificación como sufijo ("...-br");
+  al comparar con If-None-Match se ignora el sufijo, también en las
+  descargas con send_file (que ya compararon contra el ETag sin sufijo).
+- Las respuestas en streaming no se pueden hashear: las rutas les ponen un
+  ETag débil (el listado completo y las exportaciones de clientes usan la
+  versión de los clientes) y acá se responde 304 si coincide. Sin ETag se
+  comprimen igual, pero nunca dan 304.
+
+Los resultados comprimidos se guardan en una caché LRU chica por ETag
+(compartida entre los hilos del worker), así el catálogo o las localidades
+no se vuelven a comprimir en cada pedido.
+
+Mediciones con datos realistas: python benchmark_compresion.py
+"""
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional, sin él solo se usa gzip
+    brotli = None
+
+# Respuestas más chicas no se comprimen (no compensa)
+MIN_BYTES = 1024
+
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5
+
+# Tipos de contenido que se comprimen
+COMPRIMIBLES = ('application/json', 'text/csv', 'application/x-ndjson')
+
+# Cantidad de resultados comprimidos que se guardan (se descartan los usados hace más tiempo)
+CACHE_MAXIMO = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def codificaciones_disponibles():
+    """Codificaciones soportadas, en orden de preferencia"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def _sin_sufijo(etag):
+    """ETag sin el sufijo de codificación ("abc-br" -> "abc")"""
+    for codificacion in ('br', 'gzip'):
+        if etag.endswith(f'-{codificacion}'):
+            return etag[:-len(codificacion) - 1]
+    return etag
+
+def no_modificada(request, etag):
+    """True si If-None-Match incluye `etag` en alguna de sus codificaciones"""
+    pedidos = request.if_none_match
+    if not pedidos:
+        return False
+    if pedidos.star_tag:
+        return True
+    return any(_sin_sufijo(pedido) == etag for pedido in pedidos.as_set(include_weak=True))
+
+def _respuesta_304(response):
+    """Convierte la respuesta en 304 liberando el cuerpo (un archivo de send_file queda cerrado)"""
+    response.close()
+    response.response = []
+    response.status_code = 304
+    return response
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=CALIDAD_BROTLI)
+    return gzip_bytes(datos)
+
+def gzip_bytes(datos, nivel=NIVEL_GZIP):
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    return compresor.compress(datos) + compresor.flush()
+
+def comprimir_stream(bloques, codificacion):
+    """Generador que comprime bloque a bloque una respuesta en streaming"""
+    if codificacion == 'br':
+        compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+        procesar, terminar = compresor.process, compresor.finish
+    else:
+        compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+        procesar, terminar = compresor.compress, compresor.flush
+
+    try:
+        for bloque in bloques:
+            if isinstance(bloque, str):
+                bloque = bloque.encode('utf-8')
+            salida = procesar(bloque)
+            if salida:
+                yield salida
+        yield terminar()
+    finally:
+        if hasattr(bloques, 'close'):
+            bloques.close()
+
+def _comprimido(etag, datos, codificacion):
+    """Datos comprimidos, desde la caché si ya se comprimió ese contenido"""
+    clave = (etag, codificacion)
+    with _cache_lock:
+        if clave in _cache:
+            _cache.move_to_end(clave)
+            return _cache[clave]
+
+    # Se comprime fuera del lock: dos hilos con el mismo contenido lo comprimen dos veces
+    comprimido = comprimir(datos, codificacion)
+    with _cache_lock:
+        _cache[clave] = comprimido
+        _cache.move_to_end(clave)
+        while len(_cache) > CACHE_MAXIMO:
+            _cache.popitem(last=False)
+    return comprimido
+
+def etag_contenido(datos):
+    return hashlib.blake2b(datos, digest_size=16).hexdigest()
+
+def procesar(response, request):
+    """
+    Comprime la respuesta y le agrega ETag según el pedido
+
+    Returns:
+        La misma respuesta modificada (o convertida en 304)
+    """
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    if not response.mimetype or not response.mimetype.startswith(COMPRIMIBLES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    codificacion = request.accept_encodings.best_match(codificaciones_disponibles())
+    condicional = request.method in ('GET', 'HEAD')
+
+    if response.is_streamed:
+        etag, debil = response.get_etag()
+        # El ETag débil no lleva sufijo (vale para cualquier codificación);
+        # send_file comparó If-None-Match contra el ETag fuerte sin sufijo,
+        # que el cliente nunca recibió
+        if codificacion and etag and not debil:
+            response.set_etag(f'{etag}-{codificacion}')
+        if condicional and etag and no_modificada(request, etag):
+            return _respuesta_304(response)
+        if codificacion:
+            response.response = comprimir_stream(response.response, codificacion)
+            response.direct_passthrough = False
+            response.headers['Content-Encoding'] = codificacion
+            response.headers.pop('Content-Length', None)
+            response.headers.pop('Accept-Ranges', None)
+        return response
+
+    datos = response.get_data()
+    etag, debil = response.get_etag()
+    if condicional and not etag:
+        etag, debil = etag_contenido(datos), False
+
+    if len(datos) < MIN_BYTES:
+        codificacion = None
+
+    if etag:
+        response.set_etag(f'{etag}-{codificacion}' if codificacion and not debil else etag, weak=debil)
+
+    if condicional and etag and no_modificada(request, etag):
+        return _respuesta_304(response)
+
+    if codificacion:
+        # Solo se guarda en caché lo que tiene ETag fuerte (los GET)
+        comprimido = _comprimido(etag, datos, codificacion) if etag and not debil else comprimir(datos, codificacion)
+        response.set_data(comprimido)
+        response.headers['Content-Encoding'] = codificacion
+
+    return response
@@ -2,44 +2,7 @@
 Script de debug para ver exactamente qué está leyendo del Excel
 """
 import pandas as pd
-import re
-
-def extraer_codigo(texto):
-    """Extrae código del producto (puede estar entre paréntesis o ser número/alfanumérico)"""
-    if not texto or pd.isna(texto):
-        return None
-
-    texto = str(texto).strip()
-
-    # Buscar patrón (XXXXX) - código entre paréntesis
-    match = re.search(r'\(([^\)]+)\)', texto)
-    if match:
-        return match.group(1).strip()
-
-    # Si no hay paréntesis, buscar código al inicio (números o alfanumérico)
-    match = re.match(r'^([\w\-\/]+)\s+', texto)
-    if match:
-        return match.group(1).strip()
-
-    return None
-
-def limpiar_nombre_producto(texto, codigo=None):
-    """Limpia el nombre del producto removiendo el código"""
-    if not texto or pd.isna(texto):
-        return None
-
-    nombre = str(texto).strip()
-
-    # Remover código entre paréntesis
-    nombre = re.sub(r'\([^\)]+\)\s*', '', nombre)
-
-    # Si hay código, removerlo del inicio
-    if codigo:
-        # Escapar caracteres especiales en el código para regex
-        codigo_escaped = re.escape(codigo)
-        nombre = re.sub(f'^{codigo_escaped}\\s+', '', nombre)
-
-    return nombre.strip()
+from listas_precios import extraer_codigo, limpiar_nombre_producto
 
 # Leer Excel
 excel_path = "listas_de_precios/lista_de_precios_115.xlsx"
@@ -76,6 +76,13 @@ else
     echo -e "${YELLOW} No se encontr archivo Excel para importar${NC}"
 fi
 
+# Completar datos derivados en bases de versiones anteriores (se puede repetir)
+python3 busqueda.py
+python3 localidades.py
+python3 busqueda_productos.py
+python3 importador_clientes.py
+python3 claves_productos.py
+
 # 7. Crear servicio systemd
 echo -e "${YELLOW}[7/9] Configurando servicio systemd...${NC}"
 cat > /etc/systemd/system/gestion-ventas.service << EOF
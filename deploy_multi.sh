@@ -71,6 +71,13 @@ else
     fi
 fi
 
+# Completar datos derivados en bases de versiones anteriores (se puede repetir)
+python3 busqueda.py
+python3 localidades.py
+python3 busqueda_productos.py
+python3 importador_clientes.py
+python3 claves_productos.py
+
 # 5. Crear/actualizar servicio systemd
 echo -e "${YELLOW}[5/5] Configurando servicio systemd...${NC}"
 cat > /etc/systemd/system/gestion-ventas.service << EOF
@@ -0,0 +1,176 @@
+"""
+Contadores materializados para el dashboard (/api/stats)
+Un único documento en la colección `estadisticas` guarda el total de clientes
+y la cantidad por intención de compra. Los endpoints de escritura y los
+importadores lo actualizan con $inc; la reconciliación lo recalcula desde
+`clientes` para corregir cualquier desvío. Cada $inc incrementa también
+`version`, y el recuento solo se aplica si la versión no cambió mientras se
+contaba: así nunca pisa un incremento concurrente.
+
+Uso para reconciliar manualmente (o desde cron):
+    python estadisticas.py
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from dotenv import load_dotenv
+import os
+
+STATS_ID = 'clientes'
+
+# Clave usada para clientes sin intención de compra
+SIN_INTENCION = '_sin_intencion'
+
+# Cada cuánto se reconcilia automáticamente al leer las estadísticas
+RECONCILIAR_CADA = timedelta(hours=1)
+
+def _clave(intencion):
+    """Nombre de campo seguro para MongoDB (sin '.' ni '$' inicial)"""
+    if intencion is None or intencion == '':
+        return SIN_INTENCION
+    clave = str(intencion).replace('.', '．')
+    if clave.startswith('$'):
+        clave = '＄' + clave[1:]
+    return clave
+
+def _intencion(clave):
+    """Inversa de _clave"""
+    if clave == SIN_INTENCION:
+        return None
+    clave = clave.replace('．', '.')
+    if clave.startswith('＄'):
+        clave = '$' + clave[1:]
+    return clave
+
+def incrementar(stats_collection, deltas):
+    """
+    Aplica variaciones por intención en una sola operación
+
+    Args:
+        deltas: Dict {intencion: variación}; el total varía en la suma
+    """
+    inc = {}
+    total = 0
+    for intencion, delta in deltas.items():
+        if not delta:
+            continue
+        campo = f'por_intencion.{_clave(intencion)}'
+        inc[campo] = inc.get(campo, 0) + delta
+        total += delta
+
+    if not inc:
+        return
+
+    inc['total'] = total
+    inc['version'] = 1
+    stats_collection.update_one({'_id': STATS_ID}, {'$inc': inc}, upsert=True)
+
+def registrar_alta(stats_collection, intencion):
+    incrementar(stats_collection, {intencion: 1})
+
+def registrar_baja(stats_collection, intencion):
+    incrementar(stats_collection, {intencion: -1})
+
+def registrar_cambio(stats_collection, anterior, nueva):
+    if anterior != nueva:
+        incrementar(stats_collection, {anterior: -1, nueva: 1})
+
+def registrar_importacion(stats_collection, documentos):
+    """Suma las intenciones de un lote de documentos insertados"""
+    incrementar(stats_collection, Counter(d.get('intencion_comprar') for d in documentos))
+
+def reconciliar(clientes_collection, stats_collection):
+    """
+    Recalcula los contadores desde la colección de clientes
+
+    El recuento se aplica con $set solo si el documento sigue en la versión
+    leída antes de contar; si algún $inc lo cambió mientras tanto se deja
+    como está (la próxima reconciliación lo vuelve a intentar).
+
+    Returns:
+        El documento de estadísticas vigente
+    """
+    anterior = stats_collection.find_one({'_id': STATS_ID}) or {}
+    version = anterior.get('version')
+
+    pipeline = [
+        {
+            '$group': {
+                '_id': '$intencion_comprar',
+                'cantidad': {'$sum': 1}
+            }
+        }
+    ]
+
+    por_intencion = {}
+    total = 0
+    for i in clientes_collection.aggregate(pipeline):
+        clave = _clave(i['_id'])
+        por_intencion[clave] = por_intencion.get(clave, 0) + i['cantidad']
+        total += i['cantidad']
+
+    recuento = {
+        'total': total,
+        'por_intencion': por_intencion,
+        'reconciliado': datetime.now()
+    }
+
+    # Sin versión todavía (ningún $inc desde que existe el campo) el filtro no
+    # la fija, para que el upsert no cree `version: null`
+    filtro = {'_id': STATS_ID, 'version': version if version is not None else {'$exists': False}}
+    try:
+        stats_collection.update_one(filtro, {'$set': recuento}, upsert=True)
+    except DuplicateKeyError:
+        # Un $inc cambió (o creó) el documento durante el recuento: el upsert
+        # no encontró la versión leída e intentó insertar otro con el mismo _id
+        return stats_collection.find_one({'_id': STATS_ID})
+    return {**anterior, **recuento}
+
+def _reclamar_reconciliacion(stats_collection):
+    """
+    Marca la reconciliación como en curso si está vencida
+    Devuelve True solo al proceso que la reclamó (evita que varios workers la repitan)
+    """
+    ahora = datetime.now()
+    reclamado = stats_collection.find_one_and_update(
+        {'_id': STATS_ID, 'reconciliado': {'$lt': ahora - RECONCILIAR_CADA}},
+        {'$set': {'reconciliado': ahora}},
+        return_document=ReturnDocument.AFTER
+    )
+    return reclamado is not None
+
+def leer(clientes_collection, stats_collection):
+    """
+    Estadísticas para el dashboard desde el documento materializado
+
+    Returns:
+        {'total': int, 'por_intencion': [{'intencion': ..., 'cantidad': ...}]}
+    """
+    documento = stats_collection.find_one({'_id': STATS_ID})
+
+    if documento is None or 'reconciliado' not in documento or _reclamar_reconciliacion(stats_collection):
+        documento = reconciliar(clientes_collection, stats_collection)
+
+    return {
+        'total': documento.get('total', 0),
+        'por_intencion': [
+            {'intencion': _intencion(clave), 'cantidad': cantidad}
+            for clave, cantidad in documento.get('por_intencion', {}).items()
+            if cantidad
+        ]
+    }
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    documento = reconciliar(db['clientes'], db['estadisticas'])
+    client.close()
+
+    print(f"✅ Estadísticas reconciliadas: {documento['total']} clientes")
+    for clave, cantidad in documento['por_intencion'].items():
+        print(f"  {_intencion(clave)}: {cantidad}")
@@ -0,0 +1,207 @@
+"""
+Exportación de clientes
+Recorre un cursor de MongoDB por lotes y escribe las filas a medida que llegan,
+sin armar listas ni DataFrames con toda la colección.
+"""
+import csv
+import io
+import os
+import hashlib
+import json
+import tempfile
+from datetime import datetime, timedelta
+from openpyxl import Workbook
+import serializacion
+
+# Documentos pedidos a MongoDB por lote durante la exportación
+LOTE_EXPORTACION = 1000
+
+# Los archivos más chicos que esto quedan en memoria; los más grandes pasan a disco
+MAXIMO_EN_MEMORIA = 8 * 1024 * 1024
+
+# Bytes acumulados antes de enviar un bloque en los formatos de texto
+TAMANO_BLOQUE = 64 * 1024
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+MIMETYPE_CSV = 'text/csv; charset=utf-8'
+MIMETYPE_JSONL = 'application/x-ndjson'
+
+FORMATOS = ('xlsx', 'csv', 'jsonl')
+
+MIMETYPES = {
+    'xlsx': MIMETYPE_XLSX,
+    'csv': MIMETYPE_CSV,
+    'jsonl': MIMETYPE_JSONL
+}
+
+# Directorio donde los trabajos de exportación guardan los archivos generados
+EXPORTS_DIR = os.getenv('EXPORTS_DIR', 'exports')
+
+# Los archivos generados se borran pasado este tiempo
+EXPORTS_TTL = timedelta(hours=24)
+
+# Filtros que admite la exportación (los mismos que /api/clientes)
+FILTROS = ('search', 'localidad', 'intencion')
+
+def _fecha(valor):
+    return valor.strftime('%Y-%m-%d') if isinstance(valor, datetime) else ''
+
+# Columna del Excel -> (campo, valor por defecto)
+COLUMNAS = [
+    ('FECHA', 'fecha', ''),
+    ('CLIENTE', 'cliente', ''),
+    ('NOMBRE NEGOCIO', 'nombre_negocio', ''),
+    ('LOCALIDAD', 'localidad', ''),
+    ('DIRECCION', 'direccion', ''),
+    ('BARRIO', 'barrio', ''),
+    ('DNI', 'dni', ''),
+    ('TELEFONO', 'telefono', '12345'),
+    ('ES CLIENTE?', 'es_cliente', ''),
+    ('DETALLE', 'detalle', ''),
+    ('INTERES 1', 'interes_1', ''),
+    ('INTERES 2', 'interes_2', ''),
+    ('INTERES 3', 'interes_3', ''),
+    ('CANTIDAD COMPRAS', 'cantidad_compras', ''),
+    ('INTENCION DE COMPRAR', 'intencion_comprar', ''),
+    ('ACCION', 'accion', ''),
+    ('COMENTARIO', 'comentario', ''),
+    ('FECHA DE NACIMIENTO', 'fecha_nacimiento', ''),
+    ('AÑOS', 'años', '')
+]
+
+ENCABEZADOS = [columna for columna, _, _ in COLUMNAS]
+
+# Proyección para pedir a MongoDB solo los campos exportados
+PROYECCION = {campo: 1 for _, campo, _ in COLUMNAS}
+
+CAMPOS_FECHA = ('fecha', 'fecha_nacimiento')
+
+def fila_cliente(cliente):
+    """Valores de una fila de exportación en el orden de COLUMNAS"""
+    fila = []
+    for _, campo, default in COLUMNAS:
+        if campo in CAMPOS_FECHA:
+            fila.append(_fecha(cliente.get(campo)))
+        else:
+            valor = cliente.get(campo, default)
+            fila.append(valor if valor is not None else default)
+    return fila
+
+def registro_cliente(cliente):
+    """Diccionario {campo: valor} de un cliente para JSON Lines"""
+    registro = {'id': str(cliente['_id'])}
+    for (_, campo, _), valor in zip(COLUMNAS, fila_cliente(cliente)):
+        registro[campo] = valor
+    return registro
+
+def nombre_archivo(extension):
+    return f'clientes_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+def escribir_xlsx(clientes, destino):
+    """
+    Escribe los clientes en un libro de openpyxl en modo write-only
+
+    Args:
+        clientes: Iterable de documentos (cursor de MongoDB)
+        destino: Archivo binario abierto donde se guarda el .xlsx
+    """
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Clientes')
+    hoja.append(ENCABEZADOS)
+
+    for cliente in clientes:
+        hoja.append(fila_cliente(cliente))
+
+    libro.save(destino)
+
+def exportar_xlsx(clientes):
+    """
+    Genera el .xlsx en un archivo temporal (en memoria si es chico, en disco si no)
+
+    Returns:
+        Archivo temporal posicionado al inicio, listo para enviar
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAXIMO_EN_MEMORIA)
+    escribir_xlsx(clientes, archivo)
+    archivo.seek(0)
+    return archivo
+
+def stream_csv(clientes, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Generador de bloques CSV (UTF-8 con BOM para que Excel respete los acentos)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write('\ufeff')
+    writer.writerow(ENCABEZADOS)
+
+    for cliente in clientes:
+        writer.writerow(fila_cliente(cliente))
+        if buffer.tell() >= tamano_bloque:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
+
+def stream_jsonl(clientes, tamano_bloque=TAMANO_BLOQUE):
+    """Generador de bloques JSON Lines (un cliente por línea)"""
+    buffer = bytearray()
+
+    for cliente in clientes:
+        buffer += serializacion.dumps(registro_cliente(cliente))
+        buffer += b'\n'
+        if len(buffer) >= tamano_bloque:
+            yield bytes(buffer)
+            buffer.clear()
+
+    yield bytes(buffer)
+
+def escribir_archivo(clientes, formato, ruta):
+    """
+    Escribe la exportación en `ruta` (se escribe en un temporal y se renombra
+    al final, así nunca se sirve un archivo a medio generar)
+    """
+    temporal = f'{ruta}.tmp'
+
+    with open(temporal, 'wb') as archivo:
+        if formato == 'xlsx':
+            escribir_xlsx(clientes, archivo)
+        else:
+            generador = stream_csv(clientes) if formato == 'csv' else stream_jsonl(clientes)
+            for bloque in generador:
+                archivo.write(bloque)
+
+    os.replace(temporal, ruta)
+
+def ruta_artefacto(trabajo_id, formato):
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    return os.path.join(EXPORTS_DIR, f'{trabajo_id}.{formato}')
+
+def clave_exportacion(formato, filtros, version):
+    """
+    Clave de caché: mismo formato y filtros sobre la misma versión de la
+    colección producen el mismo archivo
+    """
+    contenido = json.dumps({'formato': formato, 'filtros': filtros, 'version': version}, sort_keys=True)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+def limpiar_vencidos(trabajos_collection):
+    """Borra los trabajos de exportación vencidos y sus archivos"""
+    limite = datetime.now() - EXPORTS_TTL
+    vencidos = list(trabajos_collection.find(
+        {'tipo': 'exportacion', 'creado': {'$lt': limite}},
+        {'resultado': 1}
+    ))
+
+    for trabajo in vencidos:
+        archivo = (trabajo.get('resultado') or {}).get('archivo')
+        if archivo:
+            try:
+                os.remove(os.path.join(EXPORTS_DIR, archivo))
+            except FileNotFoundError:
+                pass
+
+    if vencidos:
+        trabajos_collection.delete_many({'_id': {'$in': [t['_id'] for t in vencidos]}})
@@ -0,0 +1,249 @@
+"""
+Extracción de productos desde el PDF de lista de precios
+La extracción de tablas de pdfplumber usa mucha CPU, así que las páginas se
+reparten entre procesos: cada proceso abre el PDF una sola vez y extrae las
+páginas que le tocan. Los resultados se juntan en el orden de las páginas y
+un error en una página no afecta a las demás. Cada proceso del servidor
+levanta a lo sumo un pool a la vez (PDF_WORKERS procesos, 2 por defecto):
+con varios workers de gunicorn o importaciones simultáneas, las demás
+extracciones corren en el mismo proceso. Este módulo no tiene efectos al
+importarse, porque los procesos del pool lo importan para correr
+_abrir_en_proceso y _extraer_en_proceso.
+Las páginas ya extraídas antes (mismo contenido) salen de cache_listas.
+Lo usan import_productos_pdf.py y /api/import-productos-pdf.
+"""
+import os
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+from pdfminer.psparser import LIT
+import cache_listas
+import listas_precios
+
+TIPO_CACHE = 'pdf-pagina'
+
+# Procesos para extraer páginas (1 = en el mismo proceso, sin pool). Fijo y
+# chico: cada worker de gunicorn puede levantar su propio pool
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+
+# Por debajo de esta cantidad de páginas no conviene levantar procesos
+MINIMO_PAGINAS_PARALELO = 4
+
+# Tolerancia horizontal al leer el texto de la página: la de pdfplumber (3)
+# junta las palabras de esta lista
+TOLERANCIA_TEXTO = 1.5
+
+def productos_tabla(table):
+    """
+    Convierte la tabla de una página en productos
+    Retorna lista de productos: [{codigo, nombre, precio_lista}, ...]
+    """
+    if not table:
+        return []
+
+    # Buscar la fila de encabezado
+    header_idx = None
+    for idx, row in enumerate(table):
+        if row and any('Producto' in str(cell) for cell in row if cell):
+            header_idx = idx
+            break
+
+    if header_idx is None:
+        return []
+
+    # Filas de datos: con producto y precio, sin los encabezados de línea o categoría
+    filas = [
+        row for row in table[header_idx + 1:]
+        if row and len(row) >= 2 and row[0] and row[1] and not listas_precios.es_encabezado(row[0])
+    ]
+
+    codigos, nombres = listas_precios.interpretar_columna(row[0] for row in filas)
+    precios = listas_precios.limpiar_numeros(row[1] for row in filas)
+
+    return [
+        {'codigo': codigo, 'nombre': nombre, 'precio_lista': precio_lista}
+        for codigo, nombre, precio_lista in zip(codigos, nombres, precios)
+        # Validar datos mínimos
+        if nombre and precio_lista and precio_lista > 0
+    ]
+
+def productos_de_pagina(page):
+    """
+    Productos de una página: de su tabla o, si la tabla no se puede separar
+    en celdas (queda todo en una), de las líneas de texto
+    """
+    productos = productos_tabla(page.extract_table())
+    if not productos:
+        productos = listas_precios.productos_texto(page.extract_text(x_tolerance=TOLERANCIA_TEXTO))
+    return productos
+
+def _extraer_pagina(pdf, numero):
+    """
+    Productos de la página `numero` (base 1) de un PDF abierto
+
+    Returns:
+        (numero, productos, error): error es None o el mensaje de la excepción
+    """
+    try:
+        page = pdf.pages[numero - 1]
+        productos = productos_de_pagina(page)
+        # Libera los objetos ya interpretados de la página
+        page.close()
+        return numero, productos, None
+    except Exception as e:
+        return numero, [], str(e)
+
+# PDF abierto por cada proceso del pool (lo abre el inicializador)
+_pdf_proceso = None
+
+# Tomado mientras este proceso tiene un pool levantado
+_pool_en_uso = threading.Lock()
+
+def _abrir_en_proceso(pdf_path):
+    global _pdf_proceso
+    _pdf_proceso = pdfplumber.open(pdf_path)
+
+def _extraer_en_proceso(numero):
+    return _extraer_pagina(_pdf_proceso, numero)
+
+def _agregar_objeto(h, objeto, vistos):
+    """
+    Agrega al hash un objeto del PDF con sus referencias resueltas (los
+    flujos, decodificados). Cada objeto indirecto entra una sola vez; las
+    repeticiones se marcan por orden de aparición y no por número de
+    objeto, que cambia de un archivo a otro.
+    """
+    if isinstance(objeto, PDFObjRef):
+        if objeto.objid in vistos:
+            h.update(f'@{vistos[objeto.objid]}'.encode('utf-8'))
+            return
+        vistos[objeto.objid] = len(vistos)
+        objeto = objeto.resolve()
+
+    if isinstance(objeto, PDFStream):
+        _agregar_objeto(h, objeto.attrs, vistos)
+        h.update(objeto.get_data())
+    elif isinstance(objeto, dict):
+        h.update(b'<<')
+        for clave in sorted(objeto):
+            h.update(f'/{clave}'.encode('utf-8'))
+            _agregar_objeto(h, objeto[clave], vistos)
+        h.update(b'>>')
+    elif isinstance(objeto, list):
+        h.update(b'[')
+        for elemento in objeto:
+            _agregar_objeto(h, elemento, vistos)
+        h.update(b']')
+    else:
+        h.update(repr(objeto).encode('utf-8'))
+
+def huella_pagina(page):
+    """
+    Hash del contenido de una página: tamaño, flujos de dibujo, fuentes
+    (codificación, anchos, /ToUnicode y programa de la fuente) y formularios
+    XObject, que también dibujan texto. Dos páginas con la misma huella
+    producen la misma tabla; con solo los flujos de dibujo, la misma página
+    con otra fuente o CMap daría otro texto y la misma huella.
+    """
+    h = hashlib.sha256(repr(page.mediabox).encode('utf-8'))
+    for contenido in page.page_obj.contents:
+        h.update(resolve1(contenido).get_data())
+
+    recursos = resolve1(page.page_obj.resources) or {}
+    vistos = {}
+    _agregar_objeto(h, recursos.get('Font'), vistos)
+    for nombre, xobjeto in sorted((resolve1(recursos.get('XObject')) or {}).items()):
+        if resolve1(xobjeto).attrs.get('Subtype') is LIT('Form'):
+            h.update(f'/{nombre}'.encode('utf-8'))
+            _agregar_objeto(h, xobjeto, vistos)
+    return h.hexdigest()
+
+def huellas_paginas(pdf_path):
+    """Huella de cada página, en orden (no extrae tablas, es rápido)"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [huella_pagina(page) for page in pdf.pages]
+
+def paginas(pdf_path, numeros, workers=None):
+    """
+    Extrae las páginas `numeros` (base 1, en orden ascendente)
+
+    Con más de un worker las páginas se extraen en paralelo en un pool de
+    procesos (contexto spawn: no hereda hilos ni conexiones del servidor);
+    igual se entregan en el orden del PDF a medida que están listas. Si
+    este proceso ya tiene un pool en uso se extraen en el mismo proceso.
+
+    Yields:
+        (numero, productos, error) por cada página
+    """
+    workers = PDF_WORKERS if workers is None else workers
+    workers = max(1, min(workers, len(numeros)))
+
+    if workers == 1 or len(numeros) < MINIMO_PAGINAS_PARALELO or not _pool_en_uso.acquire(blocking=False):
+        with pdfplumber.open(pdf_path) as pdf:
+            for numero in numeros:
+                yield _extraer_pagina(pdf, numero)
+        return
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_abrir_en_proceso,
+            initargs=(pdf_path,)
+        ) as executor:
+            yield from executor.map(_extraer_en_proceso, numeros)
+    finally:
+        _pool_en_uso.release()
+
+def extraer_productos(pdf_path, workers=None, al_avanzar=None, usar_cache=True):
+    """
+    Extrae productos del PDF
+
+    Solo se extraen las páginas cuyo contenido no está en la caché; el
+    resto se toma de cache_listas.
+
+    Args:
+        pdf_path: Ruta al PDF
+        workers: Procesos a usar (por defecto PDF_WORKERS)
+        al_avanzar: Función opcional llamada con (pagina, total_paginas, productos_pagina)
+        usar_cache: Si es False se extraen todas las páginas sin leer ni escribir la caché
+
+    Returns:
+        (productos, errores): productos en el orden del PDF y
+        [{pagina, error}] de las páginas que no se pudieron leer
+    """
+    productos = []
+    errores = []
+
+    huellas = huellas_paginas(pdf_path)
+    total = len(huellas)
+
+    en_cache = {}
+    if usar_cache:
+        for numero, huella in enumerate(huellas, 1):
+            valor = cache_listas.obtener(TIPO_CACHE, huella)
+            if valor is not None:
+                en_cache[numero] = valor
+
+    pendientes = [n for n in range(1, total + 1) if n not in en_cache]
+    extraidas = paginas(pdf_path, pendientes, workers) if pendientes else iter(())
+
+    for numero in range(1, total + 1):
+        if numero in en_cache:
+            productos_pagina, error = en_cache[numero], None
+        else:
+            _, productos_pagina, error = next(extraidas)
+            if usar_cache and not error:
+                cache_listas.guardar(TIPO_CACHE, huellas[numero - 1], productos_pagina)
+
+        if error:
+            errores.append({'pagina': numero, 'error': error})
+        productos.extend(productos_pagina)
+
+        if al_avanzar:
+            al_avanzar(numero, total, productos_pagina)
+
+    return productos, errores
@@ -2,13 +2,13 @@
 Script para importar/actualizar productos desde PDF de lista de precios
 Procesa el PDF y actualiza la base de datos MongoDB
 """
-import pdfplumber
-import re
 from pymongo import MongoClient
-from datetime import datetime
 import sys
 import os
 from dotenv import load_dotenv
+import importador_productos
+import cache_listas
+import extraccion_pdf
 
 # Cargar variables de entorno
 load_dotenv()
@@ -17,203 +17,73 @@ load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
 DB_NAME = os.getenv('DB_NAME', 'crm_famago')
 
-def calcular_precios_por_dia(precio_lista):
-    """Calcula los precios por día según las fórmulas de recargo"""
-    return {
-        '42': round((precio_lista * 1.23) / 42, 3),
-        '84': round((precio_lista * 1.42) / 84, 3),
-        '135': round((precio_lista * 1.58) / 135, 3),
-        '175': round((precio_lista * 1.75) / 175, 3),
-        '220': round((precio_lista * 1.92) / 220, 3)
-    }
-
-def limpiar_numero(texto):
-    """Limpia y convierte texto a número"""
-    if not texto or texto.strip() == '':
-        return None
-    # Remover espacios, puntos de miles y convertir coma decimal a punto
-    texto = texto.strip().replace('.', '').replace(',', '.')
-    try:
-        return float(texto)
-    except:
-        return None
-
-def extraer_codigo(texto):
-    """Extrae código del producto (puede estar entre paréntesis o ser número)"""
-    if not texto:
-        return None
-    # Buscar patrón (XXXXX) o solo números al inicio
-    match = re.search(r'\(([^\)]+)\)|^(\d+)', texto.strip())
-    if match:
-        return match.group(1) or match.group(2)
-    return None
-
-def procesar_pdf(pdf_path):
+def procesar_pdf(pdf_path, workers=None):
     """
-    Extrae productos del PDF
+    Extrae productos del PDF (páginas en paralelo, ver extraccion_pdf)
     Retorna lista de productos: [{codigo, nombre, precio_lista}, ...]
     """
-    productos = []
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, 1):
-            print(f"Procesando página {page_num}/{len(pdf.pages)}...")
-
-            # Extraer tabla
-            table = page.extract_table()
-
-            if not table:
-                continue
-
-            # Buscar la fila de encabezado
-            header_idx = None
-            for idx, row in enumerate(table):
-                if row and any('Producto' in str(cell) for cell in row if cell):
-                    header_idx = idx
-                    break
-
-            if header_idx is None:
-                continue
-
-            # Procesar filas de datos
-            for row in table[header_idx + 1:]:
-                if not row or len(row) < 2:
-                    continue
-
-                producto_col = row[0]
-                lista_col = row[1] if len(row) > 1 else None
-
-                # Saltar filas vacías o de categoría
-                if not producto_col or not lista_col:
-                    continue
+    def al_avanzar(pagina, total, productos_pagina):
+        print(f"Procesando página {pagina}/{total}... {len(productos_pagina)} productos")
 
-                # Saltar si es encabezado de categoría (empieza con "Categoría:" o "Línea:")
-                if 'Categoría:' in str(producto_col) or 'Línea:' in str(producto_col):
-                    continue
+    productos, errores = extraccion_pdf.extraer_productos(pdf_path, workers, al_avanzar)
 
-                # Extraer código
-                codigo = extraer_codigo(producto_col)
-
-                # Limpiar nombre del producto (remover código si existe)
-                nombre = producto_col
-                if codigo:
-                    # Remover código entre paréntesis
-                    nombre = re.sub(r'\([^\)]+\)\s*', '', nombre).strip()
-                    # Remover código al inicio si es número
-                    nombre = re.sub(r'^\d+\s+', '', nombre).strip()
-
-                # Extraer precio de lista
-                precio_lista = limpiar_numero(lista_col)
-
-                # Validar datos mínimos
-                if not nombre or not precio_lista or precio_lista <= 0:
-                    continue
-
-                productos.append({
-                    'codigo': codigo,
-                    'nombre': nombre,
-                    'precio_lista': precio_lista
-                })
+    for error in errores:
+        print(f"✗ Error en página {error['pagina']}: {error['error']}")
 
     return productos
 
-def importar_productos_db(productos, actualizar_existentes=True):
+def importar_productos_db(productos, actualizar_existentes=True, diferencias=False, huella=None):
     """
     Importa/actualiza productos en MongoDB
 
+    Lee el catálogo una sola vez, calcula los cambios en memoria y los
+    aplica con bulk_write (ver importador_productos).
+
     Args:
         productos: Lista de productos extraídos del PDF
         actualizar_existentes: Si True, actualiza precios de productos existentes
+        diferencias: Si True, muestra qué cambiaría y pide confirmación antes de escribir
+        huella: Hash del archivo; si es la última lista aplicada no se escribe nada
 
     Returns:
-        dict con estadísticas: {creados, actualizados, errores}
+        dict con estadísticas: {creados, actualizados, errores} (None si se canceló)
     """
     client = MongoClient(MONGO_URI)
     db = client[DB_NAME]
-    productos_collection = db['productos']
 
-    stats = {
-        'creados': 0,
-        'actualizados': 0,
-        'errores': 0,
-        'sin_cambios': 0
-    }
+    if huella and not diferencias:
+        cantidad = importador_productos.lista_ya_aplicada(db, huella)
+        if cantidad is not None:
+            print("La lista ya estaba aplicada y el catálogo no cambió desde entonces: no hay cambios")
+            client.close()
+            return importador_productos.stats_sin_cambios(cantidad)
 
-    for producto in productos:
-        try:
-            codigo = producto.get('codigo')
-            nombre = producto['nombre']
-            precio_lista = producto['precio_lista']
+    def revisar(plan, catalogo):
+        if diferencias:
+            faltantes = importador_productos.faltantes(plan, catalogo)
+            informe = importador_productos.informe_diferencias(plan, faltantes)
+            print("\n".join(importador_productos.lineas_informe(informe)) + "\n")
 
-            # Calcular precios por día
-            precios_por_dia = calcular_precios_por_dia(precio_lista)
+            if input("¿Aplicar estos cambios? (s/n): ").lower() != 's':
+                return False
 
-            # Buscar producto existente por código o nombre
-            query = {}
-            if codigo:
-                query = {'codigo': codigo}
-            else:
-                query = {'nombre': {'$regex': f'^{re.escape(nombre)}$', '$options': 'i'}}
+            if faltantes and input(f"¿Desactivar los {len(faltantes)} productos que no figuran en la lista? (s/n): ").lower() == 's':
+                plan['cambios'].extend(faltantes)
 
-            producto_existente = productos_collection.find_one(query)
+        for cambio in plan['cambios']:
+            if cambio['tipo'] == importador_productos.CREADO:
+                print(f"+ Creado: {cambio['nombre']} - ${cambio['precio_lista']:,.2f}")
+            elif cambio['tipo'] == importador_productos.ACTUALIZADO:
+                print(f"✓ Actualizado: {cambio['nombre']} - Nuevo precio: ${cambio['precio_lista']:,.2f}")
 
-            if producto_existente:
-                # Producto existe
-                if actualizar_existentes:
-                    # Verificar si hay cambios en el precio
-                    if producto_existente.get('precio_lista') != precio_lista:
-                        # Actualizar precios
-                        productos_collection.update_one(
-                            {'_id': producto_existente['_id']},
-                            {
-                                '$set': {
-                                    'precio_lista': precio_lista,
-                                    'precios_por_dia': precios_por_dia,
-                                    'fecha_actualizacion': datetime.now(),
-                                    'activo': True
-                                }
-                            }
-                        )
-                        stats['actualizados'] += 1
-                        print(f"✓ Actualizado: {nombre} - Nuevo precio: ${precio_lista:,.2f}")
-                    else:
-                        # Aunque no haya cambio en precio, asegurarnos que esté activo
-                        productos_collection.update_one(
-                            {'_id': producto_existente['_id']},
-                            {
-                                '$set': {
-                                    'activo': True,
-                                    'fecha_actualizacion': datetime.now()
-                                }
-                            }
-                        )
-                        stats['sin_cambios'] += 1
-                else:
-                    stats['sin_cambios'] += 1
-            else:
-                # Producto nuevo - crear
-                nuevo_producto = {
-                    'codigo': codigo,
-                    'nombre': nombre,
-                    'precio_lista': precio_lista,
-                    'precios_por_dia': precios_por_dia,
-                    'fecha_creacion': datetime.now(),
-                    'fecha_actualizacion': datetime.now(),
-                    'activo': True
-                }
-
-                productos_collection.insert_one(nuevo_producto)
-                stats['creados'] += 1
-                print(f"+ Creado: {nombre} - ${precio_lista:,.2f}")
-
-        except Exception as e:
-            stats['errores'] += 1
-            print(f"✗ Error procesando '{producto.get('nombre', 'UNKNOWN')}': {e}")
+    stats = importador_productos.importar_productos(
+        db, productos, actualizar_existentes, huella=huella, al_planificar=revisar
+    )
 
     client.close()
     return stats
 
-def main(pdf_path):
+def main(pdf_path, diferencias=False):
     """Función principal"""
     print("\n" + "="*60)
     print("IMPORTACIÓN DE PRODUCTOS DESDE PDF")
@@ -236,7 +106,12 @@ def main(pdf_path):
     print("="*60 + "\n")
 
     # Importar a MongoDB
-    stats = importar_productos_db(productos, actualizar_existentes=True)
+    stats = importar_productos_db(productos, actualizar_existentes=True, diferencias=diferencias,
+                                  huella=cache_listas.huella_archivo(pdf_path))
+
+    if stats is None:
+        print("Importación cancelada, no se modificó ningún producto")
+        return
 
     # Mostrar resumen
     print("\n" + "="*60)
@@ -245,14 +120,22 @@ def main(pdf_path):
     print(f"  ✓ Productos creados:     {stats['creados']}")
     print(f"  ✓ Productos actualizados: {stats['actualizados']}")
     print(f"  - Sin cambios:           {stats['sin_cambios']}")
+    if stats['desactivados']:
+        print(f"  - Desactivados:          {stats['desactivados']}")
     print(f"  ✗ Errores:               {stats['errores']}")
     print("="*60 + "\n")
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Uso: python import_productos_pdf.py <ruta_al_pdf>")
+    # Uso: python import_productos_pdf.py [--diferencias] <ruta_al_pdf>
+    args = sys.argv[1:]
+    diferencias = '--diferencias' in args
+    args = [a for a in args if a != '--diferencias']
+
+    if not args:
+        print("Uso: python import_productos_pdf.py [--diferencias] <ruta_al_pdf>")
         print("Ejemplo: python import_productos_pdf.py 'listas_de_precios/lista_de_precios_115.pdf'")
+        print("  --diferencias  muestra qué cambiaría y pide confirmación antes de escribir")
         sys.exit(1)
 
-    pdf_path = sys.argv[1]
-    main(pdf_path)
+    pdf_path = args[0]
+    main(pdf_path, diferencias)
@@ -0,0 +1,461 @@
+"""
+Importación de clientes desde Excel
+Lee la planilla en lotes de tamaño fijo (openpyxl read-only), convierte cada
+lote columna por columna con pandas al formato de MongoDB y lo inserta antes
+de leer el siguiente, así la memoria no crece con el tamaño del archivo.
+Lo usan tanto /api/import-excel como import_data.py.
+
+Las claves de deduplicación (DNI, teléfono y nombre + localidad) tienen
+índices parciales comunes: hay clientes reales que comparten teléfono o
+nombre en la misma localidad, así que el alta no rechaza filas. Una
+reimportación con clave no aplica las filas cuya clave ya tienen varios
+clientes (ambiguas), para no actualizar uno cualquiera.
+
+Uso para completar las claves de los clientes existentes, crear los
+índices y ver las claves ambiguas:
+    python importador_clientes.py
+"""
+import os
+import re
+from datetime import datetime
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+import busqueda
+import estadisticas
+import localidades
+import versiones
+
+# Mapeo de columnas Excel a campos de base de datos
+COLUMN_MAPPING = {
+    'FECHA': 'fecha',
+    'CLIENTE': 'cliente',
+    'NOMBRE NEGOCIO': 'nombre_negocio',
+    'LOCALIDAD': 'localidad',
+    'DIRECCION': 'direccion',
+    'BARRIO': 'barrio',
+    'DNI': 'dni',
+    'TELEFONO': 'telefono',
+    'TELÉFONO': 'telefono',
+    'ES CLIENTE?': 'es_cliente',
+    'DETALLE': 'detalle',
+    'INTERES 1 ': 'interes_1',
+    'INTERES 1': 'interes_1',
+    'INTERES 2': 'interes_2',
+    'INTERES 3': 'interes_3',
+    'CANTIDAD COMPRAS': 'cantidad_compras',
+    'INTENCION DE COMPRAR': 'intencion_comprar',
+    'ACCION': 'accion',
+    'COMENTARIO': 'comentario',
+    'FECHA DE NACIMIENTO': 'fecha_nacimiento',
+    'AÑOS': 'años'
+}
+
+# Campos de texto opcionales (None si la celda está vacía)
+CAMPOS_TEXTO = [
+    'nombre_negocio', 'localidad', 'direccion', 'barrio', 'dni', 'es_cliente',
+    'detalle', 'interes_1', 'interes_2', 'interes_3', 'cantidad_compras',
+    'accion', 'comentario'
+]
+
+# Campos que se omiten del documento si no tienen valor
+CAMPOS_OMITIBLES = ('fecha_nacimiento', 'años')
+
+TELEFONO_DEFAULT = '12345'
+INTENCION_DEFAULT = 'POCA'
+
+# Documentos por cada insert_many
+TAMANO_LOTE = 1000
+
+# Claves de deduplicación disponibles para la importación con upsert
+CLAVES_DEDUP = ('dni', 'telefono', 'nombre_localidad')
+
+# Campos que una reimportación no pisa en clientes existentes
+CAMPOS_SOLO_ALTA = ('fecha',)
+
+_NO_DIGITO = re.compile(r'\D+')
+_DECIMAL_CERO = re.compile(r'\.0+$')
+
+def _digitos(valor):
+    """Solo los dígitos de un valor (un número leído como 12345678.0 queda 12345678)"""
+    if valor is None:
+        return ''
+    return _NO_DIGITO.sub('', _DECIMAL_CERO.sub('', str(valor).strip()))
+
+def claves_dedup(documento):
+    """
+    Claves normalizadas para reconocer un cliente existente en una reimportación
+
+    Returns:
+        {'dni': ..., 'telefono': ..., 'nombre_localidad': ...} (None si no aplica)
+    """
+    dni = _digitos(documento.get('dni'))
+    telefono = _digitos(documento.get('telefono'))
+    nombre = busqueda.normalizar_texto(documento.get('cliente'))
+
+    return {
+        'dni': dni or None,
+        'telefono': telefono if telefono and telefono != TELEFONO_DEFAULT else None,
+        'nombre_localidad': f"{nombre}|{localidades.clave_localidad(documento.get('localidad')) or ''}" if nombre else None
+    }
+
+def crear_indices(clientes_collection):
+    """
+    Índices parciales sobre cada clave (solo documentos que la tienen)
+
+    No son únicos: dos clientes pueden compartir una clave (ver upsert_lote).
+    Reemplaza los índices únicos claves_<clave>_unica si la base los tiene.
+    """
+    existentes = clientes_collection.index_information()
+    for clave in CLAVES_DEDUP:
+        campo = f'claves.{clave}'
+        if f'claves_{clave}_unica' in existentes:
+            clientes_collection.drop_index(f'claves_{clave}_unica')
+        clientes_collection.create_index(campo, partialFilterExpression={campo: {'$type': 'string'}})
+
+def _duplicados(clientes_collection, clave):
+    campo = f'claves.{clave}'
+    pipeline = [
+        {'$match': {campo: {'$type': 'string'}}},
+        {'$group': {
+            '_id': f'${campo}',
+            'clientes': {'$push': {'_id': '$_id', 'cliente': '$cliente', 'localidad': '$localidad', 'dni': '$dni', 'telefono': '$telefono'}},
+            'cantidad': {'$sum': 1}
+        }},
+        {'$match': {'cantidad': {'$gt': 1}}},
+        {'$sort': {'_id': 1}}
+    ]
+    return [
+        {'clave': grupo['_id'], 'clientes': grupo['clientes']}
+        for grupo in clientes_collection.aggregate(pipeline, allowDiskUse=True)
+    ]
+
+def conflictos(clientes_collection):
+    """
+    Claves que comparten varios clientes (una reimportación con esa
+    clave no aplica sus filas)
+
+    Returns:
+        {'dni': [{clave, clientes: [...]}, ...], 'telefono': [...], 'nombre_localidad': [...]}
+    """
+    return {clave: _duplicados(clientes_collection, clave) for clave in CLAVES_DEDUP}
+
+def migrar(clientes_collection):
+    """
+    Completa las claves de los clientes existentes, crea los índices e
+    informa las claves ambiguas
+
+    Returns:
+        {'dni': [...], 'telefono': [...], 'nombre_localidad': [...]} (ver conflictos)
+    """
+    completar_claves(clientes_collection)
+    crear_indices(clientes_collection)
+    return conflictos(clientes_collection)
+
+def lineas_conflictos(lista_conflictos):
+    """Texto del informe de claves ambiguas para la consola"""
+    lineas = []
+    titulos = {'dni': 'DNI repetidos', 'telefono': 'Teléfonos repetidos', 'nombre_localidad': 'Mismo nombre en la misma localidad'}
+    for clave in CLAVES_DEDUP:
+        grupos = lista_conflictos[clave]
+        if not grupos:
+            continue
+        lineas.append(f"\n{titulos[clave]} ({len(grupos)}):")
+        for grupo in grupos:
+            lineas.append(f"  {grupo['clave']!r}:")
+            for cliente in grupo['clientes']:
+                lineas.append(
+                    f"    - {cliente['_id']} {cliente.get('cliente')} ({cliente.get('localidad') or 'sin localidad'}) "
+                    f"DNI {cliente.get('dni') or '-'} Tel {cliente.get('telefono') or '-'}"
+                )
+    return lineas
+
+def _columna(df, campo):
+    """Columna del DataFrame o una columna vacía si la planilla no la trae"""
+    if campo in df.columns:
+        return df[campo]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def _texto(serie):
+    """Convierte a str conservando vacíos como None"""
+    return serie.astype(str).where(serie.notna(), None)
+
+def _fechas(serie):
+    """Convierte a datetime de Python; lo que no se puede interpretar queda como None"""
+    fechas = pd.to_datetime(serie, errors='coerce')
+    return pd.Series(fechas.dt.to_pydatetime(), index=serie.index, dtype=object).where(fechas.notna(), None)
+
+def transformar_dataframe(df):
+    """
+    Convierte un DataFrame con las columnas de la planilla a documentos de cliente
+
+    Todas las transformaciones se aplican por columna; solo el armado final
+    del índice de búsqueda y la clave de localidad es por documento.
+
+    Returns:
+        Lista de documentos listos para insertar
+    """
+    df = df.rename(columns=COLUMN_MAPPING)
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    # Validar que tenga al menos el campo cliente
+    cliente = _columna(df, 'cliente')
+    cliente = cliente.astype(str).str.strip().where(cliente.notna(), '')
+    validos = cliente != ''
+    df = df[validos]
+
+    if df.empty:
+        return []
+
+    salida = pd.DataFrame(index=df.index)
+    salida['cliente'] = cliente[validos]
+
+    for campo in CAMPOS_TEXTO:
+        salida[campo] = _texto(_columna(df, campo))
+
+    telefono = _columna(df, 'telefono')
+    salida['telefono'] = telefono.astype(str).where(telefono.notna(), TELEFONO_DEFAULT)
+
+    intencion = _columna(df, 'intencion_comprar')
+    salida['intencion_comprar'] = intencion.where(intencion.notna(), INTENCION_DEFAULT).astype(str).str.strip().str.upper()
+
+    # Fecha de registro (si falta o no se puede leer, la fecha actual)
+    fecha = _fechas(_columna(df, 'fecha'))
+    salida['fecha'] = fecha.where(fecha.notna(), datetime.now())
+
+    salida['fecha_nacimiento'] = _fechas(_columna(df, 'fecha_nacimiento'))
+
+    años = pd.to_numeric(_columna(df, 'años'), errors='coerce')
+    salida['años'] = pd.Series(años.round().astype('Int64'), dtype=object).where(años.notna(), None)
+
+    salida = salida.astype(object).where(salida.notna(), None)
+
+    documentos = salida.to_dict('records')
+    for documento in documentos:
+        for campo in CAMPOS_OMITIBLES:
+            if documento[campo] is None:
+                del documento[campo]
+        documento['busqueda'] = busqueda.construir_indice(documento)
+        localidades.preparar(documento)
+        documento['claves'] = claves_dedup(documento)
+
+    return documentos
+
+def _dataframe_lote(filas, encabezados):
+    """DataFrame de un lote; las celdas con error de Excel (#VALUE!, #N/A...) quedan vacías"""
+    df = pd.DataFrame(filas, columns=encabezados)
+    return df.mask(df.isin(ERROR_CODES))
+
+def leer_lotes(archivo, tamano_lote=TAMANO_LOTE):
+    """
+    Lee la primera hoja del Excel en lotes de `tamano_lote` filas
+
+    Los .xlsx se recorren con openpyxl en modo read-only (la memoria no depende
+    del tamaño del archivo). Los .xls antiguos no los soporta openpyxl y se
+    leen completos con pandas.
+
+    Args:
+        archivo: Ruta o archivo binario abierto (seekable)
+
+    Yields:
+        DataFrame con las columnas de la planilla para cada lote
+    """
+    nombre = archivo if isinstance(archivo, str) else getattr(archivo, 'filename', '') or ''
+    if nombre.lower().endswith('.xls'):
+        df = pd.read_excel(archivo)
+        for inicio in range(0, len(df), tamano_lote):
+            yield df.iloc[inicio:inicio + tamano_lote]
+        return
+
+    libro = load_workbook(getattr(archivo, 'stream', archivo), read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezados = next(filas, None)
+        if encabezados is None:
+            return
+        encabezados = [str(e) if e is not None else f'Unnamed: {i}' for i, e in enumerate(encabezados)]
+
+        lote = []
+        for fila in filas:
+            lote.append(fila[:len(encabezados)])
+            if len(lote) >= tamano_lote:
+                yield _dataframe_lote(lote, encabezados)
+                lote = []
+
+        if lote:
+            yield _dataframe_lote(lote, encabezados)
+    finally:
+        libro.close()
+
+def insertar_lote(db, documentos):
+    """
+    Inserta un lote con insert_many no ordenado y actualiza contadores
+    y catálogo de localidades
+
+    Returns:
+        Cantidad de clientes insertados
+    """
+    if not documentos:
+        return 0
+
+    db['clientes'].insert_many(documentos, ordered=False)
+    estadisticas.registrar_importacion(db['estadisticas'], documentos)
+    localidades.registrar_importacion(db['localidades'], documentos)
+    return len(documentos)
+
+def completar_claves(clientes_collection, tamano_lote=TAMANO_LOTE):
+    """Calcula `claves` en los clientes que todavía no las tienen"""
+    operaciones = []
+    for cliente in clientes_collection.find(
+        {'claves': {'$exists': False}},
+        {'cliente': 1, 'dni': 1, 'telefono': 1, 'localidad': 1}
+    ):
+        operaciones.append(UpdateOne({'_id': cliente['_id']}, {'$set': {'claves': claves_dedup(cliente)}}))
+        if len(operaciones) >= tamano_lote:
+            clientes_collection.bulk_write(operaciones, ordered=False)
+            operaciones = []
+
+    if operaciones:
+        clientes_collection.bulk_write(operaciones, ordered=False)
+
+def upsert_lote(db, documentos, clave):
+    """
+    Aplica un lote como upserts por `clave` en un único bulk_write
+
+    Los clientes sin valor para la clave se insertan directamente. Si la
+    clave se repite dentro del lote gana la última fila. Las filas cuya
+    clave ya tienen varios clientes no se aplican (ver conflictos), para
+    no actualizar uno cualquiera.
+
+    Returns:
+        {'insertados': n, 'actualizados': n, 'sin_cambios': n, 'ambiguos': n}
+    """
+    campo = f'claves.{clave}'
+    resultado = {'insertados': 0, 'actualizados': 0, 'sin_cambios': 0, 'ambiguos': 0}
+
+    por_clave = {}
+    sin_clave = []
+    for documento in documentos:
+        valor = documento['claves'][clave]
+        if valor:
+            por_clave[valor] = documento
+        else:
+            sin_clave.append(documento)
+
+    resultado['insertados'] += insertar_lote(db, sin_clave)
+
+    if not por_clave:
+        return resultado
+
+    # Estado previo de los existentes para ajustar contadores y catálogo
+    anteriores = {}
+    repetidas = set()
+    for c in db['clientes'].find(
+        {campo: {'$in': list(por_clave)}},
+        {'claves': 1, 'intencion_comprar': 1, 'localidad': 1}
+    ):
+        valor = c['claves'][clave]
+        if valor in anteriores:
+            repetidas.add(valor)
+        anteriores[valor] = c
+
+    for valor in repetidas:
+        del por_clave[valor]
+    resultado['ambiguos'] += len(repetidas)
+
+    operaciones = []
+    for valor, documento in por_clave.items():
+        cambios = {k: v for k, v in documento.items() if k not in CAMPOS_SOLO_ALTA}
+        solo_alta = {k: documento[k] for k in CAMPOS_SOLO_ALTA if k in documento}
+        operaciones.append(UpdateOne(
+            {campo: valor},
+            {'$set': cambios, '$setOnInsert': solo_alta},
+            upsert=True
+        ))
+
+    if not operaciones:
+        return resultado
+
+    escritura = db['clientes'].bulk_write(operaciones, ordered=False)
+    resultado['insertados'] += escritura.upserted_count
+    resultado['actualizados'] += escritura.modified_count
+    resultado['sin_cambios'] += escritura.matched_count - escritura.modified_count
+
+    delta_intencion = {}
+    delta_localidad = {}
+    for valor, documento in por_clave.items():
+        anterior = anteriores.get(valor)
+        if anterior is not None:
+            delta_intencion[anterior.get('intencion_comprar')] = delta_intencion.get(anterior.get('intencion_comprar'), 0) - 1
+            delta_localidad[anterior.get('localidad')] = delta_localidad.get(anterior.get('localidad'), 0) - 1
+        delta_intencion[documento.get('intencion_comprar')] = delta_intencion.get(documento.get('intencion_comprar'), 0) + 1
+        delta_localidad[documento.get('localidad')] = delta_localidad.get(documento.get('localidad'), 0) + 1
+
+    estadisticas.incrementar(db['estadisticas'], delta_intencion)
+    localidades.incrementar(db['localidades'], delta_localidad)
+
+    return resultado
+
+def importar_archivo(archivo, db, tamano_lote=TAMANO_LOTE, al_avanzar=None, clave=None):
+    """
+    Importa clientes desde un Excel leyendo, convirtiendo e insertando
+    de a `tamano_lote` filas
+
+    Args:
+        archivo: Ruta o archivo binario abierto
+        db: Base de datos de MongoDB
+        al_avanzar: Función opcional llamada con (filas_leidas, importados) tras cada lote
+        clave: Si se indica ('dni', 'telefono' o 'nombre_localidad'), los clientes
+            que ya existen con esa clave se actualizan en lugar de duplicarse
+
+    Returns:
+        {'filas', 'importados'} y, con clave, también
+        {'insertados', 'actualizados', 'sin_cambios', 'ambiguos'}
+    """
+    if clave is not None and clave not in CLAVES_DEDUP:
+        raise ValueError(f'Clave inválida. Claves válidas: {", ".join(CLAVES_DEDUP)}')
+
+    if clave is not None:
+        completar_claves(db['clientes'])
+
+    resultado = {'filas': 0, 'importados': 0}
+    if clave is not None:
+        resultado.update({'insertados': 0, 'actualizados': 0, 'sin_cambios': 0, 'ambiguos': 0})
+
+    for df in leer_lotes(archivo, tamano_lote):
+        resultado['filas'] += len(df)
+        documentos = transformar_dataframe(df)
+
+        if clave is None:
+            resultado['importados'] += insertar_lote(db, documentos)
+        else:
+            parcial = upsert_lote(db, documentos, clave)
+            for campo, cantidad in parcial.items():
+                resultado[campo] += cantidad
+            resultado['importados'] += parcial['insertados'] + parcial['actualizados']
+
+        if al_avanzar:
+            al_avanzar(resultado['filas'], resultado['importados'])
+
+    if resultado['importados']:
+        versiones.incrementar(db['versiones'], 'clientes')
+
+    return resultado
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    resultado = migrar(client[DB_NAME]['clientes'])
+    client.close()
+
+    lineas = lineas_conflictos(resultado)
+    for linea in lineas:
+        print(linea)
+    if lineas:
+        print("\n⚠️  Una reimportación con esas claves no aplica sus filas")
+    print("✅ Claves e índices de DNI, teléfono y nombre + localidad listos")
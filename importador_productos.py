@@ -0,0 +1,465 @@
+"""
+Importación de listas de precios de productos
+Lee el catálogo existente en una sola consulta (indexado por código y por
+la clave de nombre guardada, ver claves_productos), decide en memoria qué productos se crean, cuáles cambian
+de precio y cuáles quedan igual, y aplica los cambios con bulk_write.
+Lo usan import_productos_pdf.py, import_productos_excel.py y los endpoints
+de importación de productos.
+
+El mismo plan sirve como revisión previa (modo diferencias): se informa qué
+cambiaría, se guarda, y luego se aplica exactamente ese plan.
+"""
+import uuid
+from datetime import datetime, timedelta
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+import versiones
+import listas_precios
+import planes
+import busqueda_productos
+import claves_productos
+
+CREADO = 'creado'
+ACTUALIZADO = 'actualizado'
+REACTIVADO = 'reactivado'
+DESACTIVADO = 'desactivado'
+
+# Documento de `versiones` con la huella de la última lista aplicada
+ULTIMA_LISTA = 'productos_ultima_lista'
+
+# Revisiones de listas guardadas para aplicar después
+TIPO_DIFERENCIA = 'diferencia_productos'
+DIFERENCIA_VIGENCIA = timedelta(hours=24)
+
+# Operaciones enviadas por cada bulk_write
+LOTE_ESCRITURA = 1000
+
+# Campos del catálogo necesarios para comparar contra una lista
+PROYECCION_CATALOGO = {'codigo': 1, 'nombre': 1, 'clave_nombre': 1, 'precio_lista': 1, 'activo': 1}
+
+def cargar_catalogo(productos_collection):
+    """
+    Lee todo el catálogo con una sola consulta
+
+    Returns:
+        {'productos': [...], 'por_codigo': {...}, 'por_nombre': {...}}, con las
+        mismas claves que los índices únicos de claves_productos. Si una clave
+        se repite (productos con código del mismo nombre, o duplicados previos
+        a la migración) queda el producto más antiguo.
+    """
+    productos = list(productos_collection.find({}, PROYECCION_CATALOGO).sort('_id', 1))
+    por_codigo = {}
+    por_nombre = {}
+
+    for producto in productos:
+        if producto.get('codigo'):
+            por_codigo.setdefault(producto['codigo'], producto)
+        if producto.get('nombre'):
+            clave = producto.get('clave_nombre') or claves_productos.clave_nombre(producto['nombre'])
+            por_nombre.setdefault(clave, producto)
+
+    return {'productos': productos, 'por_codigo': por_codigo, 'por_nombre': por_nombre}
+
+def _buscar(catalogo, codigo, nombre):
+    """Producto del catálogo que corresponde a una fila de la lista"""
+    if codigo:
+        return catalogo['por_codigo'].get(codigo)
+    return catalogo['por_nombre'].get(claves_productos.clave_nombre(nombre))
+
+def planificar(productos, catalogo, actualizar_existentes=True):
+    """
+    Compara una lista de precios contra el catálogo sin escribir nada
+
+    Los productos con código se buscan por código y los demás por nombre.
+    Si un producto aparece varias veces en la lista gana la última fila.
+
+    Args:
+        productos: Lista de {codigo, nombre, precio_lista}
+        catalogo: Resultado de cargar_catalogo (no se modifica)
+        actualizar_existentes: Si es False, los productos existentes no se tocan
+
+    Returns:
+        {'cambios': [...], 'sin_cambios': n, 'vistos': {_id, ...}} con un cambio
+        por producto a crear, actualizar o reactivar, en el orden de la lista.
+        Cada cambio tiene {tipo, codigo, nombre, precio_anterior, precio_lista}
+        y `_id` si el producto ya existe. `vistos` son los productos existentes
+        que figuran en la lista.
+    """
+    cambios = []
+    vistos = set()
+    pendientes = {}
+    altas_por_codigo = {}
+    altas_por_nombre = {}
+    sin_cambios = 0
+
+    for producto in productos:
+        codigo = producto.get('codigo') or None
+        nombre = producto['nombre']
+        precio_lista = producto['precio_lista']
+        clave = claves_productos.clave_nombre(nombre)
+
+        # Producto que ya apareció antes en esta misma lista como nuevo
+        alta = altas_por_codigo.get(codigo) if codigo else altas_por_nombre.get(clave)
+        if alta is not None:
+            alta['precio_lista'] = precio_lista
+            continue
+
+        existente = _buscar(catalogo, codigo, nombre)
+
+        if existente is None:
+            alta = {
+                'tipo': CREADO,
+                'codigo': codigo,
+                'nombre': nombre,
+                'precio_anterior': None,
+                'precio_lista': precio_lista
+            }
+            cambios.append(alta)
+            if codigo:
+                altas_por_codigo[codigo] = alta
+            altas_por_nombre.setdefault(clave, alta)
+            continue
+
+        vistos.add(existente['_id'])
+
+        if not actualizar_existentes:
+            sin_cambios += 1
+            continue
+
+        cambio = pendientes.get(existente['_id'])
+        precio_actual = cambio['precio_lista'] if cambio else existente.get('precio_lista')
+
+        if precio_actual == precio_lista and (cambio or existente.get('activo') is True):
+            sin_cambios += 1
+            continue
+
+        if cambio is None:
+            cambio = {
+                'tipo': REACTIVADO,
+                '_id': existente['_id'],
+                'codigo': existente.get('codigo'),
+                'nombre': existente.get('nombre'),
+                'precio_anterior': existente.get('precio_lista'),
+                'precio_lista': existente.get('precio_lista'),
+                'activo': existente.get('activo') is True
+            }
+            cambios.append(cambio)
+            pendientes[existente['_id']] = cambio
+
+        cambio['precio_lista'] = precio_lista
+        cambio['tipo'] = ACTUALIZADO if precio_lista != cambio['precio_anterior'] else REACTIVADO
+
+    # Filas repetidas cuyo último precio es el que el producto (activo) ya tenía
+    efectivos = [c for c in cambios if not (c['tipo'] == REACTIVADO and c.get('activo'))]
+    sin_cambios += len(cambios) - len(efectivos)
+    for cambio in efectivos:
+        cambio.pop('activo', None)
+
+    return {'cambios': efectivos, 'sin_cambios': sin_cambios, 'vistos': vistos}
+
+def _variacion(anterior, nuevo):
+    """Variación porcentual del precio (None si no había precio anterior)"""
+    if not anterior:
+        return None
+    return round((nuevo - anterior) / anterior * 100, 2)
+
+def _item(cambio):
+    item = {
+        'codigo': cambio.get('codigo'),
+        'nombre': cambio.get('nombre'),
+        'precio_anterior': cambio.get('precio_anterior'),
+        'precio_lista': cambio.get('precio_lista')
+    }
+    if cambio.get('_id') is not None:
+        item['id'] = str(cambio['_id'])
+    return item
+
+def faltantes(plan, catalogo):
+    """Productos activos del catálogo que no figuran en la lista"""
+    return [
+        {
+            'tipo': DESACTIVADO,
+            '_id': producto['_id'],
+            'codigo': producto.get('codigo'),
+            'nombre': producto.get('nombre'),
+            'precio_anterior': producto.get('precio_lista'),
+            'precio_lista': producto.get('precio_lista')
+        }
+        for producto in catalogo['productos']
+        if producto.get('activo') is True and producto['_id'] not in plan['vistos']
+    ]
+
+def informe_diferencias(plan, faltantes_lista):
+    """
+    Informe serializable de lo que cambiaría al aplicar un plan
+
+    Returns:
+        {'resumen': {...}, 'nuevos': [...], 'cambios_precio': [...],
+         'reactivados': [...], 'faltantes': [...]}. Cada cambio de precio
+        trae `variacion` en porcentaje.
+    """
+    nuevos = []
+    cambios_precio = []
+    reactivados = []
+
+    for cambio in plan['cambios']:
+        item = _item(cambio)
+        if cambio['tipo'] == CREADO:
+            nuevos.append(item)
+        elif cambio['tipo'] == ACTUALIZADO:
+            item['variacion'] = _variacion(cambio['precio_anterior'], cambio['precio_lista'])
+            cambios_precio.append(item)
+        else:
+            reactivados.append(item)
+
+    return {
+        'resumen': {
+            'nuevos': len(nuevos),
+            'cambios_precio': len(cambios_precio),
+            'reactivados': len(reactivados),
+            'sin_cambios': plan['sin_cambios'],
+            'faltantes': len(faltantes_lista)
+        },
+        'nuevos': nuevos,
+        'cambios_precio': cambios_precio,
+        'reactivados': reactivados,
+        'faltantes': [_item(f) for f in faltantes_lista]
+    }
+
+def lineas_informe(informe, limite=20):
+    """Texto del informe de diferencias para los scripts de consola"""
+    resumen = informe['resumen']
+    lineas = [
+        f"  + Nuevos:              {resumen['nuevos']}",
+        f"  ~ Cambios de precio:   {resumen['cambios_precio']}",
+        f"  ↺ Reactivados:         {resumen['reactivados']}",
+        f"  = Sin cambios:         {resumen['sin_cambios']}",
+        f"  - Faltan en la lista:  {resumen['faltantes']}"
+    ]
+
+    secciones = (('Nuevos', 'nuevos'), ('Cambios de precio', 'cambios_precio'), ('Faltan en la lista', 'faltantes'))
+    for titulo, campo in secciones:
+        items = informe[campo]
+        if not items:
+            continue
+        lineas.append(f"\n{titulo}:")
+        for item in items[:limite]:
+            codigo = f"({item['codigo']})" if item['codigo'] else "(sin código)"
+            if campo == 'cambios_precio':
+                variacion = f" ({item['variacion']:+.2f}%)" if item['variacion'] is not None else ''
+                lineas.append(f"  {codigo} {item['nombre']}: ${item['precio_anterior']:,.2f} -> ${item['precio_lista']:,.2f}{variacion}")
+            else:
+                lineas.append(f"  {codigo} {item['nombre']} - ${item['precio_lista'] or 0:,.2f}")
+        if len(items) > limite:
+            lineas.append(f"  ... y {len(items) - limite} más")
+
+    return lineas
+
+def _operacion(cambio, ahora, recargos):
+    if cambio['tipo'] == CREADO:
+        return InsertOne(busqueda_productos.preparar(claves_productos.preparar({
+            'codigo': cambio['codigo'],
+            'nombre': cambio['nombre'],
+            'precio_lista': cambio['precio_lista'],
+            'precios_por_dia': listas_precios.calcular_precios_por_dia(cambio['precio_lista'], recargos),
+            'fecha_creacion': ahora,
+            'fecha_actualizacion': ahora,
+            'activo': True
+        })))
+
+    if cambio['tipo'] == DESACTIVADO:
+        return UpdateOne({'_id': cambio['_id']}, {'$set': {'activo': False, 'fecha_actualizacion': ahora}})
+
+    campos = {'activo': True, 'fecha_actualizacion': ahora}
+    if cambio['tipo'] == ACTUALIZADO:
+        campos['precio_lista'] = cambio['precio_lista']
+        campos['precios_por_dia'] = listas_precios.calcular_precios_por_dia(cambio['precio_lista'], recargos)
+    return UpdateOne({'_id': cambio['_id']}, {'$set': campos})
+
+def aplicar(db, plan, lote=LOTE_ESCRITURA, al_avanzar=None):
+    """
+    Escribe los cambios de un plan con bulk_write no ordenados de a `lote`
+
+    `al_avanzar`, si se indica, se llama con (escritos, total) tras cada lote.
+
+    Returns:
+        {'creados', 'actualizados', 'sin_cambios', 'desactivados', 'errores'}
+        (las reactivaciones sin cambio de precio cuentan como sin cambios)
+    """
+    cambios = plan['cambios']
+    ahora = datetime.now()
+    recargos = planes.recargos_por_dia(db)
+
+    stats = {
+        'creados': 0,
+        'actualizados': 0,
+        'errores': 0,
+        'sin_cambios': plan['sin_cambios'],
+        'desactivados': 0
+    }
+    contador = {CREADO: 'creados', ACTUALIZADO: 'actualizados', REACTIVADO: 'sin_cambios', DESACTIVADO: 'desactivados'}
+
+    for inicio in range(0, len(cambios), lote):
+        bloque = cambios[inicio:inicio + lote]
+        fallidos = set()
+
+        try:
+            db['productos'].bulk_write([_operacion(c, ahora, recargos) for c in bloque], ordered=False)
+        except BulkWriteError as e:
+            fallidos = {error['index'] for error in e.details.get('writeErrors', [])}
+            for error in e.details.get('writeErrors', []):
+                print(f"Error procesando '{bloque[error['index']]['nombre']}': {error.get('errmsg')}")
+
+        for indice, cambio in enumerate(bloque):
+            if indice in fallidos:
+                stats['errores'] += 1
+            else:
+                stats[contador[cambio['tipo']]] += 1
+
+        if al_avanzar:
+            al_avanzar(inicio + len(bloque), len(cambios))
+
+    if len(cambios) > stats['errores']:
+        versiones.incrementar(db['versiones'], 'productos')
+
+    return stats
+
+def importar_productos(db, productos, actualizar_existentes=True, huella=None, al_planificar=None, al_avanzar=None):
+    """
+    Importa/actualiza una lista de precios: una consulta para leer el
+    catálogo y un bulk_write por cada LOTE_ESCRITURA cambios
+
+    Args:
+        huella: Hash del archivo de la lista; si se indica, queda registrada
+            como última lista aplicada (ver lista_ya_aplicada)
+        al_planificar: Función opcional llamada con (plan, catalogo) antes de
+            escribir; si devuelve False no se aplica nada
+        al_avanzar: Función opcional llamada con (escritos, total) tras cada lote
+
+    Returns:
+        dict con estadísticas: {creados, actualizados, sin_cambios, errores}
+        (None si al_planificar canceló)
+    """
+    version = versiones.obtener(db['versiones'], 'productos')
+    catalogo = cargar_catalogo(db['productos'])
+    plan = planificar(productos, catalogo, actualizar_existentes)
+
+    if al_planificar and al_planificar(plan, catalogo) is False:
+        return None
+
+    stats = aplicar(db, plan, al_avanzar=al_avanzar)
+
+    if huella and not stats['errores']:
+        esperada = version + (1 if plan['cambios'] else 0)
+        # Si otra escritura se coló durante la importación no se registra nada
+        if versiones.obtener(db['versiones'], 'productos') == esperada:
+            db['versiones'].update_one(
+                {'_id': ULTIMA_LISTA},
+                {'$set': {'huella': huella, 'version_catalogo': esperada, 'productos': len(productos)}},
+                upsert=True
+            )
+
+    return stats
+
+def lista_ya_aplicada(db, huella):
+    """
+    La misma lista (byte a byte) fue la última aplicada y el catálogo no
+    cambió desde entonces, así que importarla otra vez no cambiaría nada
+
+    Returns:
+        Cantidad de productos de esa lista, o None si hay que importarla
+    """
+    registro = db['versiones'].find_one({'_id': ULTIMA_LISTA})
+    if (registro and registro.get('huella') == huella
+            and registro.get('version_catalogo') == versiones.obtener(db['versiones'], 'productos')):
+        return registro.get('productos', 0)
+    return None
+
+def stats_sin_cambios(cantidad):
+    """Estadísticas de una importación que no cambió nada"""
+    return {'creados': 0, 'actualizados': 0, 'errores': 0, 'sin_cambios': cantidad, 'desactivados': 0}
+
+def guardar_diferencia(trabajos_collection, plan, faltantes_lista, origen):
+    """
+    Guarda un plan revisado para aplicarlo después
+
+    Returns:
+        Informe de diferencias con el `id` de la revisión guardada
+    """
+    informe = informe_diferencias(plan, faltantes_lista)
+    ahora = datetime.now()
+    revision = {
+        '_id': uuid.uuid4().hex,
+        'tipo': TIPO_DIFERENCIA,
+        'origen': origen,
+        'cambios': plan['cambios'],
+        'faltantes': faltantes_lista,
+        'sin_cambios': plan['sin_cambios'],
+        'resumen': informe['resumen'],
+        'aplicado': None,
+        'creado': ahora,
+        'actualizado': ahora
+    }
+    trabajos_collection.insert_one(revision)
+
+    informe['id'] = revision['_id']
+    return informe
+
+def revisar_lista(db, productos, origen):
+    """Calcula las diferencias de una lista contra el catálogo y las guarda"""
+    catalogo = cargar_catalogo(db['productos'])
+    plan = planificar(productos, catalogo)
+    return guardar_diferencia(db['trabajos'], plan, faltantes(plan, catalogo), origen)
+
+def _vigente(cambio, catalogo, por_id):
+    """
+    El producto sigue como estaba al revisar la lista (nadie lo creó,
+    cambió de precio o borró mientras tanto)
+    """
+    if cambio['tipo'] == CREADO:
+        return _buscar(catalogo, cambio['codigo'], cambio['nombre']) is None
+
+    producto = por_id.get(cambio['_id'])
+    return producto is not None and producto.get('precio_lista') == cambio['precio_anterior']
+
+def aplicar_diferencia(db, revision_id, desactivar_faltantes=False):
+    """
+    Aplica exactamente los cambios de una revisión guardada
+
+    Los cambios cuyo producto se modificó desde la revisión no se aplican y
+    se informan como conflictos.
+
+    Returns:
+        Estadísticas de aplicar() más `conflictos`, o None si la revisión no
+        existe, ya se aplicó o venció
+    """
+    revision = db['trabajos'].find_one_and_update(
+        {
+            '_id': revision_id,
+            'tipo': TIPO_DIFERENCIA,
+            'aplicado': None,
+            'creado': {'$gte': datetime.now() - DIFERENCIA_VIGENCIA}
+        },
+        {'$set': {'aplicado': datetime.now(), 'actualizado': datetime.now()}}
+    )
+    if revision is None:
+        return None
+
+    cambios = revision['cambios'] + (revision['faltantes'] if desactivar_faltantes else [])
+
+    catalogo = cargar_catalogo(db['productos'])
+    por_id = {producto['_id']: producto for producto in catalogo['productos']}
+
+    vigentes = []
+    conflictos = []
+    for cambio in cambios:
+        if _vigente(cambio, catalogo, por_id):
+            vigentes.append(cambio)
+        else:
+            conflictos.append(_item(cambio))
+
+    stats = aplicar(db, {'cambios': vigentes, 'sin_cambios': revision['sin_cambios']})
+    stats['conflictos'] = conflictos
+
+    db['trabajos'].update_one({'_id': revision_id}, {'$set': {'resultado': stats}})
+    return stats
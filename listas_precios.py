@@ -0,0 +1,234 @@
+"""
+Interpretación de celdas de listas de precios
+Reglas únicas para sacar el código, el nombre y el precio de las celdas del
+PDF y del Excel de lista de precios, y para calcular los precios por día.
+Lo usan extraccion_pdf.py, import_productos_excel.py, importador_productos.py,
+debug_excel.py y app.py.
+
+Cada función tiene su versión por lotes (extraer_codigos, limpiar_nombres,
+limpiar_numeros) que recibe una columna entera (lista o Series de pandas).
+
+Formato de las celdas de producto: "<artículo del proveedor> (<código>) <nombre>",
+por ejemplo "140 (05001) Caja De Dinero Acero 5 Divisiones". El Excel guarda
+las celdas que son solo "(33431)" como el número -33431.
+"""
+import re
+
+# Código entre paréntesis: solo dígitos ("(200cm)" es parte del nombre)
+_CODIGO = re.compile(r'\((\d+)\)')
+
+# Código al inicio sin paréntesis: un número, con / o - ("90557/56", "003-0519")
+_CODIGO_INICIAL = re.compile(r'^(\d[\d/\-]*)\s')
+
+_ENCABEZADOS = ('Categoría:', 'Linea:', 'Línea:')
+
+# Líneas de texto del PDF que no son productos ni continuación de un nombre
+_LINEAS_IGNORADAS = ('Lista de Precios', 'Producto ', 'Cuotas ', 'Usuario:') + _ENCABEZADOS
+
+# Fila de producto en el texto del PDF: descripción, precio de lista (con
+# separador de miles) y las columnas de cuotas
+_FILA_TEXTO = re.compile(r'^(.*?)\s+(\d{1,3}(?:\.\d{3})+(?:,\d+)?)(?:\s+[\d.,]+)*\s*$')
+
+def _texto(celda):
+    """Texto de una celda con los espacios colapsados; None si está vacía (o es NaN)"""
+    if celda is None or celda != celda:
+        return None
+    return ' '.join(str(celda).split()) or None
+
+def es_encabezado(celda):
+    """True si la celda es un encabezado de línea o categoría"""
+    return isinstance(celda, str) and any(e in celda for e in _ENCABEZADOS)
+
+def _interpretar(texto):
+    """(codigo, nombre) de un texto ya normalizado con _texto"""
+    if '(' in texto:
+        match = _CODIGO.search(texto)
+        if match:
+            nombre = texto[match.end():].lstrip() or texto[:match.start()].rstrip()
+            return match.group(1), nombre or None
+
+    if texto[0].isdigit():
+        match = _CODIGO_INICIAL.match(texto)
+        if match:
+            return match.group(1), texto[match.end():].lstrip() or None
+
+    return None, texto
+
+def extraer_codigo(celda):
+    """
+    Código del producto de una celda
+
+    Busca primero el código entre paréntesis y si no hay, un número al
+    inicio. Un número negativo es un código entre paréntesis que el Excel
+    convirtió (-33431 -> '33431', -7394 -> '07394').
+    """
+    if isinstance(celda, (int, float)) and not isinstance(celda, bool):
+        if celda == celda and celda < 0 and celda == int(celda):
+            return f'{-int(celda):05d}'
+        return None
+
+    texto = _texto(celda)
+    return _interpretar(texto)[0] if texto else None
+
+def limpiar_nombre_producto(celda, codigo=None):
+    """
+    Nombre del producto sin el código
+
+    Con el código entre paréntesis el nombre es lo que sigue (lo anterior es
+    el artículo del proveedor), o lo que lo precede si el código está al final.
+    """
+    texto = _texto(celda)
+    if not texto or not codigo:
+        return texto
+
+    marca = f'({codigo})'
+    posicion = texto.find(marca)
+    if posicion >= 0:
+        despues = texto[posicion + len(marca):].strip()
+        return despues or texto[:posicion].strip() or None
+
+    if texto.startswith(codigo + ' '):
+        return texto[len(codigo) + 1:].strip() or None
+
+    return texto
+
+def limpiar_numero(celda):
+    """
+    Precio de una celda como float (None si está vacía o no es un número)
+    En el texto del PDF el punto separa miles y la coma los decimales.
+    """
+    if isinstance(celda, (int, float)) and not isinstance(celda, bool):
+        return float(celda) if celda == celda else None
+
+    if celda is None:
+        return None
+
+    texto = str(celda).replace('$', '').replace(' ', '').strip()
+    if not texto:
+        return None
+
+    try:
+        return float(texto.replace('.', '').replace(',', '.'))
+    except ValueError:
+        return None
+
+def extraer_codigos(celdas):
+    """extraer_codigo de una columna entera"""
+    return [extraer_codigo(celda) for celda in celdas]
+
+def limpiar_nombres(celdas, codigos=None):
+    """limpiar_nombre_producto de una columna entera (con los códigos de cada fila)"""
+    if codigos is None:
+        return [_texto(celda) for celda in celdas]
+    return [limpiar_nombre_producto(celda, codigo) for celda, codigo in zip(celdas, codigos)]
+
+def limpiar_numeros(celdas):
+    """limpiar_numero de una columna entera"""
+    return [limpiar_numero(celda) for celda in celdas]
+
+def interpretar_columna(celdas):
+    """
+    Códigos y nombres de una columna de celdas "<artículo> (<código>) <nombre>"
+
+    Returns:
+        (codigos, nombres): listas alineadas con las celdas
+    """
+    codigos = []
+    nombres = []
+    for celda in celdas:
+        if isinstance(celda, str):
+            texto = ' '.join(celda.split())
+            codigo, nombre = _interpretar(texto) if texto else (None, None)
+        else:
+            codigo = extraer_codigo(celda)
+            nombre = limpiar_nombre_producto(celda, codigo)
+        codigos.append(codigo)
+        nombres.append(nombre)
+    return codigos, nombres
+
+def productos_texto(texto):
+    """
+    Productos del texto de una página del PDF, línea por línea
+
+    Para cuando la tabla de la página no se puede separar en celdas. Cada
+    fila con precio es un producto y las líneas sin precio que la siguen son
+    la continuación del nombre.
+
+    Returns:
+        Lista de productos: [{codigo, nombre, precio_lista}, ...]
+    """
+    filas = []
+    actual = None
+
+    for linea in (texto or '').split('\n'):
+        linea = linea.strip()
+        if not linea or linea.startswith(_LINEAS_IGNORADAS):
+            actual = None
+            continue
+
+        match = _FILA_TEXTO.match(linea)
+        if match:
+            actual = [match.group(1), limpiar_numero(match.group(2))]
+            filas.append(actual)
+        elif actual is not None:
+            actual[0] += ' ' + linea
+
+    productos = []
+    for descripcion, precio_lista in filas:
+        codigo, nombre = _interpretar(' '.join(descripcion.split()))
+        if nombre and precio_lista and precio_lista > 0:
+            productos.append({'codigo': codigo, 'nombre': nombre, 'precio_lista': precio_lista})
+
+    return productos
+
+def productos_hoja(df):
+    """
+    Productos de una hoja del Excel de lista de precios (DataFrame de pandas)
+
+    Las columnas se interpretan enteras y después se arma cada fila:
+    - CASO 1: código y nombre en "Producto" ("140 (05001) Caja De Dinero...");
+      si no trae código puede estar en "Unnamed: 0"
+    - CASO 2: código en "Unnamed: 0" ("90557/56 (28323)") y nombre en "Unnamed: 2"
+    - CASO 3: solo nombre en "Unnamed: 2" (sin código)
+
+    Returns:
+        Lista de productos: [{codigo, nombre, precio_lista}, ...]
+    """
+    def columna(nombre):
+        return df[nombre].tolist() if nombre in df.columns else [None] * len(df)
+
+    producto_col = columna('Producto')
+    precios = limpiar_numeros(columna('Lista'))
+    codigos_producto, nombres_producto = interpretar_columna(producto_col)
+    codigos_unnamed_0 = extraer_codigos(columna('Unnamed: 0'))
+    nombres_unnamed_2 = limpiar_nombres(columna('Unnamed: 2'))
+
+    productos = []
+    for idx, precio_lista in enumerate(precios):
+        # Saltar filas sin precio y las de categoría o línea
+        if not precio_lista or precio_lista <= 0 or es_encabezado(producto_col[idx]):
+            continue
+
+        if nombres_producto[idx]:
+            codigo = codigos_producto[idx] or codigos_unnamed_0[idx]
+            nombre = nombres_producto[idx]
+        else:
+            codigo = codigos_unnamed_0[idx]
+            nombre = nombres_unnamed_2[idx]
+
+        if nombre:
+            productos.append({'codigo': codigo, 'nombre': nombre, 'precio_lista': precio_lista})
+
+    return productos
+
+def calcular_precios_por_dia(precio_lista, recargos):
+    """
+    Calcula los precios por día según las fórmulas de recargo
+
+    Args:
+        recargos: {dias: recargo} de los planes financiados (planes.recargos_por_dia)
+    """
+    return {
+        dias: round((precio_lista * recargo) / int(dias), 3)
+        for dias, recargo in recargos.items()
+    }
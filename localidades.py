@@ -0,0 +1,187 @@
+"""
+Catálogo normalizado de localidades
+Cada cliente guarda `localidad_clave` (minúsculas, sin acentos ni espacios de más),
+de modo que "Resistencia", "resistencia " y "RESISTENCIA" son la misma localidad.
+La colección `localidades` mantiene el nombre canónico y la cantidad de clientes
+por clave; el listado se sirve desde una caché en memoria.
+
+Si el catálogo nunca se reconstruyó (una base de antes de esta colección, o
+una donde solo se fue llenando con altas e importaciones) la primera lectura
+lo reconstruye. También se puede hacer a mano (lo corren los scripts de
+deploy y update.sh):
+    python localidades.py
+"""
+import time
+from collections import Counter
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+import os
+from busqueda import normalizar_texto
+
+# Segundos que otro worker puede tardar en ver un cambio en el catálogo
+CACHE_TTL = 60
+
+# Documento de la colección que marca que el catálogo ya se reconstruyó
+# (no tiene cantidad, así que no aparece en el listado)
+MARCA_RECONSTRUIDO = '_reconstruido'
+
+_cache = {'datos': None, 'expira': 0}
+
+def clave_localidad(localidad):
+    """Clave canónica de una localidad (None si está vacía)"""
+    clave = normalizar_texto(localidad)
+    return clave or None
+
+def nombre_canonico(localidad):
+    """Nombre para mostrar: sin espacios de más y en mayúsculas"""
+    return ' '.join(str(localidad).split()).upper()
+
+def preparar(documento):
+    """Completa `localidad_clave` en un documento de cliente"""
+    documento['localidad_clave'] = clave_localidad(documento.get('localidad'))
+    return documento
+
+def invalidar_cache():
+    _cache['datos'] = None
+
+def crear_indices(clientes_collection):
+    clientes_collection.create_index('localidad_clave')
+    clientes_collection.create_index([('localidad_clave', 1), ('fecha', -1), ('_id', -1)])
+
+def incrementar(localidades_collection, deltas):
+    """
+    Aplica variaciones de cantidad por localidad en un solo bulk_write
+
+    Args:
+        deltas: Dict {localidad (texto original): variación}
+    """
+    por_clave = {}
+    nombres = {}
+    for localidad, delta in deltas.items():
+        clave = clave_localidad(localidad)
+        if not clave or not delta:
+            continue
+        por_clave[clave] = por_clave.get(clave, 0) + delta
+        nombres.setdefault(clave, nombre_canonico(localidad))
+
+    operaciones = [
+        UpdateOne(
+            {'_id': clave},
+            {'$inc': {'cantidad': delta}, '$setOnInsert': {'nombre': nombres[clave]}},
+            upsert=True
+        )
+        for clave, delta in por_clave.items() if delta
+    ]
+
+    if operaciones:
+        localidades_collection.bulk_write(operaciones, ordered=False)
+        invalidar_cache()
+
+def registrar_alta(localidades_collection, localidad):
+    incrementar(localidades_collection, {localidad: 1})
+
+def registrar_baja(localidades_collection, localidad):
+    incrementar(localidades_collection, {localidad: -1})
+
+def registrar_cambio(localidades_collection, anterior, nueva):
+    if clave_localidad(anterior) != clave_localidad(nueva):
+        incrementar(localidades_collection, {anterior: -1, nueva: 1})
+
+def registrar_importacion(localidades_collection, documentos):
+    """Suma las localidades de un lote de documentos insertados"""
+    incrementar(localidades_collection, Counter(d.get('localidad') for d in documentos if d.get('localidad')))
+
+def _reclamar_reconstruccion(localidades_collection):
+    """
+    Crea la marca de reconstrucción si no existe
+    Devuelve True solo al proceso que la creó (evita que varios workers la repitan)
+    """
+    resultado = localidades_collection.update_one(
+        {'_id': MARCA_RECONSTRUIDO},
+        {'$setOnInsert': {'reconstruido': datetime.now()}},
+        upsert=True
+    )
+    return resultado.upserted_id is not None
+
+def listar(localidades_collection, clientes_collection=None):
+    """
+    Catálogo [{clave, nombre, cantidad}] ordenado por nombre, desde la caché
+
+    Con `clientes_collection`, si el catálogo nunca se reconstruyó se
+    reconstruye antes de leerlo.
+    """
+    ahora = time.monotonic()
+    if _cache['datos'] is None or ahora >= _cache['expira']:
+        if clientes_collection is not None and _reclamar_reconstruccion(localidades_collection):
+            try:
+                reconstruir(clientes_collection, localidades_collection)
+            except Exception:
+                # Sin la marca, la próxima lectura lo vuelve a intentar
+                localidades_collection.delete_one({'_id': MARCA_RECONSTRUIDO})
+                raise
+        _cache['datos'] = [
+            {'clave': l['_id'], 'nombre': l['nombre'], 'cantidad': l['cantidad']}
+            for l in localidades_collection.find({'cantidad': {'$gt': 0}}).sort('nombre', 1)
+        ]
+        _cache['expira'] = ahora + CACHE_TTL
+    return _cache['datos']
+
+def reconstruir(clientes_collection, localidades_collection, tamano_lote=500):
+    """
+    Completa `localidad_clave` en todos los clientes y recalcula el catálogo
+
+    Returns:
+        Cantidad de localidades en el catálogo
+    """
+    operaciones = []
+    cantidades = Counter()
+    nombres = {}
+
+    for cliente in clientes_collection.find({}, {'localidad': 1, 'localidad_clave': 1}):
+        clave = clave_localidad(cliente.get('localidad'))
+        if clave:
+            cantidades[clave] += 1
+            nombres.setdefault(clave, nombre_canonico(cliente['localidad']))
+
+        if cliente.get('localidad_clave') != clave or 'localidad_clave' not in cliente:
+            operaciones.append(UpdateOne({'_id': cliente['_id']}, {'$set': {'localidad_clave': clave}}))
+
+        if len(operaciones) >= tamano_lote:
+            clientes_collection.bulk_write(operaciones, ordered=False)
+            operaciones = []
+
+    if operaciones:
+        clientes_collection.bulk_write(operaciones, ordered=False)
+
+    # Se pisan las localidades una por una y después se borran las que ya no
+    # tienen clientes, así el catálogo nunca queda vacío mientras la app lo lee
+    operaciones = [
+        UpdateOne({'_id': clave}, {'$set': {'nombre': nombres[clave], 'cantidad': cantidad}}, upsert=True)
+        for clave, cantidad in cantidades.items()
+    ]
+    for inicio in range(0, len(operaciones), tamano_lote):
+        localidades_collection.bulk_write(operaciones[inicio:inicio + tamano_lote], ordered=False)
+    localidades_collection.delete_many({'_id': {'$nin': [MARCA_RECONSTRUIDO, *cantidades]}})
+
+    localidades_collection.update_one(
+        {'_id': MARCA_RECONSTRUIDO},
+        {'$set': {'reconstruido': datetime.now()}},
+        upsert=True
+    )
+
+    crear_indices(clientes_collection)
+    invalidar_cache()
+    return len(cantidades)
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    total = reconstruir(db['clientes'], db['localidades'])
+    client.close()
+
+    print(f"✅ Catálogo de localidades reconstruido: {total} localidades")
@@ -0,0 +1,232 @@
+"""
+Planes de pago (contado y financiados) guardados en `planes_descuento`
+Cada plan tiene su descuento y, los financiados, sus días y su recargo por
+financiación. Cada cambio incrementa la versión 'planes_descuento' de
+`versiones`; las tablas se sirven desde una caché en memoria que se vuelve a
+leer cuando esa versión cambia, así que los planes se pueden modificar sin
+reiniciar el servidor.
+
+Las mismas tablas dan los recargos con los que se calculan los precios por
+día de los productos (listas_precios.calcular_precios_por_dia).
+"""
+import time
+import numpy as np
+from pymongo import ReturnDocument
+import versiones
+
+# Documento de `versiones` de los planes
+VERSION = 'planes_descuento'
+
+# Cada cuántos segundos se consulta si cambió la versión
+VERIFICAR_CADA = 5
+
+# Planes con los que se inicializa la colección si está vacía
+PLANES_INICIALES = [
+    {'_id': 'contado_efectivo', 'nombre': 'Contado Efectivo', 'dias': None, 'recargo': 0, 'descuento': 34.39, 'orden': 0},
+    {'_id': '42_dias', 'nombre': '42 Días', 'dias': 42, 'recargo': 23, 'descuento': 30.75, 'orden': 1},
+    {'_id': '84_dias', 'nombre': '84 Días', 'dias': 84, 'recargo': 42, 'descuento': 27.1, 'orden': 2},
+    {'_id': '135_dias', 'nombre': '135 Días', 'dias': 135, 'recargo': 58, 'descuento': 27.1, 'orden': 3},
+    {'_id': '175_dias', 'nombre': '175 Días', 'dias': 175, 'recargo': 75, 'descuento': 27.1, 'orden': 4},
+    {'_id': '220_dias', 'nombre': '220 Días', 'dias': 220, 'recargo': 92, 'descuento': 27.1, 'orden': 5}
+]
+
+# Campos que se pueden modificar de un plan
+CAMPOS_EDITABLES = ('nombre', 'recargo', 'descuento', 'orden')
+
+_cache = {'tablas': None, 'verificado': 0}
+
+def armar_tablas(documentos, version):
+    """
+    Tablas de cálculo a partir de los documentos de planes
+
+    Returns:
+        {'version', 'planes': {id: plan} en orden, 'recargos_por_dia': {'42': 1.23, ...}}
+    """
+    planes = {}
+    for documento in sorted(documentos, key=lambda d: (d.get('orden', 0), d['_id'])):
+        planes[documento['_id']] = {
+            'id': documento['_id'],
+            'nombre': documento.get('nombre', documento['_id']),
+            'dias': documento.get('dias'),
+            'recargo': documento.get('recargo', 0),
+            'descuento': documento.get('descuento', 0),
+            'orden': documento.get('orden', 0)
+        }
+
+    recargos_por_dia = {
+        str(plan['dias']): 1 + plan['recargo'] / 100
+        for plan in planes.values() if plan['dias']
+    }
+
+    return {'version': version, 'planes': planes, 'recargos_por_dia': recargos_por_dia}
+
+def inicializar(planes_collection, versiones_collection):
+    """Carga PLANES_INICIALES si la colección está vacía"""
+    if planes_collection.count_documents({}, limit=1):
+        return
+    planes_collection.insert_many([dict(plan) for plan in PLANES_INICIALES])
+    versiones.incrementar(versiones_collection, VERSION)
+
+def invalidar_cache():
+    _cache['tablas'] = None
+
+def obtener(planes_collection, versiones_collection):
+    """
+    Tablas de planes desde la caché
+
+    La versión se consulta como mucho cada VERIFICAR_CADA segundos y los
+    planes se leen de nuevo solo si cambió.
+    """
+    ahora = time.monotonic()
+    tablas = _cache['tablas']
+
+    if tablas is None or ahora >= _cache['verificado'] + VERIFICAR_CADA:
+        version = versiones.obtener(versiones_collection, VERSION)
+        if tablas is None or tablas['version'] != version:
+            documentos = list(planes_collection.find())
+            tablas = armar_tablas(documentos, version) if documentos else armar_tablas(PLANES_INICIALES, version)
+            _cache['tablas'] = tablas
+        _cache['verificado'] = ahora
+
+    return tablas
+
+def recargos_por_dia(db):
+    """{dias: recargo} de los planes financiados, para calcular_precios_por_dia"""
+    return obtener(db['planes_descuento'], db['versiones'])['recargos_por_dia']
+
+def actualizar(planes_collection, versiones_collection, plan_id, campos):
+    """
+    Modifica un plan e incrementa la versión
+
+    Returns:
+        El documento actualizado o None si el plan no existe
+    """
+    documento = planes_collection.find_one_and_update(
+        {'_id': plan_id},
+        {'$set': campos},
+        return_document=ReturnDocument.AFTER
+    )
+    if documento:
+        versiones.incrementar(versiones_collection, VERSION)
+        invalidar_cache()
+    return documento
+
+def calcular_precio_final(precio_lista, plan):
+    """
+    Calcula el precio final según el plan seleccionado
+
+    Args:
+        precio_lista: Precio base del producto
+        plan: Plan de las tablas (obtener(...)['planes'][id])
+
+    Returns:
+        Dict con el desglose completo del cálculo
+    """
+    descuento_porcentaje = plan['descuento']
+
+    if not plan['dias']:
+        precio_final = precio_lista * (1 - descuento_porcentaje / 100)
+
+        return {
+            'tipo': 'contado',
+            'precio_base': round(precio_lista, 2),
+            'descuento_porcentaje': descuento_porcentaje,
+            'precio_final': round(precio_final, 2),
+            'cuota': None,
+            'dias': None,
+            'total': round(precio_final, 2)
+        }
+
+    dias = plan['dias']
+
+    # Calcular precio por día
+    recargo_porcentaje = plan['recargo']
+    precio_con_recargo = precio_lista * (1 + recargo_porcentaje / 100)
+    precio_por_dia = precio_con_recargo / dias
+
+    # Aplicar descuento
+    precio_por_dia_final = precio_por_dia * (1 - descuento_porcentaje / 100)
+    total = precio_por_dia_final * dias
+
+    return {
+        'tipo': 'financiado',
+        'precio_base': round(precio_lista, 2),
+        'recargo_porcentaje': recargo_porcentaje,
+        'precio_con_recargo': round(precio_con_recargo, 2),
+        'precio_por_dia_sin_descuento': round(precio_por_dia, 3),
+        'descuento_porcentaje': descuento_porcentaje,
+        'precio_por_dia_final': round(precio_por_dia_final, 3),
+        'dias': dias,
+        'total': round(total, 2)
+    }
+
+def matriz_totales(precios_lista, lista_planes):
+    """
+    Totales de muchos productos en muchos planes de una vez
+
+    Las operaciones siguen el mismo orden que calcular_precio_final, así que
+    cada celda es el mismo valor (sin redondear) que daría ese cálculo.
+
+    Args:
+        precios_lista: Secuencia de precios de lista
+        lista_planes: Planes de las tablas, uno por columna
+
+    Returns:
+        (totales, por_dia): arreglos de forma (productos, planes); por_dia es
+        el precio por día con descuento (NaN en los planes de contado)
+    """
+    precios = np.asarray(precios_lista, dtype=float)[:, None]
+    descuentos = 1 - np.array([plan['descuento'] for plan in lista_planes], dtype=float) / 100
+    recargos = 1 + np.array([plan['recargo'] if plan['dias'] else 0 for plan in lista_planes], dtype=float) / 100
+    dias = np.array([plan['dias'] or np.nan for plan in lista_planes], dtype=float)
+
+    por_dia = precios * recargos / dias * descuentos
+    totales = np.where(np.isnan(dias), precios * descuentos, por_dia * dias)
+    return totales, por_dia
+
+def cotizar(items, lista_planes):
+    """
+    Cotización de una canasta de productos en varios planes
+
+    Args:
+        items: [{'producto': {id, codigo, nombre}, 'precio_lista', 'cantidad'}, ...]
+        lista_planes: Planes de las tablas
+
+    Returns:
+        {'items': [...], 'planes': [...]}: por cada ítem el total unitario y el
+        subtotal en cada plan; por cada plan el total de la canasta y, los
+        financiados, la cuota diaria
+    """
+    totales, por_dia = matriz_totales([item['precio_lista'] for item in items], lista_planes)
+    cantidades = np.array([item['cantidad'] for item in items], dtype=float)[:, None]
+
+    # Los importes se redondean como en calcular_precio_final y el total de la
+    # canasta es la suma de los subtotales que se muestran
+    unitarios = [[round(valor, 2) for valor in fila] for fila in totales.tolist()]
+    subtotales = [[round(valor * item['cantidad'], 2) for valor in fila] for fila, item in zip(unitarios, items)]
+    cuotas = (por_dia * cantidades).sum(axis=0).tolist()
+
+    resultado_items = []
+    for item, fila_unitarios, fila_subtotales in zip(items, unitarios, subtotales):
+        resultado_items.append({
+            'producto': item['producto'],
+            'precio_lista': round(item['precio_lista'], 2),
+            'cantidad': item['cantidad'],
+            'planes': {
+                plan['id']: {'total': unitario, 'subtotal': subtotal}
+                for plan, unitario, subtotal in zip(lista_planes, fila_unitarios, fila_subtotales)
+            }
+        })
+
+    resultado_planes = []
+    for columna, plan in enumerate(lista_planes):
+        resultado_planes.append({
+            'plan': plan['id'],
+            'nombre': plan['nombre'],
+            'tipo': 'financiado' if plan['dias'] else 'contado',
+            'dias': plan['dias'],
+            'total': round(sum(fila[columna] for fila in subtotales), 2),
+            'cuota': round(cuotas[columna], 3) if plan['dias'] else None
+        })
+
+    return {'items': resultado_items, 'planes': resultado_planes}
@@ -0,0 +1,146 @@
+"""
+Recálculo de los precios por día de todo el catálogo
+Cada producto guarda en `precios_por_dia` los valores calculados al crearlo,
+editarlo o importarlo; si cambian los recargos de los planes esos valores
+quedan viejos. Este recálculo lee el precio de lista de todo el catálogo en
+un arreglo, calcula todos los planes con NumPy de una vez y escribe con
+bulk_write solo los productos cuyos valores cambiaron.
+
+Uso (con los recargos actuales de los planes):
+    python recalculo_precios.py
+"""
+import os
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+import listas_precios
+import planes
+import versiones
+
+# Operaciones enviadas por cada bulk_write
+LOTE_ESCRITURA = 1000
+
+def matriz_precios_por_dia(precios_lista, recargos):
+    """
+    Precios por día de muchos productos de una vez
+
+    Args:
+        precios_lista: Secuencia (o arreglo) de precios de lista
+        recargos: {dias: recargo} de los planes financiados
+
+    Returns:
+        Arreglo de forma (productos, planes) con las columnas en el orden de
+        `recargos`, redondeado a 3 decimales como calcular_precios_por_dia
+    """
+    precios = np.asarray(precios_lista, dtype=float)
+    factores = np.array(list(recargos.values()), dtype=float)
+    dias = np.array([int(d) for d in recargos], dtype=float)
+    return np.round(precios[:, None] * factores / dias, 3)
+
+def _guardados(precios_por_dia, claves):
+    """Valores guardados en el orden de `claves` (NaN si falta o no es un número)"""
+    precios_por_dia = precios_por_dia if isinstance(precios_por_dia, dict) else {}
+    valores = []
+    for clave in claves:
+        valor = precios_por_dia.get(clave)
+        valores.append(valor if isinstance(valor, (int, float)) and not isinstance(valor, bool) else np.nan)
+    return valores
+
+def recalcular_catalogo(db, recargos=None, lote=LOTE_ESCRITURA, al_avanzar=None):
+    """
+    Recalcula y guarda los precios por día que quedaron desactualizados
+
+    NumPy redondea algunos valores distinto que round() en el último
+    decimal, así que la matriz solo elige los candidatos: para esos se
+    calcula el valor exacto con calcular_precios_por_dia (el mismo que se
+    guarda al editar o importar) y se escribe solo si difiere del guardado.
+    Cada actualización exige que el precio de lista no haya cambiado desde
+    la lectura.
+
+    Args:
+        recargos: {dias: recargo}; por defecto los de los planes (planes.recargos_por_dia)
+        al_avanzar: Función opcional llamada con (escritos, total) tras cada lote
+
+    Returns:
+        {'productos', 'actualizados', 'sin_cambios', 'sin_precio', 'errores'}
+    """
+    recargos = planes.recargos_por_dia(db) if recargos is None else recargos
+    claves = list(recargos)
+
+    ids = []
+    precios = []
+    guardados = []
+    precios_por_dia = []
+    sin_precio = 0
+
+    for producto in db['productos'].find({}, {'precio_lista': 1, 'precios_por_dia': 1}):
+        precio = producto.get('precio_lista')
+        if not isinstance(precio, (int, float)) or isinstance(precio, bool):
+            sin_precio += 1
+            continue
+        ids.append(producto['_id'])
+        precios.append(precio)
+        precios_por_dia.append(producto.get('precios_por_dia'))
+        guardados.append(_guardados(producto.get('precios_por_dia'), claves))
+
+    stats = {
+        'productos': len(ids) + sin_precio,
+        'actualizados': 0,
+        'sin_cambios': len(ids),
+        'sin_precio': sin_precio,
+        'errores': 0
+    }
+
+    if not ids:
+        return stats
+
+    calculados = matriz_precios_por_dia(precios, recargos)
+    distintos = (calculados != np.array(guardados, dtype=float)).any(axis=1)
+
+    # También se reescriben los que guardan planes que ya no existen
+    for indice, valor in enumerate(precios_por_dia):
+        if isinstance(valor, dict) and len(valor) != len(claves):
+            distintos[indice] = True
+
+    operaciones = []
+    for indice in np.flatnonzero(distintos):
+        nuevo = listas_precios.calcular_precios_por_dia(precios[indice], recargos)
+        if nuevo != precios_por_dia[indice]:
+            operaciones.append(UpdateOne(
+                {'_id': ids[indice], 'precio_lista': precios[indice]},
+                {'$set': {'precios_por_dia': nuevo}}
+            ))
+
+    for inicio in range(0, len(operaciones), lote):
+        bloque = operaciones[inicio:inicio + lote]
+        try:
+            resultado = db['productos'].bulk_write(bloque, ordered=False)
+            stats['actualizados'] += resultado.modified_count
+        except BulkWriteError as e:
+            stats['actualizados'] += e.details.get('nModified', 0)
+            stats['errores'] += len(e.details.get('writeErrors', []))
+
+        if al_avanzar:
+            al_avanzar(inicio + len(bloque), len(operaciones))
+
+    stats['sin_cambios'] -= stats['actualizados'] + stats['errores']
+
+    if stats['actualizados']:
+        versiones.incrementar(db['versiones'], 'productos')
+
+    return stats
+
+if __name__ == '__main__':
+    load_dotenv()
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    DB_NAME = os.getenv('DB_NAME', 'crm_famago')
+
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    stats = recalcular_catalogo(db)
+    client.close()
+
+    print(f"✅ Precios por día recalculados: {stats['actualizados']} productos actualizados, "
+          f"{stats['sin_cambios']} sin cambios, {stats['sin_precio']} sin precio de lista, "
+          f"{stats['errores']} errores")
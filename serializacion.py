@@ -0,0 +1,47 @@
+"""
+Serialización JSON en streaming para los listados grandes
+Los documentos se serializan de a uno directamente desde el cursor de MongoDB
+y se envían en bloques, sin armar la lista completa en memoria.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional, se usa json estándar como respaldo
+    orjson = None
+
+# Tamaño aproximado de cada bloque enviado al cliente
+TAMANO_BLOQUE = 64 * 1024
+
+def dumps(obj):
+    """Serializa a bytes JSON con orjson si está disponible"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, ensure_ascii=False, default=str, separators=(',', ':')).encode('utf-8')
+
+def stream_json_array(documentos, convertir=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Generador que produce un array JSON en bloques de bytes
+
+    Args:
+        documentos: Iterable (normalmente un cursor de MongoDB)
+        convertir: Función aplicada a cada documento antes de serializar
+        tamano_bloque: Bytes acumulados antes de enviar un bloque
+    """
+    buffer = bytearray(b'[')
+    primero = True
+
+    for documento in documentos:
+        if convertir is not None:
+            documento = convertir(documento)
+        if not primero:
+            buffer += b','
+        buffer += dumps(documento)
+        primero = False
+
+        if len(buffer) >= tamano_bloque:
+            yield bytes(buffer)
+            buffer.clear()
+
+    buffer += b']'
+    yield bytes(buffer)
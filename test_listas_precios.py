@@ -0,0 +1,162 @@
+"""
+Pruebas de interpretación de listas de precios (no necesita servidor ni MongoDB)
+Compara lo que listas_precios y extraccion_pdf sacan de las listas incluidas en
+listas_de_precios/ contra los resultados esperados guardados al lado
+(lista_de_precios_115_pdf.json y lista_de_precios_115_xlsx.json), y prueba
+celdas sueltas con los formatos conocidos.
+
+Uso:
+    python test_listas_precios.py
+    python test_listas_precios.py --regenerar   (después de un cambio buscado en
+                                                 el parser; subir también
+                                                 cache_listas.VERSION_PARSER)
+"""
+import io
+import os
+import sys
+import json
+import contextlib
+import listas_precios
+import planes
+import extraccion_pdf
+import import_productos_excel
+
+LISTA_PDF = 'listas_de_precios/lista_de_precios_115.pdf'
+LISTA_EXCEL = 'listas_de_precios/lista_de_precios_115.xlsx'
+
+ESPERADO_PDF = 'listas_de_precios/lista_de_precios_115_pdf.json'
+ESPERADO_EXCEL = 'listas_de_precios/lista_de_precios_115_xlsx.json'
+
+# (celda, código esperado, nombre esperado)
+CELDAS = [
+    ('140 (05001)                     Caja De Dinero Acero 5 Divisiones', '05001', 'Caja De Dinero Acero 5 Divisiones'),
+    ('RJ11 24  (39932)             Cajón Monedero 410x420x100 Negro - Kretz', '39932', 'Cajón Monedero 410x420x100 Negro - Kretz'),
+    ('90557/56 (28323)', '28323', '90557/56'),
+    ('(33431) Caramelera Blanca Torre 28 Casilleros', '33431', 'Caramelera Blanca Torre 28 Casilleros'),
+    ('200201 - 200101 (34833)Juego de living Sillon 2 cpos', '34833', 'Juego de living Sillon 2 cpos'),
+    ('Batea Carnicera Equipada (200cm) - Negro - INR', None, 'Batea Carnicera Equipada (200cm) - Negro - INR'),
+    ('Mesa con bachon (60x40x40cm prof.) 1,40mts Costa', None, 'Mesa con bachon (60x40x40cm prof.) 1,40mts Costa'),
+    ('140 Caja De Dinero Acero', '140', 'Caja De Dinero Acero'),
+    (-33431.0, '33431', None),
+    (-7394, '07394', None),
+    (60220.0, None, None),
+    (float('nan'), None, None),
+    (None, None, None),
+    ('', None, None),
+]
+
+# (celda, número esperado)
+NUMEROS = [
+    ('173.673', 173673.0),
+    ('2.108.437', 2108437.0),
+    ('1.234,50', 1234.5),
+    ('$ 92.301', 92301.0),
+    (173673.0, 173673.0),
+    (325964, 325964.0),
+    ('Cuotas', None),
+    ('', None),
+    (None, None),
+    (float('nan'), None),
+]
+
+def test_celdas():
+    """Códigos, nombres y números de celdas sueltas (una por una y por lotes)"""
+    print("\n" + "=" * 60)
+    print("TEST: Celdas sueltas")
+    print("=" * 60)
+
+    fallas = 0
+    for celda, codigo, nombre in CELDAS:
+        obtenido = listas_precios.extraer_codigo(celda)
+        nombre_obtenido = listas_precios.limpiar_nombre_producto(celda, obtenido) if isinstance(celda, str) else None
+        if (obtenido, nombre_obtenido) != (codigo, nombre):
+            print(f"❌ {celda!r}: ({obtenido!r}, {nombre_obtenido!r}), se esperaba ({codigo!r}, {nombre!r})")
+            fallas += 1
+
+    for celda, numero in NUMEROS:
+        obtenido = listas_precios.limpiar_numero(celda)
+        if obtenido != numero:
+            print(f"❌ {celda!r}: {obtenido!r}, se esperaba {numero!r}")
+            fallas += 1
+
+    # Las versiones por lotes dan lo mismo que celda por celda
+    celdas = [celda for celda, _, _ in CELDAS]
+    codigos, nombres = listas_precios.interpretar_columna(celdas)
+    if codigos != [listas_precios.extraer_codigo(c) for c in celdas] or \
+            nombres != [listas_precios.limpiar_nombre_producto(c, k) for c, k in zip(celdas, codigos)]:
+        print("❌ interpretar_columna no coincide con extraer_codigo/limpiar_nombre_producto")
+        fallas += 1
+    if listas_precios.limpiar_numeros([c for c, _ in NUMEROS]) != [n for _, n in NUMEROS]:
+        print("❌ limpiar_numeros no coincide con limpiar_numero")
+        fallas += 1
+
+    recargos = planes.armar_tablas(planes.PLANES_INICIALES, 0)['recargos_por_dia']
+    precios = listas_precios.calcular_precios_por_dia(173673, recargos)
+    if precios != {'42': 5086.138, '84': 2935.901, '135': 2032.617, '175': 1736.73, '220': 1515.692}:
+        print(f"❌ calcular_precios_por_dia(173673): {precios}")
+        fallas += 1
+
+    if not fallas:
+        print(f"✅ {len(CELDAS) + len(NUMEROS)} celdas interpretadas como se esperaba")
+    return fallas == 0
+
+def productos_pdf():
+    productos, errores = extraccion_pdf.extraer_productos(LISTA_PDF, workers=1, usar_cache=False)
+    if errores:
+        raise RuntimeError(f"Páginas con error: {errores}")
+    return productos
+
+def productos_excel():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return import_productos_excel.procesar_excel(LISTA_EXCEL)
+
+def comparar(titulo, obtenidos, ruta_esperado):
+    """Compara productos contra el archivo esperado y muestra las primeras diferencias"""
+    print("\n" + "=" * 60)
+    print(f"TEST: {titulo}")
+    print("=" * 60)
+
+    with open(ruta_esperado, encoding='utf-8') as f:
+        esperados = json.load(f)
+
+    if obtenidos == esperados:
+        print(f"✅ {len(obtenidos)} productos iguales a {ruta_esperado}")
+        return True
+
+    print(f"❌ {len(obtenidos)} productos, se esperaban {len(esperados)}")
+    diferencias = [(i, o, e) for i, (o, e) in enumerate(zip(obtenidos, esperados)) if o != e]
+    for i, obtenido, esperado in diferencias[:10]:
+        print(f"   #{i}: {obtenido}")
+        print(f"   {' ' * len(str(i))}  esperado {esperado}")
+    return False
+
+def regenerar():
+    for ruta, productos in ((ESPERADO_PDF, productos_pdf()), (ESPERADO_EXCEL, productos_excel())):
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(productos, f, ensure_ascii=False, indent=1)
+            f.write('\n')
+        print(f"✓ {ruta}: {len(productos)} productos")
+
+if __name__ == "__main__":
+    # Las rutas de las listas son relativas a la carpeta del proyecto
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if '--regenerar' in sys.argv:
+        regenerar()
+        sys.exit(0)
+
+    print("\n🧪 SUITE DE PRUEBAS - Interpretación de listas de precios\n")
+
+    celdas_ok = test_celdas()
+    excel_ok = comparar("Lista de precios Excel", productos_excel(), ESPERADO_EXCEL)
+    pdf_ok = comparar("Lista de precios PDF", productos_pdf(), ESPERADO_PDF)
+
+    print("\n" + "=" * 60)
+    print("RESUMEN DE PRUEBAS")
+    print("=" * 60)
+    print(f"Celdas:           {'✅ OK' if celdas_ok else '❌ FALLÓ'}")
+    print(f"Lista Excel:      {'✅ OK' if excel_ok else '❌ FALLÓ'}")
+    print(f"Lista PDF:        {'✅ OK' if pdf_ok else '❌ FALLÓ'}")
+    print("=" * 60)
+
+    sys.exit(0 if celdas_ok and excel_ok and pdf_ok else 1)
@@ -5,6 +5,7 @@ Prueba el endpoint de importación de PDF localmente
 
 import requests
 import os
+import time
 
 def test_pdf_import_local():
     """Prueba la importación de PDF en localhost"""
@@ -37,9 +38,24 @@ def test_pdf_import_local():
 
             print(f"\n📊 Código de respuesta: {response.status_code}")
 
-            if response.status_code == 200:
-                data = response.json()
-                print("\n✅ ÉXITO - Respuesta del servidor:")
+            if response.status_code == 202:
+                trabajo = response.json()
+                print(f"\n⏳ Importación encolada (trabajo {trabajo['id']}), esperando...")
+
+                # La importación corre en segundo plano: consultar hasta que termine
+                while trabajo['estado'] not in ('completado', 'error'):
+                    time.sleep(1)
+                    trabajo = requests.get(f"http://localhost:5000/api/import-jobs/{trabajo['id']}", timeout=10).json()
+                    progreso = trabajo.get('progreso') or {}
+                    if progreso.get('paginas'):
+                        print(f"   - Página {progreso.get('pagina')} de {progreso['paginas']}")
+
+                if trabajo['estado'] == 'error':
+                    print(f"\n❌ ERROR - La importación falló: {trabajo.get('error')}")
+                    return False
+
+                data = trabajo['resultado']
+                print("\n✅ ÉXITO - Resultado de la importación:")
                 print(f"   - Mensaje: {data.get('message', 'N/A')}")
                 if 'stats' in data:
                     stats = data['stats']
@@ -0,0 +1,127 @@
+"""
+Trabajos en segundo plano
+El estado de cada trabajo vive en la colección `trabajos` (visible desde
+cualquier worker de gunicorn) y la ejecución ocurre en un pool de hilos
+del proceso que lo recibió, fuera del hilo de la petición.
+"""
+import os
+import uuid
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+TRABAJOS_WORKERS = int(os.getenv('TRABAJOS_WORKERS', '2'))
+
+# Un trabajo sin novedades durante este tiempo se considera abandonado
+TRABAJO_ABANDONADO = timedelta(minutes=10)
+
+PENDIENTE = 'pendiente'
+PROCESANDO = 'procesando'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+_executor = ThreadPoolExecutor(max_workers=TRABAJOS_WORKERS, thread_name_prefix='trabajo')
+
+def crear(trabajos_collection, tipo, parametros, clave=None):
+    """Registra un trabajo pendiente y devuelve su documento"""
+    ahora = datetime.now()
+    trabajo = {
+        '_id': uuid.uuid4().hex,
+        'tipo': tipo,
+        'clave': clave,
+        'parametros': parametros,
+        'estado': PENDIENTE,
+        'progreso': {},
+        'resultado': None,
+        'error': None,
+        'creado': ahora,
+        'actualizado': ahora
+    }
+    trabajos_collection.insert_one(trabajo)
+    return trabajo
+
+def actualizar(trabajos_collection, trabajo_id, **campos):
+    campos['actualizado'] = datetime.now()
+    trabajos_collection.update_one({'_id': trabajo_id}, {'$set': campos})
+
+def reportar_progreso(trabajos_collection, trabajo_id, **progreso):
+    """Actualiza los contadores de progreso (procesados, total, pagina, ...)"""
+    campos = {f'progreso.{clave}': valor for clave, valor in progreso.items()}
+    campos['actualizado'] = datetime.now()
+    trabajos_collection.update_one({'_id': trabajo_id}, {'$set': campos})
+
+def obtener(trabajos_collection, trabajo_id):
+    return trabajos_collection.find_one({'_id': trabajo_id})
+
+def buscar_reutilizable(trabajos_collection, tipo, clave):
+    """
+    Trabajo idéntico ya completado o todavía en curso (y no abandonado)
+    """
+    return trabajos_collection.find_one(
+        {
+            'tipo': tipo,
+            'clave': clave,
+            '$or': [
+                {'estado': COMPLETADO},
+                {'estado': {'$in': [PENDIENTE, PROCESANDO]},
+                 'actualizado': {'$gte': datetime.now() - TRABAJO_ABANDONADO}}
+            ]
+        },
+        sort=[('creado', -1)]
+    )
+
+def buscar_en_curso(trabajos_collection, tipo, clave):
+    """Trabajo idéntico todavía pendiente o en proceso (y no abandonado)"""
+    return trabajos_collection.find_one(
+        {
+            'tipo': tipo,
+            'clave': clave,
+            'estado': {'$in': [PENDIENTE, PROCESANDO]},
+            'actualizado': {'$gte': datetime.now() - TRABAJO_ABANDONADO}
+        },
+        sort=[('creado', -1)]
+    )
+
+def finalizado(trabajo):
+    return trabajo['estado'] in (COMPLETADO, ERROR)
+
+def ejecutar(trabajos_collection, trabajo_id, funcion, *args, **kwargs):
+    """
+    Ejecuta `funcion(*args, **kwargs)` en el pool y registra su estado
+
+    El valor devuelto por la función queda en `resultado`; una excepción
+    deja el trabajo en estado error con su mensaje.
+    """
+    def correr():
+        actualizar(trabajos_collection, trabajo_id, estado=PROCESANDO, iniciado=datetime.now())
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            actualizar(trabajos_collection, trabajo_id, estado=ERROR, error=str(e))
+        else:
+            actualizar(trabajos_collection, trabajo_id, estado=COMPLETADO, resultado=resultado, finalizado=datetime.now())
+
+    return _executor.submit(correr)
+
+def con_progreso(iterable, trabajos_collection, trabajo_id, cada=500):
+    """Recorre `iterable` reportando la cantidad procesada cada `cada` elementos"""
+    procesados = 0
+    for elemento in iterable:
+        yield elemento
+        procesados += 1
+        if procesados % cada == 0:
+            reportar_progreso(trabajos_collection, trabajo_id, procesados=procesados)
+    reportar_progreso(trabajos_collection, trabajo_id, procesados=procesados)
+
+def crear_indices(trabajos_collection):
+    trabajos_collection.create_index([('tipo', 1), ('clave', 1), ('creado', -1)])
+
+def trabajo_to_dict(trabajo):
+    """Convierte un documento de trabajo a diccionario serializable"""
+    if trabajo:
+        trabajo['id'] = trabajo.pop('_id')
+        for campo in ('creado', 'actualizado', 'iniciado', 'finalizado'):
+            if isinstance(trabajo.get(campo), datetime):
+                trabajo[campo] = trabajo[campo].strftime('%Y-%m-%d %H:%M:%S')
+    return trabajo
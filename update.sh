@@ -61,7 +61,17 @@ pip install -r requirements.txt --quiet --upgrade
 print_success "Dependencias actualizadas"
 echo ""
 
-# 4. Reiniciar servicio
+# 4. Completar datos derivados que agregan las nuevas versiones (se puede repetir)
+print_info "Actualizando datos derivados..."
+python busqueda.py
+python localidades.py
+python busqueda_productos.py
+python importador_clientes.py
+python claves_productos.py
+print_success "Datos derivados actualizados"
+echo ""
+
+# 5. Reiniciar servicio
 print_info "Reiniciando servicio..."
 sudo systemctl restart $SERVICE_NAME
 sleep 2
@@ -75,7 +85,7 @@ else
 fi
 echo ""
 
-# 5. Limpiar caché
+# 6. Limpiar caché
 print_info "Limpiando caché de Python..."
 find . -type d -name "__pycache__" -exec rm -rf {} + 2>/dev/null || true
 find . -type f -name "*.pyc" -delete 2>/dev/null || true
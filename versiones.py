@@ -0,0 +1,15 @@
+"""
+Números de versión por colección, compartidos entre workers
+Cada escritura incrementa un contador en la colección `versiones`
+(un documento diminuto por colección). Permite saber si los datos
+cambiaron sin recorrerlos, por ejemplo para reutilizar exportaciones.
+"""
+
+def incrementar(versiones_collection, nombre):
+    """Marca que la colección `nombre` cambió"""
+    versiones_collection.update_one({'_id': nombre}, {'$inc': {'version': 1}}, upsert=True)
+
+def obtener(versiones_collection, nombre):
+    """Versión actual de la colección `nombre` (0 si nunca se modificó)"""
+    documento = versiones_collection.find_one({'_id': nombre})
+    return documento['version'] if documento else 0